@@ -0,0 +1,104 @@
+import csv
+import json
+from typing import Dict, Iterable
+from value_object.unit import Unit
+from error import UnsupportedUnitError, InvalidQtyError, AlreadySupportedUnitError
+
+#the columns of a catalogue CSV... units is optional, e.g. "BAG:50;BSKT:2.451"
+CSV_FIELDS = ["sku", "product_name", "base_unit", "opening_bal", "units"]
+
+
+
+def read_catalogue_csv(lines: Iterable[str]):
+	#generator of catalogue rows, from any iterable of CSV lines with a header (e.g. an open file), read one line at a time
+	for row in csv.DictReader(lines):
+		yield row
+
+
+def read_catalogue_jsonl(lines: Iterable[str]):
+	#generator of catalogue rows, one JSON object per line... a line that isn't valid JSON comes out as the error it raised,
+	#so it is reported against its row instead of stopping the import
+	for line in lines:
+		if not line.strip():
+			continue
+
+		try:
+			yield json.loads(line)
+		except ValueError as error:
+			yield error
+
+
+def _parse_unit(unit: Unit | str | int):
+	#a Unit, its name ("KG") or its code (3)
+	try:
+		if isinstance(unit, Unit):
+			return unit
+
+		if isinstance(unit, str):
+			return Unit[unit.strip().upper()]
+
+		return Unit(unit)
+	except (KeyError, ValueError):
+		raise UnsupportedUnitError(f"Unknown unit ({unit})")
+
+
+def _parse_units(units: Dict | list | str | None):
+	#{unit: conversion_factor}, [(unit, conversion_factor), ...] or "unit:conversion_factor;..." -> [(Unit, float), ...]
+	if not units:
+		return []
+
+	if isinstance(units, str):
+		units = [unit_and_factor.split(":") for unit_and_factor in units.split(";") if unit_and_factor.strip()]
+	elif isinstance(units, dict):
+		units = units.items()
+
+	parsed_units = []
+	for unit, conversion_factor in units:
+		conversion_factor = float(conversion_factor)
+		if conversion_factor < 0:
+			raise ValueError(f"conversion_factor cannot be negative... you entered '{conversion_factor}'")
+
+		parsed_units.append((_parse_unit(unit), conversion_factor))
+
+	return parsed_units
+
+
+def parse_catalogue_row(row: Dict):
+	#a raw row (CSV strings, JSON values or python values alike) -> {"sku", "product_name", "base_unit", "opening_bal", "qty_scale", "units"}
+	#raises the error create_product_inventory/add_supported_unit would for the same values
+	if isinstance(row, Exception):
+		raise row
+
+	#a JSON line may hold any value, not just an object
+	if not isinstance(row, dict):
+		raise ValueError(f"Catalogue row must be an object with the product's fields... got ({row})")
+
+	sku = row.get("sku")
+	if not isinstance(sku, str) or not sku.strip():
+		raise ValueError(f"Invalid sku ({sku})")
+
+	opening_bal = float(row.get("opening_bal") or 0)
+	if opening_bal < 0:
+		raise InvalidQtyError(f"Tried to pass in negative Qty ({opening_bal})")
+
+	qty_scale = row.get("qty_scale") or None
+	if qty_scale is not None:
+		qty_scale = int(qty_scale)
+
+	base_unit = _parse_unit(row.get("base_unit"))
+	units = _parse_units(row.get("units"))
+
+	seen_units = {base_unit}
+	for unit, _ in units:
+		if unit in seen_units:
+			raise AlreadySupportedUnitError(f"Unit ({unit}) is already supported by Product ({row.get('product_name')})")
+		seen_units.add(unit)
+
+	return {
+		"sku": sku,
+		"product_name": row.get("product_name") or sku,
+		"base_unit": base_unit,
+		"opening_bal": opening_bal,
+		"qty_scale": qty_scale,
+		"units": units
+	}
@@ -0,0 +1,160 @@
+import asyncio
+from typing import Dict
+from error import ChangeFeedGapError
+
+
+
+class ChangeFeedSubscription(object):
+	#async iterator over the events of a ChangeFeed, oldest first... it holds its place in the feed until closed,
+	#so leave the `async with` (or call close) once done, or producers wait on it until it is evicted as stalled
+	
+	def __init__(self, change_feed: "ChangeFeed", after_seq: int):
+		self._change_feed = change_feed
+		self.last_seq = after_seq
+		self.is_closed = False
+		#set when the feed drops the subscription for stalling... its next read raises ChangeFeedGapError
+		self.is_evicted = False
+	
+	
+	def close(self):
+		if not self.is_closed:
+			self.is_closed = True
+			self._change_feed._unsubscribe(self)
+	
+	
+	async def __aenter__(self):
+		return self
+	
+	
+	async def __aexit__(self, *_):
+		self.close()
+	
+	
+	def __aiter__(self):
+		return self
+	
+	
+	async def __anext__(self):
+		if self.is_evicted:
+			raise ChangeFeedGapError(f"Subscription was evicted for stalling capacity events behind, after seq ({self.last_seq})")
+		
+		if self.is_closed:
+			raise StopAsyncIteration
+		
+		event = await self._change_feed._get_event_after(self.last_seq)
+		self.last_seq = event["seq"]
+		self._change_feed._on_consumed()
+		
+		return event
+
+
+
+class ChangeFeed(object):
+	#every event published gets the next seq (1, 2, ...)... seqs are per process, they start over after a restart
+	#the last `capacity` events are kept, so a subscriber can resume from a recent seq...
+	#events a subscriber hasn't read yet are also kept, but producers wait (wait_for_room) while any subscriber is capacity behind,
+	#so a slow subscriber slows the producers down instead of growing memory... one that stays that far behind for
+	#stall_timeout seconds is evicted, so a subscription that is never read or closed can't hold the producers up for good
+	
+	def __init__(self, capacity: int = 10_000, stall_timeout: float = 5):
+		if capacity <= 0:
+			raise ValueError(f"capacity must be positive... you entered '{capacity}'")
+		
+		if stall_timeout <= 0:
+			raise ValueError(f"stall_timeout must be positive... you entered '{stall_timeout}'")
+		
+		self.capacity = capacity
+		self.stall_timeout = stall_timeout
+		#seq -> event, oldest first
+		self._events: Dict[int, Dict] = {}
+		self._first_seq = 1
+		self._last_seq = 0
+		#subscription -> None (a dict used as an ordered set)
+		self._subscriptions: Dict[ChangeFeedSubscription, None] = {}
+		self._published = asyncio.Event()
+		self._consumed = asyncio.Event()
+	
+	
+	def get_last_seq(self):
+		return self._last_seq
+	
+	
+	def publish(self, event: Dict):
+		self._last_seq = self._last_seq + 1
+		event["seq"] = self._last_seq
+		self._events[self._last_seq] = event
+		
+		self._trim()
+		self._published.set()
+	
+	
+	def subscribe(self, after_seq: int = None):
+		#events with seq > after_seq... None means only the events published from now on
+		#raises ChangeFeedGapError if events after after_seq are no longer kept (or after_seq is from before a restart)...
+		#the subscriber should then start over from the store's current state
+		if after_seq is None:
+			after_seq = self._last_seq
+		
+		if not self._first_seq - 1 <= after_seq <= self._last_seq:
+			raise ChangeFeedGapError(f"Events after seq ({after_seq}) are not available... the feed holds seqs {self._first_seq} to {self._last_seq}")
+		
+		subscription = ChangeFeedSubscription(change_feed = self, after_seq = after_seq)
+		self._subscriptions[subscription] = None
+		
+		return subscription
+	
+	
+	def _unsubscribe(self, subscription: ChangeFeedSubscription):
+		del self._subscriptions[subscription]
+		self._on_consumed()
+	
+	
+	async def _get_event_after(self, seq: int):
+		while seq >= self._last_seq:
+			self._published.clear()
+			await self._published.wait()
+		
+		return self._events[seq + 1]
+	
+	
+	def _get_slowest_seq(self):
+		return min(subscription.last_seq for subscription in self._subscriptions) if self._subscriptions else self._last_seq
+	
+	
+	def _on_consumed(self):
+		self._trim()
+		self._consumed.set()
+	
+	
+	def _trim(self):
+		#drops the events that are both older than the last `capacity` and already read by every subscriber
+		keep_from = min(self._last_seq - self.capacity + 1, self._get_slowest_seq() + 1)
+		
+		while self._first_seq < keep_from:
+			del self._events[self._first_seq]
+			self._first_seq = self._first_seq + 1
+	
+	
+	async def wait_for_room(self):
+		#producers call this before publishing... returns once no subscriber is capacity or more events behind,
+		#evicting the ones still that far behind after stall_timeout seconds
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + self.stall_timeout
+		
+		while self._last_seq - self._get_slowest_seq() >= self.capacity:
+			timeout = deadline - loop.time()
+			if timeout <= 0:
+				self._evict_stalled()
+				return
+			
+			self._consumed.clear()
+			try:
+				await asyncio.wait_for(self._consumed.wait(), timeout = timeout)
+			except asyncio.TimeoutError:
+				pass
+	
+	
+	def _evict_stalled(self):
+		for subscription in [subscription for subscription in self._subscriptions if self._last_seq - subscription.last_seq >= self.capacity]:
+			subscription.is_evicted = True
+			subscription.close()
@@ -0,0 +1,199 @@
+from typing import Dict, List
+from uuid import uuid4
+from datetime import datetime
+from aggregrate.store import Store
+from value_object.unit import Unit
+from error import ReceivedEntryAlreadyDone, UnexistingReceivedNode
+
+
+#the GoodsReceived -> ReceivedEntry -> ReceivedNodeList -> ReceivedItem/ReceivedItemGroup tree of docs/design_brainstorm_1.md
+#adding/editing/deleting items does no validation at all... units are checked against the store once, in bulk, by mark_done_receiving
+
+
+
+class ReceivedNode(object):
+	def __init__(self, node_id: str = None):
+		self.node_id = str(uuid4()) if node_id is None else node_id
+
+
+
+class ReceivedItem(ReceivedNode):
+	def __init__(self, sku: str, qty: float, unit: Unit, node_id: str = None):
+		super().__init__(node_id = node_id)
+		self.sku = sku
+		self.qty = qty
+		self.unit = unit
+
+
+
+class ReceivedItemGroup(ReceivedNode):
+	def __init__(self, group_name: str, received_entry: "ReceivedEntry", node_id: str = None):
+		super().__init__(node_id = node_id)
+		self.group_name = group_name
+		self.received_nodes = ReceivedNodeList(received_entry = received_entry)
+	
+	
+	def get_received_node_list(self):
+		return self.received_nodes
+
+
+
+class ReceivedNodeList(object):
+	#all creation/update/deletion of nodes goes through here, so the entry can stop it once it is done receiving
+	
+	def __init__(self, received_entry: "ReceivedEntry"):
+		self._received_entry = received_entry
+		#node_id -> ReceivedNode, direct children only... keeps the order items were received in
+		self._received_nodes: Dict[str, ReceivedNode] = {}
+	
+	
+	def _check_not_done_OR_raise_err(self):
+		if self._received_entry.is_done or self._received_entry.is_closing:
+			raise ReceivedEntryAlreadyDone(f"Received entry ({self._received_entry.received_entry_id}) is done receiving, its items can no longer be changed")
+	
+	
+	def _get_node_OR_raise_err(self, node_id: str, node_type: type = ReceivedNode):
+		received_node = self._received_nodes.get(node_id)
+		
+		if not isinstance(received_node, node_type):
+			raise UnexistingReceivedNode(f"No {node_type.__name__} with node_id ({node_id}) directly in this list")
+		
+		return received_node
+	
+	
+	def receive(self, sku: str, qty: float, unit: Unit):
+		self._check_not_done_OR_raise_err()
+		received_item = ReceivedItem(sku = sku, qty = qty, unit = unit)
+		self._received_nodes[received_item.node_id] = received_item
+		
+		return received_item
+	
+	
+	def update_received_item(self, node_id: str, sku: str = None, qty: float = None, unit: Unit = None):
+		self._check_not_done_OR_raise_err()
+		received_item = self._get_node_OR_raise_err(node_id, ReceivedItem)
+		
+		if sku is not None:
+			received_item.sku = sku
+		if qty is not None:
+			received_item.qty = qty
+		if unit is not None:
+			received_item.unit = unit
+		
+		return received_item
+	
+	
+	def create_received_item_group(self, group_name: str):
+		self._check_not_done_OR_raise_err()
+		received_item_group = ReceivedItemGroup(group_name = group_name, received_entry = self._received_entry)
+		self._received_nodes[received_item_group.node_id] = received_item_group
+		
+		return received_item_group
+	
+	
+	def delete(self, node_id: str):
+		self._check_not_done_OR_raise_err()
+		self._get_node_OR_raise_err(node_id)
+		del self._received_nodes[node_id]
+	
+	
+	def get(self, node_id: str):
+		return self._get_node_OR_raise_err(node_id)
+	
+	
+	def __len__(self):
+		return len(self._received_nodes)
+	
+	
+	def __iter__(self):
+		return iter(list(self._received_nodes.values()))
+	
+	
+	def get_received_items(self):
+		#every ReceivedItem in this list and the groups under it, depth-first in the order they were added
+		received_items = []
+		node_iterators = [iter(self._received_nodes.values())]
+		
+		while node_iterators:
+			received_node = next(node_iterators[-1], None)
+			if received_node is None:
+				node_iterators.pop()
+			elif isinstance(received_node, ReceivedItemGroup):
+				node_iterators.append(iter(received_node.received_nodes._received_nodes.values()))
+			else:
+				received_items.append(received_node)
+		
+		return received_items
+
+
+
+class ReceivedEntry(object):
+	def __init__(self, store: Store, received_from: str, received_at: datetime = None, received_by: str = None, purpose: str = None, received_entry_id: str = None):
+		self.received_entry_id = str(uuid4()) if received_entry_id is None else received_entry_id
+		self.created_at = datetime.now()
+		self.received_at = self.created_at if received_at is None else received_at
+		self.received_from = received_from
+		self.received_by = received_by
+		self.purpose = purpose
+		self.store = store
+		self.is_done = False
+		#set while mark_done_receiving waits on the store, so the items it sent can't change under it
+		self.is_closing = False
+		self.received_nodes = ReceivedNodeList(received_entry = self)
+	
+	
+	def get_received_node_list(self):
+		return self.received_nodes
+	
+	
+	def to_received_entry_dict(self):
+		#the flattened tree, in the shape Store.receive takes
+		return {
+			"received_entry_id": self.received_entry_id,
+			"created_at": str(self.created_at),
+			"received_at": str(self.received_at),
+			"received_from": self.received_from,
+			"received_by": self.received_by,
+			"purpose": self.purpose,
+			"store_id": self.store.store_id,
+			"received_products": [
+				{"sku": received_item.sku, "qty": received_item.qty, "unit": received_item.unit}
+				for received_item in self.received_nodes.get_received_items()
+			]
+		}
+	
+	
+	async def mark_done_receiving(self):
+		#the store validates every item in one pass and applies them all or none...
+		#if it rejects them, the entry stays open so the items can be fixed and this called again
+		if self.is_done or self.is_closing:
+			raise ReceivedEntryAlreadyDone(f"Received entry ({self.received_entry_id}) is already done receiving")
+		
+		self.is_closing = True
+		try:
+			await self.store.receive(self.to_received_entry_dict())
+		finally:
+			self.is_closing = False
+		self.is_done = True
+
+
+
+class GoodsReceived(object):
+	def __init__(self):
+		#received_entry_id -> ReceivedEntry
+		self.received_entries: Dict[str, ReceivedEntry] = {}
+	
+	
+	def create_received_entry(self, store: Store, received_from: str, received_at: datetime = None, received_by: str = None, purpose: str = None):
+		received_entry = ReceivedEntry(store = store, received_from = received_from, received_at = received_at, received_by = received_by, purpose = purpose)
+		self.received_entries[received_entry.received_entry_id] = received_entry
+		
+		return received_entry
+	
+	
+	def get_received_entry(self, received_entry_id: str):
+		return self.received_entries[received_entry_id]
+	
+	
+	def get_open_received_entries(self) -> List[ReceivedEntry]:
+		return [received_entry for received_entry in self.received_entries.values() if not received_entry.is_done]
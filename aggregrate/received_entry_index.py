@@ -0,0 +1,114 @@
+import sqlite3
+from typing import Dict
+from collections import OrderedDict
+
+
+
+class ReceivedEntryIndex(object):
+	#the received_entry_ids a Store has applied, so a retried receive is recognised and not applied twice, however old it is...
+	#the results of the last `capacity` entries are kept (least recently seen evicted first), for returning them as they were,
+	#older ids only as ids... in memory until open_older_ids_file, then in an on-disk set (sqlite), so they neither grow
+	#the process nor go into snapshots. The recent results are kept in snapshots and rebuilt from the write-ahead log
+	
+	def __init__(self, capacity: int = 10_000):
+		if capacity <= 0:
+			raise ValueError(f"capacity must be positive... you entered '{capacity}'")
+		
+		self.capacity = capacity
+		#received_entry_id -> result, least recently seen first
+		self._recent_results: OrderedDict[str, Dict] = OrderedDict()
+		#received_entry_ids evicted from _recent_results, while there is no older ids file
+		self._older_ids = set()
+		#the older ids file, None until open_older_ids_file
+		self._connection: sqlite3.Connection | None = None
+	
+	
+	def open_older_ids_file(self, path: str):
+		#moves the older ids to the on-disk set at path (created if missing), and keeps them there from now on...
+		#the file outlives snapshots and log truncation, so keep it with the store's write-ahead log
+		self._connection = sqlite3.connect(path, check_same_thread = False)
+		#the write-ahead journal makes each insert one append, synced at its checkpoints... an evicted id is `capacity`
+		#entries old, so the log has long synced the entry it belongs to
+		self._connection.execute("PRAGMA journal_mode = WAL")
+		self._connection.execute("PRAGMA synchronous = NORMAL")
+		self._connection.execute("CREATE TABLE IF NOT EXISTS older_ids (received_entry_id TEXT PRIMARY KEY) WITHOUT ROWID")
+		self._add_older_ids(self._older_ids)
+		self._older_ids = set()
+	
+	
+	def close(self):
+		if self._connection is not None:
+			self._connection.close()
+			self._connection = None
+	
+	
+	def _add_older_ids(self, received_entry_ids):
+		if self._connection is None:
+			self._older_ids.update(received_entry_ids)
+			return
+		
+		with self._connection:
+			self._connection.executemany("INSERT OR IGNORE INTO older_ids VALUES (?)", [(received_entry_id,) for received_entry_id in received_entry_ids])
+	
+	
+	def _is_older_id(self, received_entry_id: str):
+		if self._connection is None:
+			return received_entry_id in self._older_ids
+		
+		return self._connection.execute("SELECT 1 FROM older_ids WHERE received_entry_id = ?", (received_entry_id,)).fetchone() is not None
+	
+	
+	def _count_older_ids(self):
+		if self._connection is None:
+			return len(self._older_ids)
+		
+		return self._connection.execute("SELECT COUNT(*) FROM older_ids").fetchone()[0]
+	
+	
+	def __contains__(self, received_entry_id: str):
+		return received_entry_id in self._recent_results or self._is_older_id(received_entry_id)
+	
+	
+	def __len__(self):
+		return len(self._recent_results) + self._count_older_ids()
+	
+	
+	def get(self, received_entry_id: str):
+		#the result the entry was applied with, {} if its result was evicted since, None if it was never applied
+		result = self._recent_results.get(received_entry_id)
+		if result is not None:
+			self._recent_results.move_to_end(received_entry_id)
+			return result
+		
+		return {} if self._is_older_id(received_entry_id) else None
+	
+	
+	def add(self, received_entry_id: str, result: Dict):
+		self._recent_results[received_entry_id] = result
+		self._recent_results.move_to_end(received_entry_id)
+		
+		evicted_ids = []
+		while len(self._recent_results) > self.capacity:
+			evicted_id, _ = self._recent_results.popitem(last = False)
+			evicted_ids.append(evicted_id)
+		
+		if evicted_ids:
+			self._add_older_ids(evicted_ids)
+	
+	
+	def get_state(self):
+		#older ids already on disk stay there
+		return {
+			"capacity": self.capacity,
+			"recent_results": list(self._recent_results.items()),
+			"older_ids": list(self._older_ids)
+		}
+	
+	
+	@classmethod
+	def from_state(cls, state: dict):
+		received_entry_index = cls(capacity = state["capacity"])
+		received_entry_index._recent_results = OrderedDict(state["recent_results"])
+		received_entry_index._older_ids = set(state["older_ids"])
+		
+		return received_entry_index
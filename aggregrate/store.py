@@ -1,47 +1,457 @@
-from typing import Dict
+import os
+import gc
+import logging
+import asyncio
+from itertools import islice
+from typing import Dict, List, Tuple, Callable, Iterable
+from types import MappingProxyType
+from collections import OrderedDict
+from contextlib import asynccontextmanager, AsyncExitStack
 from uuid import uuid4
+from datetime import datetime, date
+from dataclasses import dataclass
 from value_object.unit import Unit
 from value_object.qty_change_type import ChangeType
 from entity.product_inventory import ProductInventory
 from entity.product_stock_movement import ProductStockMovement
-from error import UnexistingProduct, AlreadyExistingProduct
+from entity.product_lots import ProductLots
+from entity.inventory_columns import InventoryColumns
+from aggregrate.change_feed import ChangeFeed
+from aggregrate.received_entry_index import ReceivedEntryIndex
+from aggregrate.store_metrics import StoreMetrics, instrument_store, uninstrument_store
+from aggregrate.catalogue_import import parse_catalogue_row
+from persistence.write_ahead_log import WriteAheadLog
+from error import UnexistingProduct, AlreadyExistingProduct, UnsupportedUnitError, UnsupportedChangeTypeError, InvalidQtyError, AlreadySupportedUnitError
+
+
+_logger = logging.getLogger(__name__)
+
+
+#change type -> (event type, key of the location, key of the product lines)... in entries and in the write-ahead log
+_ENTRY_FIELDS = {
+	ChangeType.RECEIVE: ("receive", "received_from", "received_products"),
+	ChangeType.ISSUE: ("issue", "issued_to", "issued_products"),
+	ChangeType.ADJUST: ("adjust", "reason", "adjusted_products"),
+}
+_CHANGE_TYPES_BY_EVENT_TYPE = {event_type: change_type for change_type, (event_type, _, _) in _ENTRY_FIELDS.items()}
+#a transfer's receipt is recorded in its destination's received entries as this + transfer_id
+_TRANSFER_RECEIVED_ENTRY_ID_PREFIX = "transfer:"
+
+
+
+@dataclass(slots=True)
+class ProductRecord:
+	#one record per sku, so the inventory and its stock movement are resolved with a single lookup
+	product_inventory: ProductInventory
+	product_stock_movement: ProductStockMovement
+	#None unless lot tracking is enabled for the product (see Store.enable_lot_tracking)
+	product_lots: ProductLots | None = None
 
 
 
 class Store(object):
-	def __init__(self, store_id: str, store_name: str):
+	def __init__(self, store_id: str, store_name: str, write_ahead_log: WriteAheadLog = None):
 		self.store_id = store_id
 		self.store_name = store_name
-		self._inventory_list = []
-		self._stock_movement_record:Dict[str, ProductStockMovement] = {}
+		#sku -> ProductRecord... dicts keep insertion order, so iterating this is still in order of product creation
+		self._product_records: Dict[str, ProductRecord] = {}
+		#when set, every change is logged (after validation, before it is applied) so it survives a restart
+		self._write_ahead_log = write_ahead_log
+		#sku -> asyncio.Lock, created on first use
+		self._sku_locks: Dict[str, asyncio.Lock] = {}
+		#sku -> read-only {"unit", "qty"} in base unit, updated on every qty change... same order as _product_records
+		self._inventory_snapshot: Dict[str, MappingProxyType] = {}
+		#bumped on every qty change, and sku -> version of its last change (oldest change first)
+		self._inventory_version = 0
+		self._sku_versions: OrderedDict[str, int] = OrderedDict()
+		#skus whose qty is below their reorder level (a dict used as an ordered set), kept current on every qty change
+		self._skus_below_reorder_level: Dict[str, None] = {}
+		#called with (sku, is_below) whenever a sku crosses its reorder level
+		self._reorder_level_listeners: List[Callable] = []
+		#[(sku, is_below), ...] crossed by the change being committed... listeners hear of them once it is done
+		self._reorder_crossings: List[Tuple[str, bool]] = []
+		#every product's qty and conversion factors in packed arrays, for converting/valuing many at once
+		self._inventory_columns = InventoryColumns()
+		#one event per product created and per line applied, for subscribers downstream (see subscribe_changes)
+		self._change_feed = ChangeFeed()
+		#None until enable_metrics
+		self._metrics: StoreMetrics | None = None
+		#received_entry_ids already applied, so a retried receive isn't applied twice
+		self._received_entries = ReceivedEntryIndex()
+		#transfer events replayed from the log, until recover_transfers has made sure their destinations received them
+		self._replayed_transfers: List[Dict] = []
 	
 	
-	async def create_product_inventory(self, sku: str, product_name: str, base_unit: Unit, opening_bal = 0):
-		product_inventory = next((product_inventory for product_inventory in self._inventory_list if product_inventory.sku == sku), None)
-		if product_inventory is not None:
-			raise AlreadyExistingProduct(f"Tried to create multiple inventories for product with sku ({sku})")
+	def set_write_ahead_log(self, write_ahead_log: WriteAheadLog):
+		#the ids of received entries too old to keep in memory go to a file next to the log (see ReceivedEntryIndex)
+		self._write_ahead_log = write_ahead_log
+		self._received_entries.close()
+		self._received_entries.open_older_ids_file(f"{write_ahead_log.path}.received_ids")
+	
+	
+	def _log_event(self, event: Dict):
+		#returns the event's seq, None when there is no write-ahead log
+		if self._write_ahead_log is not None:
+			return self._write_ahead_log.append(event)
+	
+	
+	def _unlog_event(self, seq: int | None):
+		#drops the event just logged as seq (see _log_event)
+		if self._write_ahead_log is not None and seq is not None:
+			self._write_ahead_log.undo_append(seq)
+	
+	
+	def _get_sku_lock(self, sku: str):
+		sku_lock = self._sku_locks.get(sku)
 		
-		self._inventory_list.append(ProductInventory(qty=opening_bal, sku=sku, product_name=product_name, base_unit=base_unit))
-		self._stock_movement_record[sku] = ProductStockMovement(sku=sku, opening_bal = opening_bal, base_unit = base_unit)
+		if sku_lock is None:
+			sku_lock = self._sku_locks[sku] = asyncio.Lock()
 		
+		return sku_lock
 	
-	def _get_product_inventory_by_sku(self, sku: str):
-		product_inventory = next((product_inventory for product_inventory in self._inventory_list if product_inventory.sku == sku), None)
+	
+	@asynccontextmanager
+	async def _lock_skus(self, skus: List[str]):
+		#changes to one sku are serialized, changes to different skus are not held up by each other...
+		#locks are always taken in sorted order, so two entries sharing skus can never deadlock
+		#reorder level listeners are called once the change is done and its locks are let go
+		try:
+			async with AsyncExitStack() as stack:
+				for sku in sorted(set(skus)):
+					await stack.enter_async_context(self._get_sku_lock(sku))
+				
+				yield
+		finally:
+			self._notify_reorder_level_listeners()
+	
+	
+	async def create_product_inventory(self, sku: str, product_name: str, base_unit: Unit, opening_bal = 0, qty_scale: int = None):
+		#qty_scale (e.g. 1000) keeps the product's qtys exact, in whole 1/qty_scale base units (see ProductInventory)
+		await self._change_feed.wait_for_room()
+		async with self._lock_skus([sku]):
+			if sku in self._product_records:
+				raise AlreadyExistingProduct(f"Tried to create multiple inventories for product with sku ({sku})")
+			ProductInventory.check_qty_scale_OR_raise_err(qty_scale)
+			
+			timestamp = datetime.now()
+			self._log_event({
+				"type": "create_product_inventory",
+				"sku": sku,
+				"product_name": product_name,
+				"base_unit": base_unit.value,
+				"opening_bal": opening_bal,
+				"qty_scale": qty_scale,
+				"timestamp": timestamp.isoformat()
+			})
+			self._create_product_record(sku = sku, product_name = product_name, base_unit = base_unit, opening_bal = opening_bal, timestamp = timestamp, qty_scale = qty_scale)
+	
+	
+	def _create_product_record(self, sku: str, product_name: str, base_unit: Unit, opening_bal: float, timestamp: datetime, qty_scale: int = None, units: List[Tuple[Unit, float]] = ()):
+		product_inventory = ProductInventory(qty=opening_bal, sku=sku, product_name=product_name, base_unit=base_unit, qty_scale=qty_scale)
+		for unit, conversion_factor in units:
+			product_inventory.add_supported_unit(unit = unit, conversion_factor = conversion_factor)
+		
+		self._add_product_record(ProductRecord(
+			product_inventory = product_inventory,
+			product_stock_movement = ProductStockMovement(sku=sku, opening_bal = product_inventory.get_qty(), base_unit = base_unit, timestamp = timestamp, qty_scale = qty_scale)
+		))
+		self._publish_change(event_type = "create_product_inventory", sku = sku, location = None, qty = opening_bal, unit = base_unit, bal = product_inventory.get_qty(), base_unit = base_unit, timestamp = timestamp)
+	
+	
+	async def import_product_inventories(self, rows: Iterable, batch_size: int = 1_000):
+		#creates many products, with their opening balances and units, from rows such as read_catalogue_csv/read_catalogue_jsonl yield
+		#(see catalogue_import.parse_catalogue_row)... rows are read batch_size at a time, so an iterator of any length can be streamed in
+		#a bad row (unparseable, an existing or repeated sku, an unknown unit, ...) is reported and skipped, the rest still go in
+		#returns {"imported_count", "failures": [{"index", "sku", "error"}, ...]}, index being the row's position in rows
+		imported_count = 0
+		failures = []
+		rows = enumerate(rows)
+		
+		while batch := list(islice(rows, batch_size)):
+			#sku -> parsed row, and sku -> index of its row
+			products = {}
+			indexes = {}
+			for index, row in batch:
+				try:
+					product = parse_catalogue_row(row)
+					ProductInventory.check_qty_scale_OR_raise_err(product["qty_scale"])
+					if product["sku"] in self._product_records or product["sku"] in products:
+						raise AlreadyExistingProduct(f"Tried to create multiple inventories for product with sku ({product['sku']})")
+				
+				except (KeyError, TypeError, ValueError, UnsupportedUnitError, InvalidQtyError, AlreadySupportedUnitError, AlreadyExistingProduct) as error:
+					failures.append({"index": index, "sku": row.get("sku") if isinstance(row, dict) else None, "error": error})
+					continue
+				
+				products[product["sku"]] = product
+				indexes[product["sku"]] = index
+			
+			await self._change_feed.wait_for_room()
+			async with self._lock_skus(list(products.keys())):
+				#another task may have created some of these skus while this one waited for the locks
+				for sku in [sku for sku in products if sku in self._product_records]:
+					del products[sku]
+					failures.append({"index": indexes[sku], "sku": sku, "error": AlreadyExistingProduct(f"Tried to create multiple inventories for product with sku ({sku})")})
+				
+				if not products:
+					continue
+				
+				timestamp = datetime.now()
+				#one log record per batch
+				self._log_event({
+					"type": "import_product_inventories",
+					"timestamp": timestamp.isoformat(),
+					"products": [
+						[product["sku"], product["product_name"], product["base_unit"].value, product["opening_bal"], product["qty_scale"], [[unit.value, conversion_factor] for unit, conversion_factor in product["units"]]]
+						for product in products.values()
+					]
+				})
+				self._import_product_inventories(products = products.values(), timestamp = timestamp)
+			
+			imported_count = imported_count + len(products)
+		
+		return {
+			"imported_count": imported_count,
+			"failures": failures
+		}
+	
+	
+	def _import_product_inventories(self, products: Iterable[Dict], timestamp: datetime):
+		#every product of a batch opens its ledger at the same timestamp, and comes in with its units already added
+		#like loading a snapshot, this allocates many long-lived objects... pausing the garbage collector avoids repeated full scans of them,
+		#only while the batch goes in, as nothing else runs until it is done
+		gc_was_enabled = gc.isenabled()
+		gc.disable()
+		try:
+			for product in products:
+				self._create_product_record(
+					sku = product["sku"],
+					product_name = product["product_name"],
+					base_unit = product["base_unit"],
+					opening_bal = product["opening_bal"],
+					timestamp = timestamp,
+					qty_scale = product["qty_scale"],
+					units = product["units"]
+				)
+		finally:
+			if gc_was_enabled:
+				gc.enable()
+	
+	
+	def _publish_change(self, event_type: str, sku: str, location: str | None, qty: float, unit: Unit, bal: float, base_unit: Unit, timestamp: datetime):
+		self._change_feed.publish({
+			"type": event_type,
+			"sku": sku,
+			"location": location,
+			"qty": qty,
+			"unit": unit,
+			"bal": bal,
+			"base_unit": base_unit,
+			"timestamp": timestamp
+		})
+	
+	
+	def subscribe_changes(self, after_seq: int = None):
+		#a ChangeFeedSubscription... async iterate it for {"seq", "type", "sku", "location", "qty", "unit", "bal", "base_unit", "timestamp"},
+		#one per product created ("create_product_inventory") and per line received/issued/adjusted ("receive", "issue", "adjust"),
+		#bal being the product's (base unit) balance right after it
+		#after_seq resumes right after an event already seen, None starts from the next change... close it when done, e.g.
+		#	async with store.subscribe_changes() as subscription:
+		#		async for event in subscription: ...
+		#changes wait for a subscriber that falls too far behind, evicting it if it stays there... ChangeFeedGapError means it must
+		#start over from get_inventory_snapshot
+		return self._change_feed.subscribe(after_seq = after_seq)
+	
+	
+	def get_change_seq(self):
+		#seq of the last change published, e.g. to pair with get_inventory_snapshot before subscribing from it
+		return self._change_feed.get_last_seq()
+	
+	
+	def enable_metrics(self):
+		#starts timing this store's operations and their phases (see store_metrics)... returns the StoreMetrics,
+		#e.g. to add_hook a profiler or tracer... until this is called, nothing is measured and nothing costs extra
+		if self._metrics is None:
+			self._metrics = StoreMetrics()
+			instrument_store(store = self, metrics = self._metrics)
+		
+		return self._metrics
+	
+	
+	def disable_metrics(self):
+		if self._metrics is not None:
+			uninstrument_store(self)
+			self._metrics = None
+	
+	
+	def get_metrics(self):
+		#{"operations": {name: {"count", "error_count", "latency", "lines"}}, "phases": {name: latency}}, None while metrics are disabled
+		return None if self._metrics is None else self._metrics.get_snapshot()
+	
+	
+	def _add_product_record(self, product_record: ProductRecord):
+		product_inventory = product_record.product_inventory
+		self._product_records[product_inventory.sku] = product_record
+		self._inventory_columns.add_product(
+			sku = product_inventory.sku,
+			base_unit = product_inventory.base_unit,
+			qty = product_inventory.get_qty(),
+			conversion_factors = {unit: unit_conversion.conversion_factor for unit, unit_conversion in product_inventory._unit_conversions.items()}
+		)
+		
+		product_inventory.add_qty_change_listener(self._on_qty_change)
+		self._on_qty_change(product_inventory)
+	
+	
+	def _on_qty_change(self, product_inventory: ProductInventory):
+		#keeps the materialized inventory snapshot current... one entry is replaced, nothing is rebuilt
+		sku = product_inventory.sku
+		qty = product_inventory.get_qty()
+		self._inventory_version = self._inventory_version + 1
+		self._inventory_snapshot[sku] = MappingProxyType({
+			"unit": product_inventory.base_unit,
+			"qty": qty
+		})
+		self._inventory_columns.set_qty(sku = sku, qty = qty)
+		
+		#most recently changed skus at the end, so changes since a version are read from the end backwards
+		self._sku_versions[sku] = self._inventory_version
+		self._sku_versions.move_to_end(sku)
+		
+		self._update_reorder_index(product_inventory)
+	
+	
+	def _update_reorder_index(self, product_inventory: ProductInventory):
+		#O(1) per change... listeners only hear about skus that cross their reorder level, either way
+		sku = product_inventory.sku
+		was_below = sku in self._skus_below_reorder_level
+		is_below = product_inventory.is_below_reorder_level()
+		
+		if is_below == was_below:
+			return
+		
+		if is_below:
+			self._skus_below_reorder_level[sku] = None
+		else:
+			del self._skus_below_reorder_level[sku]
+		
+		#not called from here, as this runs in the middle of a commit
+		self._reorder_crossings.append((sku, is_below))
+	
+	
+	def _notify_reorder_level_listeners(self):
+		#a listener that raises is logged and skipped... the change it heard about is already done
+		reorder_crossings, self._reorder_crossings = self._reorder_crossings, []
+		for sku, is_below in reorder_crossings:
+			for listener in self._reorder_level_listeners:
+				try:
+					listener(sku, is_below)
+				except Exception:
+					_logger.exception(f"Reorder level listener failed on sku ({sku}) crossing its reorder level")
+	
+	
+	def _get_product_record_by_sku(self, sku: str):
+		product_record = self._product_records.get(sku)
 		
-		if product_inventory is None:
+		if product_record is None:
 			raise UnexistingProduct(f"Product does not exist in this inventory with sku={sku}")
 		
-		return product_inventory
+		return product_record
+	
+	
+	def _get_product_inventory_by_sku(self, sku: str):
+		return self._get_product_record_by_sku(sku).product_inventory
 	
 	
 	def _get_product_stock_movement_by_sku(self, sku: str):
-		#incase the _stock_movement_record data structure changes, this method abstraction should prevent coupling to it
-		return self._stock_movement_record[sku]
+		#incase the _product_records data structure changes, this method abstraction should prevent coupling to it
+		return self._get_product_record_by_sku(sku).product_stock_movement
 	
 	
 	def add_supported_unit(self, sku: str, unit: Unit, conversion_factor: float):
 		product_inventory = self._get_product_inventory_by_sku(sku)
+		product_inventory.check_new_unit_OR_raise_err(unit = unit, conversion_factor = conversion_factor)
+		
+		self._log_event({
+			"type": "add_supported_unit",
+			"sku": sku,
+			"unit": unit.value,
+			"conversion_factor": conversion_factor
+		})
+		self._add_supported_unit(product_inventory = product_inventory, unit = unit, conversion_factor = conversion_factor)
+	
+	
+	def _add_supported_unit(self, product_inventory: ProductInventory, unit: Unit, conversion_factor: float):
 		product_inventory.add_supported_unit(unit = unit, conversion_factor = conversion_factor)
+		self._inventory_columns.set_conversion_factor(sku = product_inventory.sku, unit = unit, conversion_factor = conversion_factor)
+	
+	
+	def set_reorder_level(self, sku: str, reorder_level: float | None, unit: Unit = None):
+		#None removes the reorder level
+		product_inventory = self._get_product_inventory_by_sku(sku)
+		if reorder_level is not None:
+			#validates the level and unit before anything is logged
+			product_inventory.to_base_unit(qty = reorder_level, unit = unit)
+		
+		self._log_event({
+			"type": "set_reorder_level",
+			"sku": sku,
+			"reorder_level": reorder_level,
+			"unit": None if unit is None else unit.value
+		})
+		product_inventory.set_reorder_level(reorder_level = reorder_level, unit = unit)
+		self._update_reorder_index(product_inventory)
+		self._notify_reorder_level_listeners()
+	
+	
+	def enable_lot_tracking(self, sku: str):
+		#from now on, receipts of sku may carry "lot_id", "expiry_date" (a date) and "unit_cost" (per unit of the line) and
+		#issues are drawn from the lots first expiring first, each lot drawn from getting its own row in the stock movement
+		#the stock already held becomes one lot without an id or expiry, which issues reach last
+		product_record = self._get_product_record_by_sku(sku)
+		if product_record.product_lots is not None:
+			raise ValueError(f"Lot tracking is already enabled for Product with sku ({sku})")
+		
+		self._log_event({
+			"type": "enable_lot_tracking",
+			"sku": sku
+		})
+		self._enable_lot_tracking(product_record)
+	
+	
+	def _enable_lot_tracking(self, product_record: ProductRecord):
+		product_inventory = product_record.product_inventory
+		product_record.product_lots = ProductLots(qty_scale = product_inventory.qty_scale)
+		product_record.product_lots.receive(qty = product_inventory.get_qty())
+	
+	
+	async def get_lots(self, sku: str):
+		#[{"lot_id", "expiry_date", "unit_cost", "qty", "value"}, ...] of a lot tracked sku, in the order issues draw them...
+		#qtys are in base unit and unit_costs per base unit, value being None for a lot received without a cost
+		product_lots = self._get_product_record_by_sku(sku).product_lots
+		if product_lots is None:
+			raise ValueError(f"Lot tracking is not enabled for Product with sku ({sku})")
+		
+		lots = product_lots.get_lots()
+		for lot in lots:
+			lot["value"] = None if lot["unit_cost"] is None else lot["qty"] * lot["unit_cost"]
+		
+		return lots
+	
+	
+	def add_reorder_level_listener(self, listener: Callable):
+		self._reorder_level_listeners.append(listener)
+	
+	
+	async def get_skus_below_reorder_level(self):
+		#sku -> {"unit", "qty", "reorder_level"} in base unit... costs time in proportion to the skus below, not the catalogue
+		return {
+			sku: {
+				"unit": self._inventory_snapshot[sku]["unit"],
+				"qty": self._inventory_snapshot[sku]["qty"],
+				"reorder_level": self._product_records[sku].product_inventory.reorder_level
+			}
+			for sku in self._skus_below_reorder_level
+		}
 	
 	
 	async def get_stock_level(self, sku: str, unit: Unit):
@@ -49,59 +459,664 @@ class Store(object):
 		return product_inventory.get_qty(unit=unit)
 	
 	
+	async def get_stock_levels(self, skus: List[str], unit: Unit):
+		#all skus are resolved before any conversion, so an unknown sku/unsupported unit fails the whole batch
+		product_inventories = [self._get_product_inventory_by_sku(sku) for sku in skus]
+		
+		return {
+			product_inventory.sku: product_inventory.get_qty(unit=unit)
+			for product_inventory in product_inventories
+		}
+	
+	
+	async def get_stock_levels_in_unit(self, unit: Unit, skus: List[str] = None):
+		#like get_stock_levels, but skus this store doesn't have, or that don't support unit, are left out instead of raising...
+		#meant for reports across many stores, where not every store stocks every product
+		if skus is None:
+			skus = self._product_records.keys()
+		
+		stock_levels = {}
+		for sku in skus:
+			product_record = self._product_records.get(sku)
+			if product_record is None or not product_record.product_inventory.supports_unit(unit):
+				continue
+			
+			stock_levels[sku] = product_record.product_inventory.get_qty(unit=unit)
+		
+		return stock_levels
+	
+	
+	async def get_stock_levels_batch(self, sku_units: List[Tuple[str, Unit]] = None, unit_costs: List[float] = None):
+		#qtys of many (sku, unit) pairs in one vectorized pass over packed arrays (see InventoryColumns)...
+		#None means the whole catalogue, each product in its base unit... an unknown sku or unsupported unit fails the whole batch
+		#with unit_costs (the cost of one of each line's unit, in the same order), the value of each line and their total come back too
+		#returns {"skus", "units", "qtys", "values", "total_value"}, a list per column
+		if sku_units is None:
+			skus, units, qtys = self._inventory_columns.get_catalogue()
+		else:
+			skus = [sku for sku, _ in sku_units]
+			units = [unit for _, unit in sku_units]
+			qtys = self._inventory_columns.convert(skus = skus, units = units)
+		
+		values, total_value = (None, None) if unit_costs is None else InventoryColumns.get_values(qtys = qtys, unit_costs = unit_costs)
+		
+		return {
+			"skus": skus,
+			"units": units,
+			"qtys": qtys,
+			"values": values,
+			"total_value": total_value
+		}
+	
+	
 	async def receive(self, received_entry: Dict):
-		if "store_id" in received_entry and received_entry["store_id"] is not None:
-			id_of_store_to_receive = received_entry["store_id"]
-			if not id_of_store_to_receive == self.store_id:
-				raise ValueError(f"Invalid Store ID entered? Tried to receive goods for Store with id ({id_of_store_to_receive}) into Store with id ({self.store_id})")
+		#returns {"received_entry_id", "timestamp", "bals": {sku: bal}, "is_replay"}, bal being the sku's (base unit) balance right after
+		#an entry whose received_entry_id was already applied is not applied again... the result it was applied with comes back instead,
+		#with is_replay set, so a receive can safely be retried. Only the last entries' results are kept (see ReceivedEntryIndex),
+		#an older one comes back as {"received_entry_id", "timestamp": None, "bals": None, "is_replay": True}
+		#entries without a received_entry_id are always applied
+		#an entry for another store is rejected before its id is looked up, so it can't pass for a retry of one of this store's
+		self._check_store_id_OR_raise_err(entry = received_entry, event_type = "receive")
+		received_entry_id = received_entry.get("received_entry_id")
+		if received_entry_id is not None:
+			replayed_result = self._get_received_entry_result(received_entry_id)
+			if replayed_result is not None:
+				return replayed_result
+		
+		return await self._apply_entry(change_type = ChangeType.RECEIVE, entry = received_entry, received_entry_id = received_entry_id)
+	
+	
+	def _get_received_entry_result(self, received_entry_id: str):
+		#None if the entry was never applied
+		result = self._received_entries.get(received_entry_id)
+		if result is None:
+			return None
+		
+		return {
+			"received_entry_id": received_entry_id,
+			"timestamp": result.get("timestamp"),
+			"bals": dict(result["bals"]) if "bals" in result else None,
+			"is_replay": True
+		}
+	
+	
+	def _record_received_entry(self, received_entry_id: str | None, lines_by_sku: Dict, timestamp: datetime):
+		result = {
+			"received_entry_id": received_entry_id,
+			"timestamp": timestamp,
+			"bals": {product_record.product_inventory.sku: product_record.product_inventory.get_qty() for product_record, _ in lines_by_sku.values()}
+		}
+		if received_entry_id is not None:
+			self._received_entries.add(received_entry_id, result)
+		
+		return {**result, "bals": dict(result["bals"]), "is_replay": False}
+	
+	
+	async def issue(self, issued_entry: Dict):
+		#same shape as a received entry, with "issued_to" and "issued_products"
+		await self._apply_entry(change_type = ChangeType.ISSUE, entry = issued_entry)
+	
+	
+	async def adjust(self, adjusted_entry: Dict):
+		#same shape as a received entry, with "reason" and "adjusted_products"... each line sets the qty of its product
+		await self._apply_entry(change_type = ChangeType.ADJUST, entry = adjusted_entry)
+	
+	
+	def _check_store_id_OR_raise_err(self, entry: Dict, event_type: str):
+		if "store_id" in entry and entry["store_id"] is not None:
+			id_of_store = entry["store_id"]
+			if not id_of_store == self.store_id:
+				raise ValueError(f"Invalid Store ID entered? Tried to {event_type} goods for Store with id ({id_of_store}) into Store with id ({self.store_id})")
+	
+	
+	async def _apply_entry(self, change_type: ChangeType, entry: Dict, received_entry_id: str = None):
+		#returns the result of a receipt (see receive), None for other change types
+		event_type, location_key, products_key = _ENTRY_FIELDS[change_type]
+		self._check_store_id_OR_raise_err(entry = entry, event_type = event_type)
+		
+		location = entry[location_key]
+		products = entry[products_key]
 		
-		received_from = received_entry["received_from"]
+		await self._change_feed.wait_for_room()
+		async with self._lock_skus([product["sku"] for product in products]):
+			#a retry may have waited on the locks while the first attempt was being applied
+			if received_entry_id is not None and received_entry_id in self._received_entries:
+				return self._get_received_entry_result(received_entry_id)
+			
+			#everything is validated before anything is changed, so a bad line leaves the store untouched
+			lines_by_sku = self._validate_lines(change_type = change_type, products = products)
+			
+			timestamp = datetime.now()
+			self._log_lines(change_type = change_type, location = location, lines_by_sku = lines_by_sku, timestamp = timestamp, received_entry_id = received_entry_id)
+			self._commit_lines(change_type = change_type, location = location, lines_by_sku = lines_by_sku, timestamp = timestamp)
+			
+			if change_type == ChangeType.RECEIVE:
+				return self._record_received_entry(received_entry_id = received_entry_id, lines_by_sku = lines_by_sku, timestamp = timestamp)
+	
+	
+	async def transfer(self, to_store: "Store", transfer_entry: Dict):
+		#moves stock from this store to to_store as one operation:  {"transfer_id", "transferred_products": [{"sku", "qty", "unit"}]}
+		#returns {"transfer_id", "is_replay"}... transfer_id is optional (a fresh one is used when missing), and a transfer whose
+		#transfer_id to_store already received is not applied again, so a transfer can safely be retried
+		#lines are converted with each store's own conversions, and both sides are validated before either is changed
+		if to_store is self or to_store.store_id == self.store_id:
+			raise ValueError(f"Tried to transfer goods from Store with id ({self.store_id}) into itself")
+		
+		transfer_id = str(uuid4()) if transfer_entry.get("transfer_id") is None else transfer_entry["transfer_id"]
+		received_entry_id = _TRANSFER_RECEIVED_ENTRY_ID_PREFIX + transfer_id
+		products = transfer_entry["transferred_products"]
+		skus = [product["sku"] for product in products]
+		
+		await self._change_feed.wait_for_room()
+		await to_store._change_feed.wait_for_room()
+		async with AsyncExitStack() as stack:
+			#both stores' locks, in store_id order, so two opposite transfers can't deadlock
+			for store in sorted([self, to_store], key = lambda store: store.store_id):
+				await stack.enter_async_context(store._lock_skus(skus))
+			
+			if received_entry_id in to_store._received_entries:
+				return {"transfer_id": transfer_id, "is_replay": True}
+			
+			issued_lines_by_sku = self._validate_lines(change_type = ChangeType.ISSUE, products = products)
+			received_lines_by_sku = to_store._validate_lines(change_type = ChangeType.RECEIVE, products = products)
+			
+			timestamp = datetime.now()
+			issued_to = f"Transfer to {to_store.store_name}"
+			received_from = f"Transfer from {self.store_name}"
+			#the whole transfer goes to this store's log, then its receipt to to_store's... if the receipt can't be logged,
+			#the transfer is taken out of this store's log again. A crash in between leaves a transfer to_store never received,
+			#which recover_transfers applies to it on recovery
+			seq = self._log_event({
+				"type": "transfer",
+				"transfer_id": transfer_id,
+				"to_store_id": to_store.store_id,
+				"issued_to": issued_to,
+				"received_from": received_from,
+				"timestamp": timestamp.isoformat(),
+				"issued_products": self._encode_lines(issued_lines_by_sku),
+				"received_products": self._encode_lines(received_lines_by_sku)
+			})
+			try:
+				to_store._log_lines(change_type = ChangeType.RECEIVE, location = received_from, lines_by_sku = received_lines_by_sku, timestamp = timestamp, received_entry_id = received_entry_id)
+			except BaseException:
+				self._unlog_event(seq)
+				raise
+			
+			self._commit_lines(change_type = ChangeType.ISSUE, location = issued_to, lines_by_sku = issued_lines_by_sku, timestamp = timestamp)
+			to_store._commit_lines(change_type = ChangeType.RECEIVE, location = received_from, lines_by_sku = received_lines_by_sku, timestamp = timestamp)
+			to_store._record_received_entry(received_entry_id = received_entry_id, lines_by_sku = received_lines_by_sku, timestamp = timestamp)
+		
+		return {"transfer_id": transfer_id, "is_replay": False}
+	
+	
+	def _take_replayed_transfers(self):
+		replayed_transfers, self._replayed_transfers = self._replayed_transfers, []
+		return replayed_transfers
+	
+	
+	async def _receive_replayed_transfer(self, transfer_event: Dict):
+		#applies the receipt side of a transfer replayed from its source's log, unless this store already received it...
+		#returns whether it was applied
+		received_entry_id = _TRANSFER_RECEIVED_ENTRY_ID_PREFIX + transfer_event["transfer_id"]
+		products = self._decode_lines(transfer_event["received_products"])
+		
+		async with self._lock_skus([product["sku"] for product in products]):
+			if received_entry_id in self._received_entries:
+				return False
+			
+			lines_by_sku = self._validate_lines(change_type = ChangeType.RECEIVE, products = products)
+			timestamp = datetime.fromisoformat(transfer_event["timestamp"])
+			self._log_lines(change_type = ChangeType.RECEIVE, location = transfer_event["received_from"], lines_by_sku = lines_by_sku, timestamp = timestamp, received_entry_id = received_entry_id)
+			self._commit_lines(change_type = ChangeType.RECEIVE, location = transfer_event["received_from"], lines_by_sku = lines_by_sku, timestamp = timestamp)
+			self._record_received_entry(received_entry_id = received_entry_id, lines_by_sku = lines_by_sku, timestamp = timestamp)
+		
+		return True
+	
+	
+	def _log_lines(self, change_type: ChangeType, location: str, lines_by_sku: Dict, timestamp: datetime, received_entry_id: str = None):
+		event_type, location_key, products_key = _ENTRY_FIELDS[change_type]
+		event = {
+			"type": event_type,
+			location_key: location,
+			"timestamp": timestamp.isoformat(),
+			products_key: self._encode_lines(lines_by_sku)
+		}
+		if received_entry_id is not None:
+			event["received_entry_id"] = received_entry_id
+		self._log_event(event)
+	
+	
+	@staticmethod
+	def _encode_lines(lines_by_sku: Dict):
+		#validated lines as logged:  [sku, qty, unit code], and lines received into a lot carry [lot_id, expiry_date, unit_cost] on top
+		return [
+			[product_record.product_inventory.sku, qty, unit.value] + ([] if lot is None else [lot[0], None if lot[1] is None else lot[1].isoformat(), lot[2]])
+			for product_record, lines in lines_by_sku.values()
+			for qty, unit, _, _, lot in lines
+		]
+	
+	
+	@staticmethod
+	def _decode_lines(logged_lines: List[List]):
+		#logged lines (see _encode_lines) back to the product lines of an entry
+		return [
+			{"sku": line[0], "qty": line[1], "unit": Unit(line[2])} if len(line) == 3 else
+			{"sku": line[0], "qty": line[1], "unit": Unit(line[2]), "lot_id": line[3], "expiry_date": None if line[4] is None else date.fromisoformat(line[4]), "unit_cost": line[5]}
+			for line in logged_lines
+		]
+	
+	
+	def _validate_lines(self, change_type: ChangeType, products: List[Dict]):
+		#returns sku -> (ProductRecord, [(qty, unit, qty_in_base_unit, bal, lot), ...])... lines keep their order within a sku
+		#bal is the (base unit) balance right after the line, so issuing more than is available fails here
+		#lot is (lot_id, expiry_date, unit_cost, unit_cost per base unit) for a line received into a lot, None otherwise
+		lines_by_sku = {}
+		#(sku, lot_id) -> lot, of the lots received earlier in the same entry
+		lots = {}
 		
-		for product in received_entry["received_products"]:
+		for product in products:
 			sku = product["sku"]
-			qty=float(product["qty"])
-			change_type=ChangeType.RECEIVE
-			unit=product["unit"]
-			
-			product_inventory = self._get_product_inventory_by_sku(sku)
-			product_inventory.change_qty(qty = qty, unit=unit, change_type=change_type)
-			
-			current_bal = product_inventory.get_qty()
-			current_base_unit = product_inventory.base_unit
-			
-			product_stock_movement = self._get_product_stock_movement_by_sku(sku)
-			product_stock_movement.record(
-				location = received_from,
-				qty=qty,
-				change_type=change_type,
-				unit=unit,
-				bal=current_bal,
-				base_unit=current_base_unit 
+			qty = float(product["qty"])
+			unit = product["unit"]
+			
+			grouped = lines_by_sku.get(sku)
+			if grouped is None:
+				grouped = lines_by_sku[sku] = (self._get_product_record_by_sku(sku), [])
+			
+			product_record, lines = grouped
+			product_inventory = product_record.product_inventory
+			qty_in_base_unit = product_inventory.to_base_unit(qty = qty, unit = unit)
+			current_bal = lines[-1][3] if lines else product_inventory.get_qty()
+			bal = product_inventory.get_qty_after_change(qty_in_base_unit = qty_in_base_unit, change_type = change_type, current_qty = current_bal)
+			lot = self._validate_lot(product_record = product_record, change_type = change_type, product = product, unit = unit, lots = lots)
+			lines.append((qty, unit, qty_in_base_unit, bal, lot))
+		
+		return lines_by_sku
+	
+	
+	def _validate_lot(self, product_record: ProductRecord, change_type: ChangeType, product: Dict, unit: Unit, lots: Dict):
+		#issues are always drawn first expiring first, so only receipts (and adjustments up) name a lot
+		if change_type == ChangeType.ISSUE or not ("lot_id" in product or "expiry_date" in product or "unit_cost" in product):
+			return None
+		
+		product_inventory = product_record.product_inventory
+		if product_record.product_lots is None:
+			raise ValueError(f"Lot tracking is not enabled for Product with sku ({product_inventory.sku})")
+		
+		unit_cost = product.get("unit_cost")
+		if unit_cost is not None:
+			unit_cost = float(unit_cost)
+		lot = (product.get("lot_id"), product.get("expiry_date"), unit_cost, None if unit_cost is None else unit_cost * product_inventory.from_base_unit(qty = 1, unit = unit))
+		product_record.product_lots.check_receipt_OR_raise_err(lot_id = lot[0], expiry_date = lot[1], unit_cost = lot[3])
+		
+		earlier_lot = lots.setdefault((product_inventory.sku, lot[0]), lot)
+		if earlier_lot[1] != lot[1] or earlier_lot[3] != lot[3]:
+			raise ValueError(f"Lot ({lot[0]}) is received with different expiry dates or unit costs in the same entry")
+		
+		return lot
+	
+	
+	def _commit_lines(self, change_type: ChangeType, location: str, lines_by_sku: Dict, timestamp: datetime):
+		event_type = _ENTRY_FIELDS[change_type][0]
+		
+		for product_record, lines in lines_by_sku.values():
+			product_inventory = product_record.product_inventory
+			product_stock_movement = product_record.product_stock_movement
+			base_unit = product_inventory.base_unit
+			
+			bal_before = product_inventory.get_qty()
+			#one balance update per sku, no matter how many lines it has in the entry... it lands on the balance validation projected
+			#line by line, as summing the lines first could round differently (and fail an issue that was validated, after it was logged)
+			product_inventory.change_qty(qty = lines[-1][3], change_type = ChangeType.ADJUST)
+			
+			last_line_index = len(lines) - 1
+			for line_index, (qty, unit, qty_in_base_unit, bal, lot) in enumerate(lines):
+				#last line carries the exact balance the inventory ended up with
+				if line_index == last_line_index:
+					bal = product_inventory.get_qty()
+				
+				for row_qty, row_bal, lot_id in self._allocate_lots(product_record = product_record, change_type = change_type, qty = qty, unit = unit, qty_in_base_unit = qty_in_base_unit, bal_before = bal_before, bal = bal, lot = lot):
+					product_stock_movement.record(
+						location = location,
+						qty=row_qty,
+						change_type=change_type,
+						unit=unit,
+						bal=row_bal,
+						base_unit=base_unit,
+						timestamp=timestamp,
+						lot_id=lot_id
+					)
+				bal_before = bal
+				self._publish_change(event_type = event_type, sku = product_inventory.sku, location = location, qty = qty, unit = unit, bal = bal, base_unit = base_unit, timestamp = timestamp)
+	
+	
+	def _allocate_lots(self, product_record: ProductRecord, change_type: ChangeType, qty: float, unit: Unit, qty_in_base_unit: float, bal_before: float, bal: float, lot: Tuple | None):
+		#moves one (already validated) line in or out of the product's lots... returns the line's stock movement rows,
+		#[(qty, bal, lot_id), ...], one per lot it touched... just the line itself for a product without lot tracking
+		product_lots = product_record.product_lots
+		if product_lots is None:
+			return [(qty, bal, None)]
+		
+		lot_id, expiry_date, _, base_unit_cost = (None, None, None, None) if lot is None else lot
+		if change_type == ChangeType.RECEIVE or (change_type == ChangeType.ADJUST and bal >= bal_before):
+			product_lots.receive(qty = qty_in_base_unit if change_type == ChangeType.RECEIVE else bal - bal_before, lot_id = lot_id, expiry_date = expiry_date, unit_cost = base_unit_cost)
+			return [(qty, bal, lot_id)]
+		
+		allocations = product_lots.allocate(qty_in_base_unit if change_type == ChangeType.ISSUE else bal_before - bal)
+		if not allocations:
+			return [(qty, bal, None)]
+		
+		product_inventory = product_record.product_inventory
+		rows = []
+		row_bal = bal_before
+		for lot_id, lot_qty in allocations:
+			row_bal = row_bal - lot_qty
+			#an issue's rows split its qty between the lots... an adjustment's rows all carry the level it set
+			rows.append((product_inventory.from_base_unit(qty = lot_qty, unit = unit) if change_type == ChangeType.ISSUE else qty, row_bal, lot_id))
+		
+		#the last row lands on the line's exact balance
+		rows[-1] = (rows[-1][0], bal, rows[-1][2])
+		
+		return rows
+	
+	
+	async def apply_movements(self, movements: List[Dict]):
+		#movements of any change type, each {"change_type", "sku", "qty", "unit", "location"}, applied in order...
+		#a line that fails (unknown sku/unit, not enough stock, ...) is reported and skipped, the rest still go through
+		#receipts of lot tracked products go in without a lot here (see enable_lot_tracking), issues are still drawn first expiring first
+		await self._change_feed.wait_for_room()
+		async with self._lock_skus([movement["sku"] for movement in movements if isinstance(movement.get("sku"), str)]):
+			valid_movements, failures = self._validate_movements(movements)
+			
+			timestamp = datetime.now()
+			if valid_movements:
+				self._log_event({
+					"type": "movements",
+					"timestamp": timestamp.isoformat(),
+					"movements": [
+						[change_type.value, product_record.product_inventory.sku, qty, unit.value, location]
+						for change_type, product_record, qty, unit, _, location in valid_movements
+					]
+				})
+			self._commit_movements(valid_movements = valid_movements, timestamp = timestamp)
+		
+		return {
+			"applied_count": len(valid_movements),
+			"failures": failures
+		}
+	
+	
+	def _validate_movements(self, movements: List[Dict]):
+		#returns ([(change_type, ProductRecord, qty, unit, qty_in_base_unit, location), ...], [{"index", "sku", "error"}, ...])
+		valid_movements = []
+		failures = []
+		projected_bals = {}
+		
+		for index, movement in enumerate(movements):
+			try:
+				change_type = movement["change_type"]
+				if not isinstance(change_type, ChangeType):
+					raise UnsupportedChangeTypeError(f"unsupported value entered for change_type ({change_type})")
+				
+				product_record = self._get_product_record_by_sku(movement["sku"])
+				product_inventory = product_record.product_inventory
+				qty = float(movement["qty"])
+				unit = movement["unit"]
+				location = movement["location"]
+				
+				qty_in_base_unit = product_inventory.to_base_unit(qty = qty, unit = unit)
+				current_bal = projected_bals.get(product_inventory.sku)
+				projected_bals[product_inventory.sku] = product_inventory.get_qty_after_change(qty_in_base_unit = qty_in_base_unit, change_type = change_type, current_qty = current_bal)
+			
+			except (KeyError, TypeError, ValueError, UnexistingProduct, UnsupportedUnitError, UnsupportedChangeTypeError, InvalidQtyError) as error:
+				failures.append({"index": index, "sku": movement.get("sku"), "error": error})
+				continue
+			
+			valid_movements.append((change_type, product_record, qty, unit, qty_in_base_unit, location))
+		
+		return valid_movements, failures
+	
+	
+	def _commit_movements(self, valid_movements: List, timestamp: datetime):
+		#every line was checked against the balances the lines before it leave behind, so none of these can fail
+		for change_type, product_record, qty, unit, qty_in_base_unit, location in valid_movements:
+			product_inventory = product_record.product_inventory
+			bal_before = product_inventory.get_qty()
+			product_inventory.change_qty(qty = qty_in_base_unit, change_type = change_type)
+			bal = product_inventory.get_qty()
+			for row_qty, row_bal, lot_id in self._allocate_lots(product_record = product_record, change_type = change_type, qty = qty, unit = unit, qty_in_base_unit = qty_in_base_unit, bal_before = bal_before, bal = bal, lot = None):
+				product_record.product_stock_movement.record(
+					location = location,
+					qty = row_qty,
+					change_type = change_type,
+					unit = unit,
+					bal = row_bal,
+					base_unit = product_inventory.base_unit,
+					timestamp = timestamp,
+					lot_id = lot_id
+				)
+			self._publish_change(event_type = _ENTRY_FIELDS[change_type][0], sku = product_inventory.sku, location = location, qty = qty, unit = unit, bal = bal, base_unit = product_inventory.base_unit, timestamp = timestamp)
+	
+	
+	async def compact_stock_movements(self, cutoff: datetime, archive_dir: str = None):
+		#rolls every product's movements before cutoff into one carried-forward balance row (see ProductStockMovement.compact)...
+		#returns how many rows were rolled up in all
+		#the archive segments are all written before the event is logged, so a bad archive_dir fails with nothing compacted or logged
+		archive_segments = self._write_archive_segments(cutoff = cutoff, archive_dir = archive_dir)
+		self._log_event({
+			"type": "compact_stock_movements",
+			"cutoff": cutoff.isoformat(),
+			"archive_dir": archive_dir
+		})
+		return self._compact_stock_movements(cutoff = cutoff, archive_segments = archive_segments)
+	
+	
+	def _write_archive_segments(self, cutoff: datetime, archive_dir: str | None):
+		#sku -> archive segment of the rows compacting before cutoff rolls up... {} without archive_dir
+		if archive_dir is None:
+			return {}
+		
+		os.makedirs(archive_dir, exist_ok = True)
+		archive_segments = {}
+		for sku, product_record in self._product_records.items():
+			archive_segment = product_record.product_stock_movement.write_archive_segment(cutoff = cutoff, archive_dir = archive_dir)
+			if archive_segment is not None:
+				archive_segments[sku] = archive_segment
+		
+		return archive_segments
+	
+	
+	def _compact_stock_movements(self, cutoff: datetime, archive_segments: Dict):
+		return sum(
+			product_record.product_stock_movement.compact(cutoff = cutoff, archive_segment = archive_segments.get(sku))
+			for sku, product_record in self._product_records.items()
+		)
+	
+	
+	async def get_archived_product_stock_movements(self, sku: str):
+		#async generator of the archived rows of sku, oldest first, read from disk one segment at a time
+		for movement in self._get_product_stock_movement_by_sku(sku).get_archived_movements():
+			yield movement
+	
+	
+	def _replay_event(self, event: Dict):
+		#re-applies a logged event during recovery... it was validated before it was logged, and is not logged again
+		event_type = event["type"]
+		
+		if event_type == "create_product_inventory":
+			self._create_product_record(
+				sku = event["sku"],
+				product_name = event["product_name"],
+				base_unit = Unit(event["base_unit"]),
+				opening_bal = event["opening_bal"],
+				timestamp = datetime.fromisoformat(event["timestamp"]),
+				#logs written before qty_scale existed don't carry it
+				qty_scale = event.get("qty_scale")
 			)
+		
+		elif event_type == "import_product_inventories":
+			self._import_product_inventories(timestamp = datetime.fromisoformat(event["timestamp"]), products = [
+				{"sku": sku, "product_name": product_name, "base_unit": Unit(base_unit_code), "opening_bal": opening_bal, "qty_scale": qty_scale, "units": [(Unit(unit_code), conversion_factor) for unit_code, conversion_factor in units]}
+				for sku, product_name, base_unit_code, opening_bal, qty_scale, units in event["products"]
+			])
+		
+		elif event_type == "add_supported_unit":
+			product_inventory = self._get_product_inventory_by_sku(event["sku"])
+			self._add_supported_unit(product_inventory = product_inventory, unit = Unit(event["unit"]), conversion_factor = event["conversion_factor"])
+		
+		elif event_type in _CHANGE_TYPES_BY_EVENT_TYPE:
+			change_type = _CHANGE_TYPES_BY_EVENT_TYPE[event_type]
+			_, location_key, products_key = _ENTRY_FIELDS[change_type]
+			lines_by_sku = self._validate_lines(change_type = change_type, products = self._decode_lines(event[products_key]))
+			timestamp = datetime.fromisoformat(event["timestamp"])
+			self._commit_lines(change_type = change_type, location = event[location_key], lines_by_sku = lines_by_sku, timestamp = timestamp)
+			
+			#logs written before receipts were deduplicated don't carry received_entry_id
+			if event.get("received_entry_id") is not None:
+				self._record_received_entry(received_entry_id = event["received_entry_id"], lines_by_sku = lines_by_sku, timestamp = timestamp)
+		
+		elif event_type == "transfer":
+			#only the issue side is this store's... the receipt side is to_store's own event, unless a crash came
+			#between the two (see recover_transfers)
+			lines_by_sku = self._validate_lines(change_type = ChangeType.ISSUE, products = self._decode_lines(event["issued_products"]))
+			self._commit_lines(change_type = ChangeType.ISSUE, location = event["issued_to"], lines_by_sku = lines_by_sku, timestamp = datetime.fromisoformat(event["timestamp"]))
+			self._replayed_transfers.append(event)
+		
+		elif event_type == "movements":
+			valid_movements, _ = self._validate_movements([
+				{"change_type": ChangeType(change_type_code), "sku": sku, "qty": qty, "unit": Unit(unit_code), "location": location}
+				for change_type_code, sku, qty, unit_code, location in event["movements"]
+			])
+			self._commit_movements(valid_movements = valid_movements, timestamp = datetime.fromisoformat(event["timestamp"]))
+		
+		elif event_type == "enable_lot_tracking":
+			self._enable_lot_tracking(self._get_product_record_by_sku(event["sku"]))
+		
+		elif event_type == "set_reorder_level":
+			unit_code = event["unit"]
+			product_inventory = self._get_product_inventory_by_sku(event["sku"])
+			product_inventory.set_reorder_level(reorder_level = event["reorder_level"], unit = None if unit_code is None else Unit(unit_code))
+			self._update_reorder_index(product_inventory)
+		
+		elif event_type == "compact_stock_movements":
+			cutoff = datetime.fromisoformat(event["cutoff"])
+			#segments rewritten on replay land on the same files
+			archive_segments = self._write_archive_segments(cutoff = cutoff, archive_dir = event["archive_dir"])
+			self._compact_stock_movements(cutoff = cutoff, archive_segments = archive_segments)
+		
+		else:
+			raise ValueError(f"Unknown event type ({event_type}) in write-ahead log")
+		
+		self._notify_reorder_level_listeners()
+	
+	
+	def get_state(self):
+		return {
+			"store_id": self.store_id,
+			"store_name": self.store_name,
+			"received_entries": self._received_entries.get_state(),
+			"products": [
+				(
+					product_record.product_inventory.get_state(),
+					product_record.product_stock_movement.get_state(),
+					None if product_record.product_lots is None else product_record.product_lots.get_state()
+				)
+				for product_record in self._product_records.values()
+			]
+		}
+	
+	
+	@classmethod
+	def from_state(cls, state: Dict):
+		store = cls(store_id = state["store_id"], store_name = state["store_name"])
+		store._received_entries = ReceivedEntryIndex.from_state(state["received_entries"])
+		for product_inventory_state, product_stock_movement_state, product_lots_state in state["products"]:
+			store._add_product_record(ProductRecord(
+				product_inventory = ProductInventory.from_state(product_inventory_state),
+				product_stock_movement = ProductStockMovement.from_state(product_stock_movement_state),
+				product_lots = None if product_lots_state is None else ProductLots.from_state(product_lots_state)
+			))
+		
+		return store
 	
 	
 	async def get_inventory_snapshot(self):
+		#a copy the caller may change... use get_inventory_snapshot_view to read without copying
+		return {sku: dict(inventory) for sku, inventory in self._inventory_snapshot.items()}
+	
+	
+	async def get_stock_level_as_at(self, sku: str, timestamp: datetime, unit: Unit = None):
+		#qty of sku right after the last movement at or before timestamp... 0 if the product didn't exist yet
+		#converted with the product's current conversions... compacted history is read back from its archive segments,
+		#CompactedHistoryError if it was compacted without one
+		product_record = self._get_product_record_by_sku(sku)
+		bal = product_record.product_stock_movement.get_bal_as_at(timestamp)
+		
+		return product_record.product_inventory.from_base_unit(qty = 0 if bal is None else bal, unit = unit)
+	
+	
+	async def get_inventory_snapshot_as_at(self, timestamp: datetime):
+		#same shape as get_inventory_snapshot, as it was at timestamp... products created after it are left out
+		#raises CompactedHistoryError like get_stock_level_as_at
+		#one binary search per sku, so it costs O(skus * log(movements per sku))
 		inventory_snapshot = {}
 		
-		for product_inventory in self._inventory_list:
-			sku = product_inventory.sku
-			base_unit = product_inventory.base_unit
-			qty = product_inventory.get_qty()
+		for sku, product_record in self._product_records.items():
+			bal = product_record.product_stock_movement.get_bal_as_at(timestamp)
+			if bal is None:
+				continue
 			
 			inventory_snapshot[sku] = {
-				"unit": base_unit,
-				"qty": qty
+				"unit": product_record.product_inventory.base_unit,
+				"qty": bal
 			}
 		
 		return inventory_snapshot
 	
 	
-	async def get_product_stock_movement_snapshot(self, sku: str):
+	async def get_inventory_snapshot_view(self):
+		#live, read-only view of the materialized snapshot:  {sku: {"unit", "qty"}}
+		return MappingProxyType(self._inventory_snapshot)
+	
+	
+	async def get_inventory_version(self):
+		return self._inventory_version
+	
+	
+	async def get_inventory_changes_since(self, version: int):
+		#{"version", "changes": {sku: {"unit", "qty"}}} of the skus whose qty changed after version...
+		#pass the returned version in on the next poll. Costs time in proportion to the number of changed skus
+		changes = {}
+		for sku in reversed(self._sku_versions):
+			if self._sku_versions[sku] <= version:
+				break
+			
+			changes[sku] = self._inventory_snapshot[sku]
+		
+		return {
+			"version": self._inventory_version,
+			"changes": changes
+		}
+	
+	
+	async def get_product_stock_movement_snapshot(self, sku: str, since: datetime = None, until: datetime = None, offset: int = 0, limit: int = None):
 		product_stock_movement = self._get_product_stock_movement_by_sku(sku)
-		return product_stock_movement.get_snapshot()
+		return product_stock_movement.get_snapshot(since = since, until = until, offset = offset, limit = limit)
 	
 	
+	async def count_product_stock_movements(self, sku: str, since: datetime = None, until: datetime = None):
+		product_stock_movement = self._get_product_stock_movement_by_sku(sku)
+		return product_stock_movement.count(since = since, until = until)
+	
+	
+	def stream_product_stock_movement_snapshot(self, sku: str, since: datetime = None, until: datetime = None, offset: int = 0, limit: int = None):
+		#not async itself... it returns an async generator, used as:  async for movement in store.stream_product_stock_movement_snapshot(sku)
+		product_stock_movement = self._get_product_stock_movement_by_sku(sku)
+		return product_stock_movement.stream_snapshot(since = since, until = until, offset = offset, limit = limit)
+
+
 
 
-async def create_store(store_name:str, store_id:str=str(uuid4())):
-	return Store(store_id = store_id, store_name = store_name)
\ No newline at end of file
+async def create_store(store_name:str, store_id:str=None):
+	#a fresh id per store when store_id is not given
+	return Store(store_id = str(uuid4()) if store_id is None else store_id, store_name = store_name)
\ No newline at end of file
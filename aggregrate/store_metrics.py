@@ -0,0 +1,210 @@
+import time
+import inspect
+import logging
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List
+
+
+_logger = logging.getLogger(__name__)
+
+#upper bounds of the latency buckets, in seconds (10us to 10s)... and of the lines-per-call buckets
+LATENCY_BUCKETS = [0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+LINE_COUNT_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1_000, 2_000, 5_000, 10_000, 20_000, 50_000]
+
+#Store method -> how many lines a call carries, from its arguments (None when lines don't apply)
+MEASURED_OPERATIONS: Dict[str, Callable | None] = {
+	"create_product_inventory": None,
+	"receive": lambda received_entry: len(received_entry["received_products"]),
+	"issue": lambda issued_entry: len(issued_entry["issued_products"]),
+	"adjust": lambda adjusted_entry: len(adjusted_entry["adjusted_products"]),
+	"transfer": lambda to_store, transfer_entry: len(transfer_entry["transferred_products"]),
+	"apply_movements": lambda movements: len(movements),
+	"get_stock_level": None,
+	"get_stock_levels": lambda skus, unit: len(skus),
+	"get_stock_levels_batch": None,
+	"get_inventory_snapshot": None,
+	"get_product_stock_movement_snapshot": None,
+	"compact_stock_movements": None,
+}
+#the steps inside those operations, timed on their own... sku lookup and unit conversion happen in the validate steps,
+#balance updates and ledger appends in the commit steps
+MEASURED_PHASES = ["_validate_lines", "_commit_lines", "_validate_movements", "_commit_movements", "_log_event"]
+
+
+
+class Histogram(object):
+	
+	def __init__(self, bounds: List[float]):
+		self._bounds = bounds
+		#one count per bound, and one more for everything above the last bound
+		self._bucket_counts = [0] * (len(bounds) + 1)
+		self.count = 0
+		self.total = 0
+		self.max = None
+	
+	
+	def observe(self, value: float):
+		self._bucket_counts[bisect_left(self._bounds, value)] += 1
+		self.count = self.count + 1
+		self.total = self.total + value
+		if self.max is None or value > self.max:
+			self.max = value
+	
+	
+	def get_quantile(self, fraction: float):
+		#upper bound of the bucket the quantile falls in (the max, above the last bound)... None when nothing was observed
+		if self.count == 0:
+			return None
+		
+		rank = fraction * self.count
+		seen = 0
+		for bound, bucket_count in zip(self._bounds, self._bucket_counts):
+			seen = seen + bucket_count
+			if seen >= rank:
+				return min(bound, self.max)
+		
+		return self.max
+	
+	
+	def get_snapshot(self):
+		return {
+			"count": self.count,
+			"sum": self.total,
+			"max": self.max,
+			"p50": self.get_quantile(0.50),
+			"p95": self.get_quantile(0.95),
+			"p99": self.get_quantile(0.99),
+			#(upper bound, count)... None stands for everything above the last bound
+			"buckets": list(zip(self._bounds + [None], self._bucket_counts))
+		}
+
+
+
+class StoreMetrics(object):
+	#per-operation counts, latency and lines-per-call histograms, and per-phase latencies of one Store (see Store.enable_metrics)...
+	#hooks are called with (name, seconds, line_count) after every measured operation or phase, e.g. to feed a tracer...
+	#they run in the middle of the store's changes, so a hook that raises is logged and skipped
+	
+	def __init__(self):
+		#name -> {"count", "error_count", "latency": Histogram, "lines": Histogram}
+		self._operations: Dict[str, Dict] = {}
+		#name -> latency Histogram
+		self._phases: Dict[str, Histogram] = {}
+		self._hooks: List[Callable] = []
+	
+	
+	def add_hook(self, hook: Callable):
+		self._hooks.append(hook)
+	
+	
+	def record_operation(self, name: str, seconds: float, line_count: int | None = None, failed: bool = False):
+		operation = self._operations.get(name)
+		if operation is None:
+			operation = self._operations[name] = {"count": 0, "error_count": 0, "latency": Histogram(LATENCY_BUCKETS), "lines": Histogram(LINE_COUNT_BUCKETS)}
+		
+		operation["count"] += 1
+		if failed:
+			operation["error_count"] += 1
+		operation["latency"].observe(seconds)
+		if line_count is not None:
+			operation["lines"].observe(line_count)
+		
+		self._call_hooks(name = name, seconds = seconds, line_count = line_count)
+	
+	
+	def record_phase(self, name: str, seconds: float):
+		phase = self._phases.get(name)
+		if phase is None:
+			phase = self._phases[name] = Histogram(LATENCY_BUCKETS)
+		
+		phase.observe(seconds)
+		
+		self._call_hooks(name = name, seconds = seconds, line_count = None)
+	
+	
+	def _call_hooks(self, name: str, seconds: float, line_count: int | None):
+		for hook in self._hooks:
+			try:
+				hook(name, seconds, line_count)
+			except Exception:
+				_logger.exception(f"Metrics hook failed on ({name})")
+	
+	
+	def get_snapshot(self):
+		#plain data, for exporting... latencies are in seconds
+		return {
+			"operations": {
+				name: {
+					"count": operation["count"],
+					"error_count": operation["error_count"],
+					"latency": operation["latency"].get_snapshot(),
+					"lines": operation["lines"].get_snapshot() if operation["lines"].count else None
+				}
+				for name, operation in self._operations.items()
+			},
+			"phases": {name: phase.get_snapshot() for name, phase in self._phases.items()}
+		}
+
+
+
+def _measure_operation(metrics: StoreMetrics, name: str, method: Callable, count_lines: Callable | None):
+	@wraps(method)
+	async def measured_method(*args, **kwargs):
+		started = time.perf_counter()
+		try:
+			result = await method(*args, **kwargs)
+		except Exception:
+			metrics.record_operation(name = name, seconds = time.perf_counter() - started, failed = True)
+			raise
+		
+		line_count = None
+		if count_lines is not None:
+			line_count = count_lines(*args, **kwargs)
+		metrics.record_operation(name = name, seconds = time.perf_counter() - started, line_count = line_count)
+		
+		return result
+	
+	return measured_method
+
+
+def _measure_phase(metrics: StoreMetrics, name: str, method: Callable):
+	@wraps(method)
+	def measured_method(*args, **kwargs):
+		started = time.perf_counter()
+		try:
+			return method(*args, **kwargs)
+		finally:
+			metrics.record_phase(name = name, seconds = time.perf_counter() - started)
+	
+	return measured_method
+
+
+def instrument_store(store, metrics: StoreMetrics):
+	#shadows the measured methods with timed wrappers on the instance itself... the class methods stay untouched,
+	#so a store without metrics runs exactly the code it would without this module
+	for name, count_lines in MEASURED_OPERATIONS.items():
+		method = getattr(store, name)
+		if count_lines is not None:
+			#line counts are read from the call's arguments, by name or by position
+			count_lines = _bind_arguments(method, count_lines)
+		setattr(store, name, _measure_operation(metrics = metrics, name = name, method = method, count_lines = count_lines))
+	
+	for name in MEASURED_PHASES:
+		setattr(store, name, _measure_phase(metrics = metrics, name = name, method = getattr(store, name)))
+
+
+def uninstrument_store(store):
+	for name in list(MEASURED_OPERATIONS) + MEASURED_PHASES:
+		store.__dict__.pop(name, None)
+
+
+def _bind_arguments(method: Callable, count_lines: Callable):
+	signature = inspect.signature(method)
+	names = list(inspect.signature(count_lines).parameters)
+	
+	def count_bound_lines(*args, **kwargs):
+		arguments = signature.bind(*args, **kwargs).arguments
+		return count_lines(*[arguments.get(name) for name in names])
+	
+	return count_bound_lines
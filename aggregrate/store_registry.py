@@ -0,0 +1,82 @@
+import asyncio
+from typing import Dict, List
+from uuid import uuid4
+from aggregrate.store import Store
+from value_object.unit import Unit
+from error import UnexistingStore, AlreadyExistingStore
+
+
+
+class StoreRegistry(object):
+	def __init__(self):
+		#store_id -> Store
+		self._stores: Dict[str, Store] = {}
+	
+	
+	def add_store(self, store: Store):
+		if store.store_id in self._stores:
+			raise AlreadyExistingStore(f"Tried to add multiple stores with store_id ({store.store_id})")
+		
+		self._stores[store.store_id] = store
+	
+	
+	async def create_store(self, store_name: str, store_id: str = None):
+		store = Store(store_id = str(uuid4()) if store_id is None else store_id, store_name = store_name)
+		self.add_store(store)
+		return store
+	
+	
+	def get_store(self, store_id: str):
+		store = self._stores.get(store_id)
+		
+		if store is None:
+			raise UnexistingStore(f"Store does not exist in this registry with store_id={store_id}")
+		
+		return store
+	
+	
+	def remove_store(self, store_id: str):
+		store = self.get_store(store_id)
+		del self._stores[store_id]
+		return store
+	
+	
+	def get_stores(self):
+		return list(self._stores.values())
+	
+	
+	def __len__(self):
+		return len(self._stores)
+	
+	
+	def __contains__(self, store_id: str):
+		return store_id in self._stores
+	
+	
+	async def get_stock_levels_by_store(self, unit: Unit, skus: List[str] = None):
+		#store_id -> {sku: qty in unit}... every store is queried concurrently
+		stores = list(self._stores.values())
+		stock_levels = await asyncio.gather(*[store.get_stock_levels_in_unit(unit = unit, skus = skus) for store in stores])
+		
+		return {store.store_id: store_stock_levels for store, store_stock_levels in zip(stores, stock_levels)}
+	
+	
+	async def get_total_stock_levels(self, unit: Unit, skus: List[str] = None):
+		#sku -> qty in unit, summed across all stores... products a store doesn't have, or that don't support unit there, add nothing
+		total_stock_levels = {}
+		for store_stock_levels in (await self.get_stock_levels_by_store(unit = unit, skus = skus)).values():
+			for sku, qty in store_stock_levels.items():
+				total_stock_levels[sku] = total_stock_levels.get(sku, 0) + qty
+		
+		return total_stock_levels
+	
+	
+	async def get_stores_below_threshold(self, sku: str, threshold: float, unit: Unit):
+		#store_id -> qty in unit, of every store holding less than threshold of sku
+		stock_levels_by_store = await self.get_stock_levels_by_store(unit = unit, skus = [sku])
+		
+		return {
+			store_id: store_stock_levels[sku]
+			for store_id, store_stock_levels in stock_levels_by_store.items()
+			if sku in store_stock_levels and store_stock_levels[sku] < threshold
+		}
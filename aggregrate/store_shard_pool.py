@@ -0,0 +1,287 @@
+import queue
+import asyncio
+import itertools
+import threading
+import multiprocessing
+import zlib
+from multiprocessing.connection import wait
+from typing import Dict, List
+from aggregrate.store_registry import StoreRegistry
+from value_object.unit import Unit
+from error import UnexistingStore, StoreWorkerDiedError
+
+
+#how often (seconds) the monitor and response threads wake up to check whether the pool is closing
+_POLL_INTERVAL = 0.1
+#how long close waits on the response thread of a dead worker, which may have died halfway through a response
+_DEAD_WORKER_JOIN_TIMEOUT = 1
+
+#Store methods a worker will run for the parent... anything else is refused
+_STORE_METHODS = {
+	"create_product_inventory",
+	"add_supported_unit",
+	"enable_lot_tracking",
+	"get_lots",
+	"get_stock_level",
+	"get_stock_levels",
+	"receive",
+	"issue",
+	"adjust",
+	"apply_movements",
+	"get_inventory_snapshot",
+	"get_product_stock_movement_snapshot",
+}
+
+
+
+def _run_worker(request_queue: multiprocessing.Queue, response_queue: multiprocessing.Queue):
+	#worker process... owns the stores assigned to it and applies their requests one at a time, in arrival order
+	registry = StoreRegistry()
+	loop = asyncio.new_event_loop()
+	
+	async def handle(store_id: str, method_name: str, kwargs: Dict):
+		if method_name == "create_store":
+			await registry.create_store(store_id = store_id, store_name = kwargs["store_name"])
+			return None
+		
+		if method_name not in _STORE_METHODS:
+			raise ValueError(f"Store method ({method_name}) can't be called through a StoreShardPool")
+		
+		result = getattr(registry.get_store(store_id), method_name)(**kwargs)
+		return await result if asyncio.iscoroutine(result) else result
+	
+	while True:
+		request = request_queue.get()
+		if request is None:
+			break
+		
+		request_id, store_id, method_name, kwargs = request
+		try:
+			response_queue.put((request_id, True, loop.run_until_complete(handle(store_id, method_name, kwargs))))
+		except Exception as error:
+			response_queue.put((request_id, False, error))
+	
+	loop.close()
+
+
+
+class StoreShardPool(object):
+	#runs stores in worker processes, so load on different stores uses different cores...
+	#a store lives in exactly one worker (picked by a hash of its store_id), which keeps each store single-writer
+	
+	def __init__(self, worker_count: int = None):
+		self.worker_count = worker_count or multiprocessing.cpu_count()
+		self._context = multiprocessing.get_context("spawn")
+		#one request queue, response queue and response thread per worker... a worker killed while holding a queue's lock
+		#then only breaks its own queues, not the other workers'
+		self._request_queues = []
+		self._workers = []
+		self._response_threads = []
+		self._monitor_thread = None
+		self._is_closing = False
+		#set once every worker has stopped, so the response threads stop once they've read what is left
+		self._are_workers_stopped = False
+		self._request_ids = itertools.count()
+		#request_id -> (worker index, asyncio.Future waiting for the worker's response)
+		self._pending: Dict[int, tuple] = {}
+		#indexes of the workers that died... calls routed to them fail straight away
+		self._dead_worker_indexes = set()
+		self._pending_lock = threading.Lock()
+	
+	
+	def start(self):
+		self._is_closing = False
+		self._are_workers_stopped = False
+		for _ in range(self.worker_count):
+			request_queue = self._context.Queue()
+			response_queue = self._context.Queue()
+			worker = self._context.Process(target = _run_worker, args = (request_queue, response_queue), daemon = True)
+			worker.start()
+			self._request_queues.append(request_queue)
+			self._workers.append(worker)
+			
+			response_thread = threading.Thread(target = self._read_responses, args = (response_queue,), daemon = True)
+			response_thread.start()
+			self._response_threads.append(response_thread)
+		
+		self._monitor_thread = threading.Thread(target = self._monitor_workers, daemon = True)
+		self._monitor_thread.start()
+	
+	
+	def close(self):
+		self._is_closing = True
+		if self._monitor_thread is not None:
+			self._monitor_thread.join()
+		
+		for index, request_queue in enumerate(self._request_queues):
+			if index not in self._dead_worker_indexes:
+				request_queue.put(None)
+		
+		for worker in self._workers:
+			worker.join()
+		
+		self._are_workers_stopped = True
+		for index, response_thread in enumerate(self._response_threads):
+			response_thread.join(timeout = _DEAD_WORKER_JOIN_TIMEOUT if index in self._dead_worker_indexes else None)
+		
+		#whatever the workers didn't answer before stopping never will be
+		self._fail_pending(RuntimeError("StoreShardPool was closed before the call was answered"))
+		
+		self._request_queues = []
+		self._workers = []
+		self._response_threads = []
+		self._monitor_thread = None
+		self._dead_worker_indexes = set()
+	
+	
+	async def __aenter__(self):
+		self.start()
+		return self
+	
+	
+	async def __aexit__(self, *exc_info):
+		self.close()
+	
+	
+	def _read_responses(self, response_queue: multiprocessing.Queue):
+		while True:
+			try:
+				response = response_queue.get(timeout = _POLL_INTERVAL)
+			except queue.Empty:
+				if self._are_workers_stopped:
+					return
+				continue
+			
+			request_id, succeeded, result = response
+			with self._pending_lock:
+				pending = self._pending.pop(request_id, None)
+			
+			#None when the call was already failed, e.g. its worker was found dead before this response was read
+			if pending is not None:
+				_, future = pending
+				future.get_loop().call_soon_threadsafe(_resolve_future, future, succeeded, result)
+	
+	
+	def _monitor_workers(self):
+		#a worker that dies (killed, out of memory, ...) never answers... its pending calls are failed instead of waiting forever
+		while not self._is_closing:
+			sentinels = {worker.sentinel: index for index, worker in enumerate(self._workers) if index not in self._dead_worker_indexes}
+			if not sentinels:
+				return
+			
+			for sentinel in wait(list(sentinels), timeout = _POLL_INTERVAL):
+				if self._is_closing:
+					return
+				
+				worker_index = sentinels[sentinel]
+				worker = self._workers[worker_index]
+				#its sentinel is ready, so this returns straight away... and gets the exit code
+				worker.join()
+				self._fail_pending(StoreWorkerDiedError(f"StoreShardPool worker {worker_index} died (exit code {worker.exitcode})"), worker_index = worker_index)
+	
+	
+	def _fail_pending(self, error: Exception, worker_index: int = None):
+		#fails the pending calls of worker_index (and routes none to it from now on), or of every worker when None
+		with self._pending_lock:
+			if worker_index is not None:
+				self._dead_worker_indexes.add(worker_index)
+			
+			request_ids = [request_id for request_id, (index, _) in self._pending.items() if worker_index is None or index == worker_index]
+			futures = [self._pending.pop(request_id)[1] for request_id in request_ids]
+		
+		for future in futures:
+			future.get_loop().call_soon_threadsafe(_resolve_future, future, False, error)
+	
+	
+	def get_worker_index(self, store_id: str):
+		#crc32 rather than hash(), which is salted differently in every process
+		return zlib.crc32(store_id.encode()) % self.worker_count
+	
+	
+	async def _call(self, store_id: str, method_name: str, **kwargs):
+		if not self._workers:
+			raise RuntimeError("StoreShardPool has not been started")
+		
+		worker_index = self.get_worker_index(store_id)
+		future = asyncio.get_running_loop().create_future()
+		request_id = next(self._request_ids)
+		with self._pending_lock:
+			#checked under the same lock the monitor marks dead workers with, so a call is either refused here or failed by it
+			if worker_index in self._dead_worker_indexes:
+				raise StoreWorkerDiedError(f"StoreShardPool worker {worker_index} died, store ({store_id}) is no longer available")
+			self._pending[request_id] = (worker_index, future)
+		
+		self._request_queues[worker_index].put((request_id, store_id, method_name, kwargs))
+		return await future
+	
+	
+	async def create_store(self, store_id: str, store_name: str):
+		await self._call(store_id, "create_store", store_name = store_name)
+	
+	
+	async def create_product_inventory(self, store_id: str, sku: str, product_name: str, base_unit: Unit, opening_bal = 0, qty_scale: int = None):
+		await self._call(store_id, "create_product_inventory", sku = sku, product_name = product_name, base_unit = base_unit, opening_bal = opening_bal, qty_scale = qty_scale)
+	
+	
+	async def add_supported_unit(self, store_id: str, sku: str, unit: Unit, conversion_factor: float):
+		await self._call(store_id, "add_supported_unit", sku = sku, unit = unit, conversion_factor = conversion_factor)
+	
+	
+	async def enable_lot_tracking(self, store_id: str, sku: str):
+		await self._call(store_id, "enable_lot_tracking", sku = sku)
+	
+	
+	async def get_lots(self, store_id: str, sku: str):
+		return await self._call(store_id, "get_lots", sku = sku)
+	
+	
+	async def get_stock_level(self, store_id: str, sku: str, unit: Unit):
+		return await self._call(store_id, "get_stock_level", sku = sku, unit = unit)
+	
+	
+	async def get_stock_levels(self, store_id: str, skus: List[str], unit: Unit):
+		return await self._call(store_id, "get_stock_levels", skus = skus, unit = unit)
+	
+	
+	async def get_inventory_snapshot(self, store_id: str):
+		return await self._call(store_id, "get_inventory_snapshot")
+	
+	
+	async def get_product_stock_movement_snapshot(self, store_id: str, sku: str, **kwargs):
+		return await self._call(store_id, "get_product_stock_movement_snapshot", sku = sku, **kwargs)
+	
+	
+	def _get_entry_store_id(self, entry: Dict):
+		#the entry dicts Store.receive/issue/adjust take... here their store_id is what routes them, so it is required
+		store_id = entry.get("store_id")
+		if store_id is None:
+			raise UnexistingStore("Entries sent through a StoreShardPool must have a store_id")
+		
+		return store_id
+	
+	
+	async def receive(self, received_entry: Dict):
+		return await self._call(self._get_entry_store_id(received_entry), "receive", received_entry = received_entry)
+	
+	
+	async def issue(self, issued_entry: Dict):
+		return await self._call(self._get_entry_store_id(issued_entry), "issue", issued_entry = issued_entry)
+	
+	
+	async def adjust(self, adjusted_entry: Dict):
+		return await self._call(self._get_entry_store_id(adjusted_entry), "adjust", adjusted_entry = adjusted_entry)
+	
+	
+	async def apply_movements(self, store_id: str, movements: List[Dict]):
+		return await self._call(store_id, "apply_movements", movements = movements)
+
+
+
+def _resolve_future(future: asyncio.Future, succeeded: bool, result):
+	if future.cancelled():
+		return
+	
+	if succeeded:
+		future.set_result(result)
+	else:
+		future.set_exception(result)
@@ -0,0 +1,64 @@
+#run from the repo root with:  python -m benchmark.bench_catalogue_import
+#loads the same synthetic catalogue (as CSV) into a store once with create_product_inventory + add_supported_unit per row,
+#and once streamed through import_product_inventories
+import io
+import csv
+import time
+import asyncio
+from aggregrate.store import create_store
+from aggregrate.catalogue_import import read_catalogue_csv, parse_catalogue_row, CSV_FIELDS
+from benchmark.generators import generate_catalogue
+
+
+CATALOGUE_SIZES = [10_000, 100_000]
+
+
+def build_catalogue_csv(sku_count: int):
+	file = io.StringIO()
+	writer = csv.DictWriter(file, fieldnames = CSV_FIELDS)
+	writer.writeheader()
+	for product in generate_catalogue(sku_count):
+		writer.writerow({
+			"sku": product["sku"],
+			"product_name": product["product_name"],
+			"base_unit": product["base_unit"].name,
+			"opening_bal": product["opening_bal"],
+			"units": ";".join(f"{unit.name}:{conversion_factor}" for unit, conversion_factor in product["units"])
+		})
+	
+	return file.getvalue()
+
+
+async def load_one_at_a_time(catalogue_csv: str):
+	store = await create_store(store_id="bench_store", store_name="Store (bench)")
+	for row in read_catalogue_csv(io.StringIO(catalogue_csv)):
+		product = parse_catalogue_row(row)
+		await store.create_product_inventory(sku=product["sku"], product_name=product["product_name"], base_unit=product["base_unit"], opening_bal=product["opening_bal"])
+		for unit, conversion_factor in product["units"]:
+			store.add_supported_unit(sku=product["sku"], unit=unit, conversion_factor=conversion_factor)
+	
+	return store
+
+
+async def load_in_bulk(catalogue_csv: str):
+	store = await create_store(store_id="bench_store", store_name="Store (bench)")
+	await store.import_product_inventories(read_catalogue_csv(io.StringIO(catalogue_csv)))
+	
+	return store
+
+
+async def main():
+	print(f"{'catalogue size':>15} | {'one at a time s':>16} | {'bulk import s':>14}")
+	for catalogue_size in CATALOGUE_SIZES:
+		catalogue_csv = build_catalogue_csv(catalogue_size)
+		elapsed = []
+		for load in [load_one_at_a_time, load_in_bulk]:
+			started = time.perf_counter()
+			await load(catalogue_csv)
+			elapsed.append(time.perf_counter() - started)
+		
+		print(f"{catalogue_size:>15} | {elapsed[0]:>16.2f} | {elapsed[1]:>14.2f}")
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
@@ -0,0 +1,36 @@
+#run from the repo root with:  python -m benchmark.bench_lot_allocation
+#times receiving lots with random expiries into a ProductLots, then issuing from them first expiring first...
+#per-call cost should grow with log(open lots), not with the number of lots
+import time
+import random
+from datetime import date, timedelta
+from entity.product_lots import ProductLots
+
+
+LOT_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+ISSUES = 10_000
+
+
+def run(lot_count: int):
+	rng = random.Random(0)
+	product_lots = ProductLots(qty_scale = 1000)
+	expiry_dates = [date(2025, 1, 1) + timedelta(days = rng.randrange(3650)) for _ in range(lot_count)]
+	
+	started = time.perf_counter()
+	for i, expiry_date in enumerate(expiry_dates):
+		product_lots.receive(qty = 10, lot_id = f"lot_{i}", expiry_date = expiry_date)
+	receive_seconds = time.perf_counter() - started
+	
+	#each issue takes one lot and a half, so every call pops a lot off the heap... and never runs the lots out
+	issue_count = min(ISSUES, lot_count // 2)
+	started = time.perf_counter()
+	for _ in range(issue_count):
+		product_lots.allocate(15)
+	issue_seconds = time.perf_counter() - started
+	
+	print(f"{lot_count:>9} lots | receive {receive_seconds / lot_count * 1e6:6.2f} us/lot | issue {issue_seconds / issue_count * 1e6:6.2f} us/issue")
+
+
+if __name__ == "__main__":
+	for lot_count in LOT_COUNTS:
+		run(lot_count)
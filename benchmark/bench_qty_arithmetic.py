@@ -0,0 +1,82 @@
+#run from the repo root with:  python -m benchmark.bench_qty_arithmetic
+#receives and issues the same qtys (in BSKT, 2.451 KG each) through a float product and a fixed-point (qty_scale) one...
+#the issues go out in a different order than the receives came in, so the final balance should be the opening one again,
+#which only holds when the arithmetic is exact
+#the bare balance arithmetic (qtys converted to KG once, then only added and subtracted) is also timed on its own
+#for float, fixed-point ints and Decimal
+import asyncio
+import time
+from decimal import Decimal
+from aggregrate.store import create_store
+from value_object.unit import Unit
+
+
+KG_TO_BSKT = 2.451
+OPENING_BAL = 1
+ROUNDS = 2_000
+QTYS = [0.1, 0.3, 1.7, 2.2, 0.05, 0.7, 1.1]
+QTY_SCALE = 1000
+
+
+async def build_store(qty_scale: int | None):
+	store = await create_store(store_id="bench_store", store_name="Store (bench)")
+	await store.create_product_inventory(sku="sku_0", product_name="Product 0", base_unit=Unit.KG, opening_bal=OPENING_BAL, qty_scale=qty_scale)
+	store.add_supported_unit(sku="sku_0", unit=Unit.BSKT, conversion_factor=KG_TO_BSKT)
+
+	return store
+
+
+async def run_store(qty_scale: int | None):
+	store = await build_store(qty_scale)
+
+	started = time.perf_counter()
+	for i in range(ROUNDS):
+		for j, qty in enumerate(QTYS):
+			await store.receive({"received_entry_id": f"receive_{i}_{j}", "received_from": "Bench Supplier", "received_products": [{"sku": "sku_0", "qty": qty, "unit": Unit.BSKT}]})
+		for qty in reversed(QTYS):
+			await store.issue({"issued_entry_id": f"issue_{i}", "issued_to": "Bench Customer", "issued_products": [{"sku": "sku_0", "qty": qty, "unit": Unit.BSKT}]})
+	elapsed = time.perf_counter() - started
+
+	return elapsed, await store.get_stock_level(sku="sku_0", unit=Unit.KG)
+
+
+def run_arithmetic(to_kg, opening_bal):
+	qtys_in_kg = [to_kg(qty) for qty in QTYS]
+	bal = opening_bal
+
+	started = time.perf_counter()
+	for _ in range(ROUNDS):
+		for qty_in_kg in qtys_in_kg:
+			bal = bal + qty_in_kg
+		for qty_in_kg in reversed(qtys_in_kg):
+			bal = bal - qty_in_kg
+	elapsed = time.perf_counter() - started
+
+	return elapsed, bal
+
+
+async def main():
+	lines = ROUNDS * len(QTYS) * 2
+
+	print("through Store.receive / Store.issue")
+	print(f"{'mode':>24} | {'us per line':>12} | {'final bal (KG)':>22}")
+	for mode, qty_scale in [("float", None), (f"fixed (qty_scale={QTY_SCALE})", QTY_SCALE)]:
+		elapsed, bal = await run_store(qty_scale)
+		print(f"{mode:>24} | {elapsed * 1e6 / lines:>12.3f} | {bal!r:>22}")
+
+	print()
+	print("balance arithmetic only")
+	print(f"{'mode':>24} | {'us per line':>12} | {'final bal (KG)':>22}")
+	arithmetic_modes = [
+		#(mode, BSKT qty -> KG qty, opening bal, bal -> KG)
+		("float", lambda qty: qty * KG_TO_BSKT, float(OPENING_BAL), lambda bal: bal),
+		(f"fixed (qty_scale={QTY_SCALE})", lambda qty: round(qty * KG_TO_BSKT * QTY_SCALE), OPENING_BAL * QTY_SCALE, lambda bal: bal / QTY_SCALE),
+		("Decimal", lambda qty: Decimal(str(qty)) * Decimal(str(KG_TO_BSKT)), Decimal(OPENING_BAL), lambda bal: bal)
+	]
+	for mode, to_kg, opening_bal, from_bal in arithmetic_modes:
+		elapsed, bal = run_arithmetic(to_kg, opening_bal)
+		print(f"{mode:>24} | {elapsed * 1e6 / lines:>12.3f} | {str(from_bal(bal)):>22}")
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
@@ -0,0 +1,59 @@
+#run from the repo root with:  python -m benchmark.bench_stock_movement_memory
+#compares the memory held by N stock movements as a list of StockMovement dataclasses
+#(the old layout of ProductStockMovement) against the columnar StockMovementLedger
+import tracemalloc
+from datetime import datetime, timedelta
+from entity.stock_movement_ledger import StockMovementLedger
+from value_object.stock_movement import StockMovement
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+
+
+ROW_COUNTS = [10_000, 100_000, 1_000_000]
+LOCATIONS = ["RD Enterprises", "Kitchen", "Bar", "Main Store", "Branch 2"]
+
+
+def generate_movements(row_count: int):
+	started_at = datetime(2024, 1, 1)
+	bal = 0.0
+	for i in range(row_count):
+		qty = float(i % 17 + 1)
+		bal = bal + qty
+		#location strings are built per row, the way they arrive from parsed requests
+		yield started_at + timedelta(seconds=i), "".join(LOCATIONS[i % len(LOCATIONS)]), qty, bal
+
+
+def measure(build):
+	tracemalloc.start()
+	built = build()
+	current, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	del built
+	return current
+
+
+def build_list(row_count: int):
+	return [
+		StockMovement(timestamp=timestamp, location=location, received=qty, issued=None, unit=Unit.BAG, bal=bal, base_unit=Unit.KG)
+		for timestamp, location, qty, bal in generate_movements(row_count)
+	]
+
+
+def build_ledger(row_count: int):
+	ledger = StockMovementLedger()
+	for timestamp, location, qty, bal in generate_movements(row_count):
+		ledger.append(timestamp=timestamp, location=location, change_type=ChangeType.RECEIVE, qty=qty, unit=Unit.BAG, bal=bal, base_unit=Unit.KG)
+	
+	return ledger
+
+
+def main():
+	print(f"{'rows':>10} | {'list bytes/row':>15} | {'ledger bytes/row':>17} | {'ratio':>6}")
+	for row_count in ROW_COUNTS:
+		list_bytes = measure(lambda: build_list(row_count))
+		ledger_bytes = measure(lambda: build_ledger(row_count))
+		print(f"{row_count:>10} | {list_bytes / row_count:>15.1f} | {ledger_bytes / row_count:>17.1f} | {list_bytes / ledger_bytes:>6.1f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,61 @@
+#run from the repo root with:  python -m benchmark.bench_stock_valuation
+#values a whole catalogue in each product's display unit, once one get_stock_level call at a time
+#and once with a single get_stock_levels_batch call (vectorized with numpy when it is installed)
+import asyncio
+import time
+import entity.inventory_columns
+from aggregrate.store import create_store
+from value_object.unit import Unit
+
+
+CATALOGUE_SIZE = 50_000
+REPEATS = 5
+
+
+async def build_store():
+	store = await create_store(store_id="bench_store", store_name="Store (bench)")
+	for i in range(CATALOGUE_SIZE):
+		await store.create_product_inventory(sku=f"sku_{i}", product_name=f"Product {i}", base_unit=Unit.KG, opening_bal=i % 500)
+		store.add_supported_unit(sku=f"sku_{i}", unit=Unit.BAG, conversion_factor=50)
+	
+	return store
+
+
+async def value_one_at_a_time(store, sku_units, unit_costs):
+	total_value = 0
+	for (sku, unit), unit_cost in zip(sku_units, unit_costs):
+		total_value = total_value + (await store.get_stock_level(sku=sku, unit=unit)) * unit_cost
+	
+	return total_value
+
+
+async def value_in_batch(store, sku_units, unit_costs):
+	return (await store.get_stock_levels_batch(sku_units=sku_units, unit_costs=unit_costs))["total_value"]
+
+
+async def time_valuation(value, store, sku_units, unit_costs):
+	started = time.perf_counter()
+	for _ in range(REPEATS):
+		total_value = await value(store, sku_units, unit_costs)
+	
+	return (time.perf_counter() - started) / REPEATS, total_value
+
+
+async def main():
+	store = await build_store()
+	sku_units = [(f"sku_{i}", Unit.BAG if i % 2 else Unit.KG) for i in range(CATALOGUE_SIZE)]
+	unit_costs = [30000 if i % 2 else 600 for i in range(CATALOGUE_SIZE)]
+	
+	print(f"{CATALOGUE_SIZE} skus, numpy {'installed' if entity.inventory_columns.numpy is not None else 'not installed'}")
+	print(f"{'valuation':>18} | {'ms per report':>14} | {'total value':>16}")
+	for name, value in [("one at a time", value_one_at_a_time), ("batch", value_in_batch)]:
+		elapsed, total_value = await time_valuation(value, store, sku_units, unit_costs)
+		print(f"{name:>18} | {elapsed * 1000:>14.2f} | {total_value:>16.2f}")
+	
+	entity.inventory_columns.numpy = None
+	elapsed, total_value = await time_valuation(value_in_batch, store, sku_units, unit_costs)
+	print(f"{'batch (no numpy)':>18} | {elapsed * 1000:>14.2f} | {total_value:>16.2f}")
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
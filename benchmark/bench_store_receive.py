@@ -0,0 +1,51 @@
+#run from the repo root with:  python -m benchmark.bench_store_receive
+#receives the same fixed-size receipt into stores with growing catalogues...
+#with the sku index, the time per receipt should stay roughly flat as the catalogue grows
+import asyncio
+import time
+from aggregrate.store import create_store
+from value_object.unit import Unit
+
+
+CATALOGUE_SIZES = [1_000, 10_000, 50_000]
+LINES_PER_RECEIPT = 5_000
+REPEATS = 5
+
+
+async def build_store(catalogue_size: int):
+	store = await create_store(store_id="bench_store", store_name="Store (bench)")
+	for i in range(catalogue_size):
+		await store.create_product_inventory(sku=f"sku_{i}", product_name=f"Product {i}", base_unit=Unit.KG)
+	
+	return store
+
+
+def build_receipt(catalogue_size: int):
+	#spread the lines over the whole catalogue, so lookups hit both early and late skus
+	step = max(catalogue_size // LINES_PER_RECEIPT, 1)
+	return {
+		"received_from": "Bench Supplier",
+		"received_products": [
+			{"sku": f"sku_{(i * step) % catalogue_size}", "qty": 1, "unit": Unit.KG}
+			for i in range(LINES_PER_RECEIPT)
+		]
+	}
+
+
+async def main():
+	print(f"{'catalogue size':>15} | {'ms per receipt':>15} | {'us per line':>12}")
+	for catalogue_size in CATALOGUE_SIZES:
+		store = await build_store(catalogue_size)
+		receipt = build_receipt(catalogue_size)
+		
+		started = time.perf_counter()
+		for repeat in range(REPEATS):
+			#a fresh id each time, or every receipt after the first would come back as a replay
+			await store.receive({**receipt, "received_entry_id": f"bench_receive_{repeat}"})
+		elapsed = (time.perf_counter() - started) / REPEATS
+		
+		print(f"{catalogue_size:>15} | {elapsed * 1000:>15.2f} | {elapsed * 1e6 / LINES_PER_RECEIPT:>12.2f}")
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
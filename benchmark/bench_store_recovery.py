@@ -0,0 +1,72 @@
+#run from the repo root with:  python -m benchmark.bench_store_recovery [--skus N] [--movements N] [--tail-movements N]
+#builds a store, snapshots it, logs a tail of receipts to the write-ahead log, then times recover_store
+#the defaults (100k skus, 10M movements) take a few minutes to build... pass smaller numbers for a quick run
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from aggregrate.store import create_store
+from persistence.write_ahead_log import WriteAheadLog
+from persistence.store_snapshot import save_store_snapshot, load_store_snapshot
+from persistence.store_recovery import recover_store
+from value_object.unit import Unit
+
+
+LINES_PER_RECEIPT = 5_000
+
+
+async def receive_movements(store, sku_count: int, movement_count: int, first_line: int = 0):
+	for receipt_start in range(first_line, first_line + movement_count, LINES_PER_RECEIPT):
+		line_count = min(LINES_PER_RECEIPT, first_line + movement_count - receipt_start)
+		await store.receive({
+			"received_entry_id": f"bench_receive_{receipt_start}",
+			"received_from": "Bench Supplier",
+			"received_products": [
+				{"sku": f"sku_{(receipt_start + i) % sku_count}", "qty": 1, "unit": Unit.KG}
+				for i in range(line_count)
+			]
+		})
+
+
+async def main(sku_count: int, movement_count: int, tail_movement_count: int):
+	with tempfile.TemporaryDirectory() as directory:
+		snapshot_path = os.path.join(directory, "store.snapshot")
+		write_ahead_log = WriteAheadLog(path = os.path.join(directory, "store.wal"), sync_every = 1000)
+		
+		started = time.perf_counter()
+		store = await create_store(store_id = "bench_store", store_name = "Store (bench)")
+		for i in range(sku_count):
+			await store.create_product_inventory(sku = f"sku_{i}", product_name = f"Product {i}", base_unit = Unit.KG)
+		await receive_movements(store, sku_count = sku_count, movement_count = movement_count)
+		print(f"built store with {sku_count} skus and {movement_count} movements in {time.perf_counter() - started:.1f}s")
+		
+		started = time.perf_counter()
+		save_store_snapshot(store = store, path = snapshot_path, seq = write_ahead_log.last_seq)
+		print(f"snapshot: {time.perf_counter() - started:.2f}s, {os.path.getsize(snapshot_path) / 1e6:.1f} MB")
+		
+		store.set_write_ahead_log(write_ahead_log)
+		await receive_movements(store, sku_count = sku_count, movement_count = tail_movement_count, first_line = movement_count)
+		write_ahead_log.close()
+		print(f"log tail: {tail_movement_count} movements, {os.path.getsize(write_ahead_log.path) / 1e6:.1f} MB")
+		del store
+		
+		started = time.perf_counter()
+		load_store_snapshot(snapshot_path)
+		print(f"snapshot load alone: {time.perf_counter() - started:.2f}s")
+		
+		started = time.perf_counter()
+		write_ahead_log = WriteAheadLog(path = os.path.join(directory, "store.wal"))
+		await recover_store(store_id = "bench_store", store_name = "Store (bench)", snapshot_path = snapshot_path, write_ahead_log = write_ahead_log)
+		print(f"recovery: {time.perf_counter() - started:.2f}s")
+		write_ahead_log.close()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--skus", type = int, default = 100_000)
+	parser.add_argument("--movements", type = int, default = 10_000_000)
+	parser.add_argument("--tail-movements", type = int, default = 100_000)
+	args = parser.parse_args()
+	
+	asyncio.run(main(sku_count = args.skus, movement_count = args.movements, tail_movement_count = args.tail_movements))
@@ -0,0 +1,65 @@
+#run from the repo root with:  python -m benchmark.bench_store_shard_pool [--stores N] [--entries N] [--lines N]
+#sends the same receive load through StoreShardPools with growing worker counts, and reports movements per second
+import os
+import time
+import asyncio
+import argparse
+from aggregrate.store_shard_pool import StoreShardPool
+from value_object.unit import Unit
+
+
+SKUS_PER_STORE = 1_000
+#receipts in flight per store... enough to keep every worker busy
+IN_FLIGHT_PER_STORE = 4
+
+
+async def run(worker_count: int, store_count: int, entry_count: int, line_count: int):
+	async with StoreShardPool(worker_count = worker_count) as pool:
+		store_ids = [f"store_{i}" for i in range(store_count)]
+		for store_id in store_ids:
+			await pool.create_store(store_id = store_id, store_name = store_id)
+			await asyncio.gather(*[
+				pool.create_product_inventory(store_id = store_id, sku = f"sku_{i}", product_name = f"Product {i}", base_unit = Unit.KG)
+				for i in range(SKUS_PER_STORE)
+			])
+		
+		entries = [
+			{
+				"received_entry_id": f"bench_receive_{i}",
+				"store_id": store_ids[i % store_count],
+				"received_from": "Bench Supplier",
+				"received_products": [
+					{"sku": f"sku_{(i * line_count + line) % SKUS_PER_STORE}", "qty": 1, "unit": Unit.KG}
+					for line in range(line_count)
+				]
+			}
+			for i in range(entry_count)
+		]
+		
+		semaphore = asyncio.Semaphore(store_count * IN_FLIGHT_PER_STORE)
+		async def receive(entry):
+			async with semaphore:
+				await pool.receive(entry)
+		
+		started = time.perf_counter()
+		await asyncio.gather(*[receive(entry) for entry in entries])
+		return entry_count * line_count / (time.perf_counter() - started)
+
+
+async def main(store_count: int, entry_count: int, line_count: int):
+	print(f"{'workers':>8} | {'movements/s':>12}")
+	worker_count = 1
+	while worker_count <= (os.cpu_count() or 1):
+		movements_per_second = await run(worker_count = worker_count, store_count = store_count, entry_count = entry_count, line_count = line_count)
+		print(f"{worker_count:>8} | {movements_per_second:>12,.0f}")
+		worker_count = worker_count * 2
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--stores", type = int, default = 32)
+	parser.add_argument("--entries", type = int, default = 2_000)
+	parser.add_argument("--lines", type = int, default = 200)
+	args = parser.parse_args()
+	
+	asyncio.run(main(store_count = args.stores, entry_count = args.entries, line_count = args.lines))
@@ -0,0 +1,119 @@
+#run from the repo root with:  python -m benchmark.bench_suite [--scale small|medium|large] [--save-baseline PATH] [--compare PATH]
+#times the main Store operations against synthetic catalogues (1k to 1M skus), wide receipts and long ledgers,
+#reporting throughput, latency percentiles and peak memory... save a baseline once, then --compare later runs against it
+#(a regression is a p50 or peak memory more than --tolerance above the baseline, and makes the run exit with 1)
+#the large scale builds a 1M sku catalogue and a 10M row ledger, which takes a while... small runs in well under a minute
+import sys
+import random
+import asyncio
+import argparse
+from datetime import datetime
+from benchmark.generators import build_store, generate_receipts, fill_ledger, get_sku
+from benchmark.harness import run_benchmark, format_results, save_baseline, load_baseline, compare_to_baseline, format_comparisons
+
+
+SCALES = {
+	"small": {"sku_counts": [1_000, 10_000], "ledger_rows": 100_000, "lines_per_receipt": 1_000},
+	"medium": {"sku_counts": [1_000, 100_000], "ledger_rows": 1_000_000, "lines_per_receipt": 5_000},
+	"large": {"sku_counts": [1_000, 100_000, 1_000_000], "ledger_rows": 10_000_000, "lines_per_receipt": 20_000},
+}
+RECEIPTS = 20
+LOOKUPS_PER_CALL = 100
+LOOKUP_CALLS = 1_000
+SNAPSHOT_CALLS = 5
+PAGE_SIZE = 100
+PAGE_CALLS = 1_000
+
+
+async def bench_catalogue(sku_count: int, lines_per_receipt: int, seed: int, trace_memory: bool):
+	params = {"skus": sku_count}
+	results = []
+	built = {}
+	
+	async def build():
+		built["store"] = await build_store(sku_count, seed = seed)
+	
+	results.append(await run_benchmark("create_product_inventory", build, calls = 1, params = params, ops_per_call = sku_count, trace_memory = trace_memory))
+	store = built["store"]
+	
+	#generated up-front, so only receiving is timed... one receipt more than is timed, for the traced call
+	receipts = iter(list(generate_receipts(store, receipt_count = RECEIPTS + 1, lines_per_receipt = lines_per_receipt, seed = seed)))
+	async def receive():
+		await store.receive(next(receipts))
+	
+	results.append(await run_benchmark("receive", receive, calls = RECEIPTS, params = {**params, "lines": lines_per_receipt}, ops_per_call = lines_per_receipt, trace_memory = trace_memory))
+	
+	rng = random.Random(seed)
+	lookup_skus = [get_sku(rng.randrange(sku_count)) for _ in range(LOOKUPS_PER_CALL)]
+	async def get_stock_levels():
+		for sku in lookup_skus:
+			await store.get_stock_level(sku = sku, unit = None)
+	
+	results.append(await run_benchmark("get_stock_level", get_stock_levels, calls = LOOKUP_CALLS, params = params, ops_per_call = LOOKUPS_PER_CALL, trace_memory = trace_memory))
+	
+	async def get_inventory_snapshot():
+		await store.get_inventory_snapshot()
+	
+	results.append(await run_benchmark("get_inventory_snapshot", get_inventory_snapshot, calls = SNAPSHOT_CALLS, params = params, trace_memory = trace_memory))
+	
+	return results
+
+
+async def bench_ledger(ledger_rows: int, seed: int, trace_memory: bool):
+	params = {"rows": ledger_rows}
+	store = await build_store(1, seed = seed)
+	sku = get_sku(0)
+	
+	started_at = datetime.now()
+	await fill_ledger(store, sku = sku, movement_count = ledger_rows, seed = seed)
+	ended_at = datetime.now()
+	
+	#random pages of PAGE_SIZE rows, found by time range over the whole ledger
+	rng = random.Random(seed)
+	async def get_page():
+		since = started_at + (ended_at - started_at) * rng.random()
+		await store.get_product_stock_movement_snapshot(sku = sku, since = since, limit = PAGE_SIZE)
+	
+	async def get_stock_level_as_at():
+		await store.get_stock_level_as_at(sku = sku, timestamp = started_at + (ended_at - started_at) * rng.random())
+	
+	return [
+		await run_benchmark("get_product_stock_movement_snapshot", get_page, calls = PAGE_CALLS, params = {**params, "limit": PAGE_SIZE}, trace_memory = trace_memory),
+		await run_benchmark("get_stock_level_as_at", get_stock_level_as_at, calls = PAGE_CALLS, params = params, trace_memory = trace_memory)
+	]
+
+
+async def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--scale", choices = SCALES.keys(), default = "small")
+	parser.add_argument("--seed", type = int, default = 0)
+	parser.add_argument("--no-memory", action = "store_true", help = "skip the traced calls that measure peak memory")
+	parser.add_argument("--save-baseline", metavar = "PATH")
+	parser.add_argument("--compare", metavar = "PATH", help = "a baseline saved by an earlier run")
+	parser.add_argument("--tolerance", type = float, default = 0.2)
+	args = parser.parse_args()
+	
+	scale = SCALES[args.scale]
+	trace_memory = not args.no_memory
+	results = []
+	for sku_count in scale["sku_counts"]:
+		results.extend(await bench_catalogue(sku_count, lines_per_receipt = scale["lines_per_receipt"], seed = args.seed, trace_memory = trace_memory))
+	results.extend(await bench_ledger(scale["ledger_rows"], seed = args.seed, trace_memory = trace_memory))
+	
+	print(format_results(results))
+	
+	if args.save_baseline:
+		save_baseline(results, args.save_baseline)
+		print(f"\nbaseline saved to {args.save_baseline}")
+	
+	if args.compare:
+		comparisons = compare_to_baseline(results, load_baseline(args.compare), tolerance = args.tolerance)
+		print(f"\ncompared to {args.compare}")
+		print(format_comparisons(comparisons))
+		
+		if any(comparison["is_regression"] for comparison in comparisons):
+			sys.exit(1)
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
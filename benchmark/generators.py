@@ -0,0 +1,72 @@
+#synthetic catalogues, receipts and ledgers for the benchmarks... everything is drawn from a seeded random.Random,
+#so the same arguments always generate the same data
+import random
+from aggregrate.store import create_store
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+
+
+#(unit, conversion factor) a product may support on top of its base unit
+EXTRA_UNITS = [(Unit.BAG, 50), (Unit.BSKT, 2.451), (Unit.CTN, 12), (Unit.TIN, 0.75)]
+BASE_UNITS = [Unit.KG, Unit.PCS, Unit.BTL, Unit.PKT]
+LOCATIONS = ["RD Enterprises", "Mile 12 Market", "Kitchen", "Bar", "Main Store", "Branch 2"]
+
+
+def get_sku(i: int):
+	return f"sku_{i}"
+
+
+def generate_catalogue(sku_count: int, seed: int = 0):
+	#generator of {"sku", "product_name", "base_unit", "opening_bal", "units": [(unit, conversion_factor), ...]}
+	rng = random.Random(seed)
+	for i in range(sku_count):
+		yield {
+			"sku": get_sku(i),
+			"product_name": f"Product {i}",
+			"base_unit": rng.choice(BASE_UNITS),
+			"opening_bal": rng.randrange(0, 1000),
+			"units": rng.sample(EXTRA_UNITS, rng.randrange(0, len(EXTRA_UNITS) + 1))
+		}
+
+
+async def build_store(sku_count: int, seed: int = 0, store_id: str = "bench_store"):
+	store = await create_store(store_id=store_id, store_name="Store (bench)")
+	for product in generate_catalogue(sku_count, seed=seed):
+		await store.create_product_inventory(sku=product["sku"], product_name=product["product_name"], base_unit=product["base_unit"], opening_bal=product["opening_bal"])
+		for unit, conversion_factor in product["units"]:
+			store.add_supported_unit(sku=product["sku"], unit=unit, conversion_factor=conversion_factor)
+	
+	return store
+
+
+def generate_receipts(store, receipt_count: int, lines_per_receipt: int, seed: int = 0):
+	#generator of received entries, each line a random sku of store in one of the units it supports
+	rng = random.Random(seed)
+	skus = list(store._product_records.keys())
+	
+	for receipt_index in range(receipt_count):
+		received_products = []
+		for _ in range(lines_per_receipt):
+			product_inventory = store._product_records[rng.choice(skus)].product_inventory
+			unit = rng.choice(list(product_inventory._unit_conversions.keys()))
+			received_products.append({"sku": product_inventory.sku, "qty": rng.randrange(1, 100), "unit": unit})
+		
+		yield {
+			"received_entry_id": f"bench_receive_{receipt_index}",
+			"received_from": rng.choice(LOCATIONS),
+			"received_products": received_products
+		}
+
+
+async def fill_ledger(store, sku: str, movement_count: int, lines_per_call: int = 10_000, seed: int = 0):
+	#appends movement_count receive/issue lines to the ledger of one sku... issues never take more than was just received
+	rng = random.Random(seed)
+	unit = store._product_records[sku].product_inventory.base_unit
+	
+	for call_start in range(0, movement_count, lines_per_call):
+		movements = []
+		for i in range(call_start, min(call_start + lines_per_call, movement_count)):
+			change_type = ChangeType.RECEIVE if i % 2 == 0 else ChangeType.ISSUE
+			movements.append({"change_type": change_type, "sku": sku, "qty": 10 if change_type == ChangeType.RECEIVE else rng.randrange(1, 10), "unit": unit, "location": rng.choice(LOCATIONS)})
+		
+		await store.apply_movements(movements)
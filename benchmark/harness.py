@@ -0,0 +1,139 @@
+#times an operation call by call, and keeps the results as baselines to compare later runs against
+import json
+import platform
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List
+
+
+@dataclass(slots=True)
+class BenchmarkResult:
+	name: str
+	#what the operation ran against, e.g. {"skus": 100000}
+	params: Dict
+	calls: int
+	#units of work per call, e.g. lines per receipt... throughput is counted in these
+	ops_per_call: int
+	total_seconds: float
+	p50_ms: float
+	p95_ms: float
+	p99_ms: float
+	max_ms: float
+	#peak bytes allocated during one extra (traced) call... None when memory isn't traced
+	peak_memory_bytes: int | None
+	
+	
+	@property
+	def key(self):
+		params = ",".join(f"{name}={value}" for name, value in sorted(self.params.items()))
+		return f"{self.name}[{params}]"
+	
+	
+	@property
+	def ops_per_second(self):
+		return self.calls * self.ops_per_call / self.total_seconds if self.total_seconds else float("inf")
+
+
+def get_percentile(sorted_values: List[float], fraction: float):
+	#nearest-rank percentile of values already sorted
+	if not sorted_values:
+		return 0.0
+	
+	return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+async def run_benchmark(name: str, operation: Callable, calls: int, params: Dict = None, ops_per_call: int = 1, trace_memory: bool = True):
+	#awaits operation() calls times, timing each call... then, with trace_memory, once more under tracemalloc for its peak memory
+	#(tracing slows everything down, so it is kept out of the timed calls)
+	latencies = []
+	started = time.perf_counter()
+	for _ in range(calls):
+		call_started = time.perf_counter()
+		await operation()
+		latencies.append(time.perf_counter() - call_started)
+	total_seconds = time.perf_counter() - started
+	
+	peak_memory_bytes = None
+	if trace_memory:
+		tracemalloc.start()
+		try:
+			await operation()
+			_, peak_memory_bytes = tracemalloc.get_traced_memory()
+		finally:
+			tracemalloc.stop()
+	
+	latencies.sort()
+	return BenchmarkResult(
+		name = name,
+		params = dict(params or {}),
+		calls = calls,
+		ops_per_call = ops_per_call,
+		total_seconds = total_seconds,
+		p50_ms = get_percentile(latencies, 0.50) * 1000,
+		p95_ms = get_percentile(latencies, 0.95) * 1000,
+		p99_ms = get_percentile(latencies, 0.99) * 1000,
+		max_ms = latencies[-1] * 1000 if latencies else 0.0,
+		peak_memory_bytes = peak_memory_bytes
+	)
+
+
+def format_results(results: List[BenchmarkResult]):
+	lines = [f"{'benchmark':<58} | {'ops/s':>12} | {'p50 ms':>10} | {'p95 ms':>10} | {'p99 ms':>10} | {'peak MB':>9}"]
+	for result in results:
+		peak_memory = "-" if result.peak_memory_bytes is None else f"{result.peak_memory_bytes / 2**20:.1f}"
+		lines.append(f"{result.key:<58} | {result.ops_per_second:>12.0f} | {result.p50_ms:>10.3f} | {result.p95_ms:>10.3f} | {result.p99_ms:>10.3f} | {peak_memory:>9}")
+	
+	return "\n".join(lines)
+
+
+def save_baseline(results: List[BenchmarkResult], path: str):
+	with open(path, "w") as file:
+		json.dump({
+			"python": platform.python_version(),
+			"machine": platform.machine(),
+			"results": {result.key: asdict(result) for result in results}
+		}, file, indent = 1)
+
+
+def load_baseline(path: str):
+	with open(path) as file:
+		baseline = json.load(file)
+	
+	return {key: BenchmarkResult(**result) for key, result in baseline["results"].items()}
+
+
+def compare_to_baseline(results: List[BenchmarkResult], baseline: Dict[str, BenchmarkResult], tolerance: float = 0.2):
+	#[{"key", "p50_change", "ops_per_second_change", "peak_memory_change", "is_regression"}, ...] for the results the baseline also has...
+	#changes are fractions (0.25 is 25% more than the baseline), and a result regresses when its p50 or peak memory grew by more than tolerance
+	comparisons = []
+	for result in results:
+		baseline_result = baseline.get(result.key)
+		if baseline_result is None:
+			continue
+		
+		p50_change = result.p50_ms / baseline_result.p50_ms - 1 if baseline_result.p50_ms else 0.0
+		ops_per_second_change = result.ops_per_second / baseline_result.ops_per_second - 1 if baseline_result.ops_per_second else 0.0
+		peak_memory_change = None
+		if result.peak_memory_bytes is not None and baseline_result.peak_memory_bytes:
+			peak_memory_change = result.peak_memory_bytes / baseline_result.peak_memory_bytes - 1
+		
+		comparisons.append({
+			"key": result.key,
+			"p50_change": p50_change,
+			"ops_per_second_change": ops_per_second_change,
+			"peak_memory_change": peak_memory_change,
+			"is_regression": p50_change > tolerance or (peak_memory_change is not None and peak_memory_change > tolerance)
+		})
+	
+	return comparisons
+
+
+def format_comparisons(comparisons: List[Dict]):
+	lines = [f"{'benchmark':<58} | {'p50':>9} | {'ops/s':>9} | {'peak mem':>9} |"]
+	for comparison in comparisons:
+		peak_memory_change = "-" if comparison["peak_memory_change"] is None else f"{comparison['peak_memory_change']:+.1%}"
+		flag = "REGRESSION" if comparison["is_regression"] else ""
+		lines.append(f"{comparison['key']:<58} | {comparison['p50_change']:>+9.1%} | {comparison['ops_per_second_change']:>+9.1%} | {peak_memory_change:>9} | {flag}")
+	
+	return "\n".join(lines)
@@ -0,0 +1,118 @@
+import math
+from array import array
+from typing import Dict, List
+from value_object.unit import Unit
+from error import UnexistingProduct, UnsupportedUnitError
+
+try:
+	import numpy
+except ImportError:
+	#numpy is optional... without it, the same math runs as a plain loop over the packed arrays
+	numpy = None
+
+
+#a product's conversion factors take one slot per unit, in this order... nan marks a unit the product doesn't support
+_UNIT_INDEXES = {unit: unit_index for unit_index, unit in enumerate(Unit)}
+#the same, keyed by id()... Enum hashing runs in python, which dominates lookups for a large batch, while units are singletons
+_UNIT_INDEXES_BY_ID = {id(unit): unit_index for unit, unit_index in _UNIT_INDEXES.items()}
+_UNIT_COUNT = len(_UNIT_INDEXES)
+_UNSUPPORTED = math.nan
+
+
+
+class InventoryColumns(object):
+	#every product's (base unit) qty and conversion factors, packed into flat arrays in order of product creation...
+	#kept current one slot at a time, so converting many qtys at once never walks the ProductInventory objects
+	
+	def __init__(self):
+		self._skus: List[str] = []
+		#sku -> row
+		self._positions: Dict[str, int] = {}
+		self._qtys = array("d")
+		self._base_unit_indexes = array("b")
+		#row * _UNIT_COUNT + unit index -> conversion factor
+		self._conversion_factors = array("d")
+	
+	
+	def __len__(self):
+		return len(self._skus)
+	
+	
+	def add_product(self, sku: str, base_unit: Unit, qty: float, conversion_factors: Dict[Unit, float]):
+		self._positions[sku] = len(self._skus)
+		self._skus.append(sku)
+		self._qtys.append(qty)
+		self._base_unit_indexes.append(_UNIT_INDEXES[base_unit])
+		
+		factors = [_UNSUPPORTED] * _UNIT_COUNT
+		for unit, conversion_factor in conversion_factors.items():
+			factors[_UNIT_INDEXES[unit]] = conversion_factor
+		self._conversion_factors.extend(factors)
+	
+	
+	def set_qty(self, sku: str, qty: float):
+		self._qtys[self._positions[sku]] = qty
+	
+	
+	def set_conversion_factor(self, sku: str, unit: Unit, conversion_factor: float):
+		self._conversion_factors[self._positions[sku] * _UNIT_COUNT + _UNIT_INDEXES[unit]] = conversion_factor
+	
+	
+	def _get_factor_indexes(self, skus: List[str], units: List[Unit]):
+		#(sku position, unit index) -> slot in _conversion_factors, a numpy array when numpy is installed
+		positions = list(map(self._positions.get, skus))
+		if None in positions:
+			raise UnexistingProduct(f"Product does not exist in this inventory with sku={skus[positions.index(None)]}")
+		
+		unit_indexes = list(map(_UNIT_INDEXES_BY_ID.get, map(id, units)))
+		if None in unit_indexes:
+			index = unit_indexes.index(None)
+			raise UnsupportedUnitError(f"Unit ({units[index]}) Not supported by Product ({skus[index]})")
+		
+		if numpy is not None:
+			return numpy.array(positions, dtype = numpy.intp) * _UNIT_COUNT + numpy.array(unit_indexes, dtype = numpy.intp)
+		
+		return [position * _UNIT_COUNT + unit_index for position, unit_index in zip(positions, unit_indexes)]
+	
+	
+	def convert(self, skus: List[str], units: List[Unit]):
+		#qty of each sku in the unit at the same index... an unknown sku or an unsupported unit fails the whole batch
+		factor_indexes = self._get_factor_indexes(skus = skus, units = units)
+		
+		if numpy is not None:
+			factors = numpy.frombuffer(self._conversion_factors, dtype = numpy.float64)[factor_indexes]
+			qtys = numpy.frombuffer(self._qtys, dtype = numpy.float64)[factor_indexes // _UNIT_COUNT]
+			unsupported_at = numpy.flatnonzero(numpy.isnan(factors))
+			first_unsupported = int(unsupported_at[0]) if len(unsupported_at) else None
+		else:
+			factors = [self._conversion_factors[factor_index] for factor_index in factor_indexes]
+			qtys = [self._qtys[factor_index // _UNIT_COUNT] for factor_index in factor_indexes]
+			first_unsupported = next((index for index, factor in enumerate(factors) if math.isnan(factor)), None)
+		
+		if first_unsupported is not None:
+			raise UnsupportedUnitError(f"Unit ({units[first_unsupported]}) Not supported by Product ({skus[first_unsupported]})")
+		
+		if numpy is not None:
+			return (qtys / factors).tolist()
+		
+		return [qty / factor for qty, factor in zip(qtys, factors)]
+	
+	
+	def get_catalogue(self):
+		#(skus, base units, qtys) of every product, in order of product creation
+		units = list(Unit)
+		return list(self._skus), [units[unit_index] for unit_index in self._base_unit_indexes], self._qtys.tolist()
+	
+	
+	@staticmethod
+	def get_values(qtys: List[float], unit_costs: List[float]):
+		#(value of each qty, total value)
+		if len(unit_costs) != len(qtys):
+			raise ValueError(f"Expected {len(qtys)} unit costs... got {len(unit_costs)}")
+		
+		if numpy is not None:
+			values = numpy.multiply(qtys, unit_costs)
+			return values.tolist(), float(values.sum())
+		
+		values = [qty * unit_cost for qty, unit_cost in zip(qtys, unit_costs)]
+		return values, math.fsum(values)
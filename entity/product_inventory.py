@@ -1,46 +1,64 @@
+from typing import Dict, List, Callable
 from value_object.unit import Unit, UnitConversion
 from value_object.qty_change_type import ChangeType
-from error import UnsupportedUnitError, UnsupportedChangeTypeError, InvalidQtyError
+from error import UnsupportedUnitError, UnsupportedChangeTypeError, InvalidQtyError, AlreadySupportedUnitError
 
 
 class ProductInventory(object):
 
-	def __init__(self, sku: str, product_name: str, base_unit: Unit, qty:float = 0):
+	def __init__(self, sku: str, product_name: str, base_unit: Unit, qty:float = 0, qty_scale: int = None):
 		self.sku = sku
 		self.product_name = product_name
 		self.base_unit = base_unit
-		self._qty = qty or 0
-		self._supported_units = [
-			UnitConversion(unit=base_unit, conversion_factor=1),
-		]
+		
+		#with a qty_scale (e.g. 1000 for milli-units), qtys are kept as whole 1/qty_scale base units...
+		#every change is then exact integer arithmetic, and qtys are rounded to that resolution on the way in
+		self.check_qty_scale_OR_raise_err(qty_scale)
+		self.qty_scale = qty_scale
+		self._qty = self._to_raw_qty(qty or 0)
+		#unit -> UnitConversion, so resolving a conversion factor is a single lookup
+		self._unit_conversions: Dict[Unit, UnitConversion] = {
+			base_unit: UnitConversion(unit=base_unit, conversion_factor=1),
+		}
+		#in base unit... None means no reorder level is set
+		self.reorder_level: float | None = None
+		#called with this ProductInventory after every change of its qty
+		self._qty_change_listeners: List[Callable] = []
 	
 	
-	def add_supported_unit(self, unit: Unit, conversion_factor: float):
+	@staticmethod
+	def check_qty_scale_OR_raise_err(qty_scale: int | None):
+		if qty_scale is not None and (not isinstance(qty_scale, int) or qty_scale <= 0):
+			raise ValueError(f"qty_scale must be a positive whole number... you entered '{qty_scale}'")
+	
+	
+	def add_qty_change_listener(self, listener: Callable):
+		self._qty_change_listeners.append(listener)
+	
+	
+	def check_new_unit_OR_raise_err(self, unit: Unit, conversion_factor: float):
+		if not isinstance(unit, Unit):
+			raise UnsupportedUnitError(f"Tried to add an invalid unit ({unit}) to Product ({self.product_name})")
+		
 		if conversion_factor < 0:
 			raise ValueError(f"conversion_factor cannot be negative... you entered '{conversion_factor}'")
-			
-		self._supported_units.append(UnitConversion(unit = unit, conversion_factor = conversion_factor))
+		
+		if unit in self._unit_conversions:
+			raise AlreadySupportedUnitError(f"Unit ({unit}) is already supported by Product ({self.product_name})")
+	
+	
+	def add_supported_unit(self, unit: Unit, conversion_factor: float):
+		self.check_new_unit_OR_raise_err(unit = unit, conversion_factor = conversion_factor)
+		self._unit_conversions[unit] = UnitConversion(unit = unit, conversion_factor = conversion_factor)
+	
+	
+	def supports_unit(self, unit: Unit):
+		return isinstance(unit, Unit) and unit in self._unit_conversions
 	
 	
 	def _get_unit_conv_OR_raise_err(self, unit: Unit):
-		is_a_valid_unit = isinstance(unit, Unit)
-		is_a_supported_unit = False
-		
-		#checking if unit is supported
-		for unit_conversion in self._supported_units:
-			if unit_conversion.unit == unit:
-				is_a_supported_unit = True
-				break
-		
-		#if this unit_not_okay variable is true, then the if-statement will execute... raising an error..
-		#if unit is_a_valid_unit or is_a_supported_unit, then the unit_not_okay willbe false
-		#leading to the error not being raise
-		unit_not_okay = not (is_a_valid_unit and is_a_supported_unit)
-		
-		if unit_not_okay:
-			raise UnsupportedUnitError(f"Unit ({unit}) Not supported by Product ({self.product_name})")
-		
-		unit_conversion = next((unit_conv for unit_conv in self._supported_units if unit_conv.unit == unit), None)
+		#anything that is not a Unit, or a unit not added to this product, is simply absent from the dict
+		unit_conversion = self._unit_conversions.get(unit) if isinstance(unit, Unit) else None
 		
 		if unit_conversion is None:
 			raise UnsupportedUnitError(f"Unit ({unit}) Not supported by Product ({self.product_name})")
@@ -48,6 +66,15 @@ class ProductInventory(object):
 		return unit_conversion
 	
 	
+	def _to_raw_qty(self, qty: float):
+		#base unit qty -> the way _qty holds it
+		return qty if self.qty_scale is None else round(qty * self.qty_scale)
+	
+	
+	def _from_raw_qty(self, raw_qty: float | int):
+		return raw_qty if self.qty_scale is None else raw_qty / self.qty_scale
+	
+	
 	def _convert_to_base_unit(self, qty: float, from_unit: Unit):
 		
 		unit_conversion = self._get_unit_conv_OR_raise_err(from_unit)
@@ -64,12 +91,36 @@ class ProductInventory(object):
 		return qty / divide_by
 		
 	
+	def to_base_unit(self, qty: float, unit: Unit = None):
+		#validates a qty the way change_qty would, without changing anything... lets callers check a batch up-front
+		if qty < 0:
+			raise InvalidQtyError(f"Tried to pass in negative Qty ({qty})")
+		
+		if unit is None:
+			unit = self.base_unit
+		
+		qty_in_base_unit = self._convert_to_base_unit(from_unit = unit, qty = qty)
+		
+		if self.qty_scale is None:
+			return qty_in_base_unit
+		
+		return self._from_raw_qty(self._to_raw_qty(qty_in_base_unit))
+	
+	
+	def from_base_unit(self, qty: float, unit: Unit = None):
+		#converts any base unit qty (not only the current one) into unit
+		if unit is None:
+			unit = self.base_unit
+		
+		return self._convert_from_base_unit(to_unit = unit, qty = qty)
+	
+	
 	def get_qty(self, unit: Unit = None):
 		
 		if unit is None:
 			unit = self.base_unit
 		
-		qty_in_base_unit = self._qty
+		qty_in_base_unit = self._from_raw_qty(self._qty)
 		qty_in_their_unit = self._convert_from_base_unit(to_unit = unit, qty=qty_in_base_unit)
 		
 		return qty_in_their_unit
@@ -94,24 +145,76 @@ class ProductInventory(object):
 			unit = self.base_unit
 		
 		qty_in_base_unit = self._convert_to_base_unit(from_unit = unit, qty = qty)
+		self._qty = self._get_raw_qty_after_change(raw_qty = self._to_raw_qty(qty_in_base_unit), change_type = change_type, current_raw_qty = self._qty)
+		
+		for listener in self._qty_change_listeners:
+			listener(self)
+	
+	
+	def set_reorder_level(self, reorder_level: float | None, unit: Unit = None):
+		if reorder_level is None:
+			self.reorder_level = None
+			return
+		
+		self.reorder_level = self.to_base_unit(qty = reorder_level, unit = unit)
+	
+	
+	def is_below_reorder_level(self):
+		return self.reorder_level is not None and self._from_raw_qty(self._qty) < self.reorder_level
+	
+	
+	def get_qty_after_change(self, qty_in_base_unit: float, change_type: ChangeType, current_qty: float = None):
+		#what the (base unit) qty would become, without changing it... current_qty lets callers project a batch of changes
+		current_raw_qty = self._qty if current_qty is None else self._to_raw_qty(current_qty)
+		raw_qty = self._get_raw_qty_after_change(raw_qty = self._to_raw_qty(qty_in_base_unit), change_type = change_type, current_raw_qty = current_raw_qty)
 		
+		return self._from_raw_qty(raw_qty)
+	
+	
+	def _get_raw_qty_after_change(self, raw_qty: float | int, change_type: ChangeType, current_raw_qty: float | int):
 		if change_type == ChangeType.RECEIVE:
-			self._qty = self._qty + qty_in_base_unit
+			return current_raw_qty + raw_qty
 		
 		elif change_type == ChangeType.ISSUE:
-			if (self._qty - qty_in_base_unit) < 0:
-				raise InvalidQtyError("You can't issue more than the qty available")
+			if (current_raw_qty - raw_qty) < 0:
+				raise InvalidQtyError(f"You can't issue more than the qty available of Product ({self.product_name})")
 			
-			self._qty = self._qty - qty_in_base_unit
+			return current_raw_qty - raw_qty
 		
 		elif change_type == ChangeType.ADJUST:
-			self._qty = qty_in_base_unit
+			return raw_qty
 		
 		else:
 			raise UnsupportedChangeTypeError(f"unsupported value entered for change_type ({change_type})")
 	
 	
+	def get_state(self):
+		#plain data for snapshots... units go by their stable codes
+		return {
+			"sku": self.sku,
+			"product_name": self.product_name,
+			"base_unit": self.base_unit.value,
+			"qty": self._from_raw_qty(self._qty),
+			"qty_scale": self.qty_scale,
+			"reorder_level": self.reorder_level,
+			"unit_conversions": [
+				(unit_conversion.unit.value, unit_conversion.conversion_factor)
+				for unit_conversion in self._unit_conversions.values()
+				if unit_conversion.unit != self.base_unit
+			]
+		}
+	
+	
+	@classmethod
+	def from_state(cls, state: dict):
+		product_inventory = cls(sku = state["sku"], product_name = state["product_name"], base_unit = Unit(state["base_unit"]), qty = state["qty"], qty_scale = state["qty_scale"])
+		for unit_code, conversion_factor in state["unit_conversions"]:
+			product_inventory.add_supported_unit(unit = Unit(unit_code), conversion_factor = conversion_factor)
+		product_inventory.reorder_level = state["reorder_level"]
+		
+		return product_inventory
+	
 
 
-async def create_product_inventory(sku: str, product_name: str, base_unit: Unit, qty:float=0):
-	return ProductInventory(qty=qty, sku=sku, product_name=product_name, base_unit=base_unit)
+async def create_product_inventory(sku: str, product_name: str, base_unit: Unit, qty:float=0, qty_scale: int = None):
+	return ProductInventory(qty=qty, sku=sku, product_name=product_name, base_unit=base_unit, qty_scale=qty_scale)
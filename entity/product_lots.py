@@ -0,0 +1,143 @@
+import heapq
+from datetime import date, datetime
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from error import InvalidQtyError
+
+
+#how far off a float lot qty may be from what is issued and still count as used up
+_CRUMB = 1e-9
+
+
+
+@dataclass(slots=True)
+class Lot:
+	lot_id: str | None #None is the product's unlotted stock, e.g. its balance from before lot tracking
+	expiry_date: date | None
+	unit_cost: float | None #per base unit
+	qty: float | int #raw, the way the product's ProductInventory holds qtys
+
+
+
+class ProductLots(object):
+	#a lot tracked product's stock, split by lot... issues draw from the lot expiring first (FEFO), lots without an expiry last
+	#the lots sit in a heap keyed by expiry, so receiving a lot or allocating from one costs O(log(open lots))
+	
+	def __init__(self, qty_scale: int = None):
+		#same qty_scale as the product, so lot qtys always add up exactly to the product's qty
+		self._qty_scale = qty_scale
+		#lot_id -> Lot, for the lots with stock left
+		self._lots: Dict[str | None, Lot] = {}
+		#[(lot not expiring, expiry date, receipt number, lot_id), ...]... a lot is only ever drawn down at the top,
+		#so it leaves the heap the moment it runs out
+		self._heap: List[Tuple] = []
+		self._receipt_count = 0
+	
+	
+	def _to_raw_qty(self, qty: float):
+		return qty if self._qty_scale is None else round(qty * self._qty_scale)
+	
+	
+	def _from_raw_qty(self, raw_qty: float | int):
+		return raw_qty if self._qty_scale is None else raw_qty / self._qty_scale
+	
+	
+	def check_receipt_OR_raise_err(self, lot_id: str | None, expiry_date: date | None, unit_cost: float | None):
+		if lot_id is not None and not isinstance(lot_id, str):
+			raise ValueError(f"Invalid lot_id ({lot_id})")
+		
+		if expiry_date is not None and (not isinstance(expiry_date, date) or isinstance(expiry_date, datetime)):
+			raise ValueError(f"expiry_date must be a date... you entered '{expiry_date}'")
+		
+		if unit_cost is not None and unit_cost < 0:
+			raise ValueError(f"unit_cost cannot be negative... you entered '{unit_cost}'")
+		
+		#stock without a lot has neither, so a line received without one (e.g. through apply_movements) can always go in
+		if lot_id is None and (expiry_date is not None or unit_cost is not None):
+			raise ValueError(f"Stock without a lot_id can't have an expiry_date ({expiry_date}) or unit_cost ({unit_cost})")
+		
+		#a lot is one expiry and one cost layer... receiving into it again must agree with both
+		lot = self._lots.get(lot_id)
+		if lot is not None and (lot.expiry_date != expiry_date or lot.unit_cost != unit_cost):
+			raise ValueError(f"Lot ({lot_id}) was received with expiry_date ({lot.expiry_date}) and unit_cost ({lot.unit_cost})")
+	
+	
+	def receive(self, qty: float, lot_id: str | None = None, expiry_date: date | None = None, unit_cost: float | None = None):
+		#qty in base unit, unit_cost per base unit
+		if qty < 0:
+			raise InvalidQtyError(f"Tried to pass in negative Qty ({qty})")
+		
+		self.check_receipt_OR_raise_err(lot_id = lot_id, expiry_date = expiry_date, unit_cost = unit_cost)
+		raw_qty = self._to_raw_qty(qty)
+		if not raw_qty:
+			return
+		
+		lot = self._lots.get(lot_id)
+		if lot is not None:
+			lot.qty = lot.qty + raw_qty
+			return
+		
+		self._lots[lot_id] = Lot(lot_id = lot_id, expiry_date = expiry_date, unit_cost = unit_cost, qty = raw_qty)
+		self._receipt_count = self._receipt_count + 1
+		heapq.heappush(self._heap, (expiry_date is None, expiry_date or date.min, self._receipt_count, lot_id))
+	
+	
+	def allocate(self, qty: float):
+		#takes qty (base unit) out of the lots, first expiring first... returns [(lot_id, qty), ...] in the order they were drawn
+		#the caller has already checked the product holds qty, and the lots hold exactly what the product does
+		remaining = self._to_raw_qty(qty)
+		allocations = []
+		
+		while remaining > 0 and self._heap:
+			lot_id = self._heap[0][3]
+			lot = self._lots[lot_id]
+			
+			#float qtys may leave a crumb behind... a lot within rounding of the remainder is used up whole
+			if lot.qty - remaining <= _CRUMB:
+				heapq.heappop(self._heap)
+				del self._lots[lot_id]
+				allocations.append((lot_id, self._from_raw_qty(lot.qty)))
+				remaining = remaining - lot.qty
+			else:
+				lot.qty = lot.qty - remaining
+				allocations.append((lot_id, self._from_raw_qty(remaining)))
+				remaining = 0
+		
+		return allocations
+	
+	
+	def get_qty(self):
+		return self._from_raw_qty(sum(lot.qty for lot in self._lots.values()))
+	
+	
+	def get_lots(self):
+		#[{"lot_id", "expiry_date", "unit_cost", "qty"}, ...] in the order issues would draw them, qtys in base unit
+		return [
+			{
+				"lot_id": lot_id,
+				"expiry_date": expiry_date if not never_expires else None,
+				"unit_cost": self._lots[lot_id].unit_cost,
+				"qty": self._from_raw_qty(self._lots[lot_id].qty)
+			}
+			for never_expires, expiry_date, _, lot_id in sorted(self._heap)
+		]
+	
+	
+	def get_state(self):
+		#the heap goes out as it is, so it loads back without being rebuilt
+		return {
+			"qty_scale": self._qty_scale,
+			"receipt_count": self._receipt_count,
+			"heap": list(self._heap),
+			"lots": [(lot.lot_id, lot.expiry_date, lot.unit_cost, lot.qty) for lot in self._lots.values()]
+		}
+	
+	
+	@classmethod
+	def from_state(cls, state: dict):
+		product_lots = cls(qty_scale = state["qty_scale"])
+		product_lots._receipt_count = state["receipt_count"]
+		product_lots._heap = list(state["heap"])
+		product_lots._lots = {lot_id: Lot(lot_id = lot_id, expiry_date = expiry_date, unit_cost = unit_cost, qty = qty) for lot_id, expiry_date, unit_cost, qty in state["lots"]}
+		
+		return product_lots
@@ -1,57 +1,245 @@
+import os
+import zlib
+import asyncio
+from bisect import bisect_right
+from typing import Dict
 from datetime import datetime
+from urllib.parse import quote
+from entity.stock_movement_ledger import StockMovementLedger
+from persistence.binary_codec import encode_stock_movements, decode_stock_movements
 from value_object.stock_movement import StockMovement
 from value_object.unit import Unit
 from value_object.qty_change_type import ChangeType
-from error import InvalidQtyError
+from error import InvalidQtyError, CompactedHistoryError
+
+
+
+def _get_balance_location(timestamp: datetime):
+	date_str = str(timestamp).split(" ")[0]
+	return f"Balance as at {date_str}"
 
 
 
 class ProductStockMovement:
-	def __init__(self, sku, opening_bal: float, base_unit: Unit):
+	def __init__(self, sku, opening_bal: float, base_unit: Unit, timestamp: datetime = None, qty_scale: int = None):
 		self.sku = sku
 		
-		timestamp = datetime.now()
-		date_str = str(timestamp).split(" ")[0]
-		self._stock_movement = [
-			StockMovement(
-				timestamp = timestamp,
-				location = f"Balance as at {date_str}",
-				received = None,
-				issued = None,
-				unit = None,
-				bal = opening_bal,
-				base_unit = base_unit
-			)
-		]
-	
-	
-	def record(self, location:str, qty: float, change_type: ChangeType, unit:Unit, bal: float, base_unit: Unit):
+		if timestamp is None:
+			timestamp = datetime.now()
+		self._stock_movement = StockMovementLedger(qty_scale = qty_scale)
+		#compacted history, oldest first... [{"path", "row_count", "since", "until"}, ...]
+		self._archive_segments = []
+		#timestamp of the balance row the last compaction left at the head... rows before it are only in the archive
+		self._compacted_until: datetime | None = None
+		#same, for the last compaction without an archive... rows before it are gone
+		self._unarchived_until: datetime | None = None
+		self._stock_movement.append(
+			timestamp = timestamp,
+			location = _get_balance_location(timestamp),
+			change_type = None,
+			qty = 0,
+			unit = None,
+			bal = opening_bal,
+			base_unit = base_unit
+		)
+	
+	
+	def record(self, location:str, qty: float, change_type: ChangeType, unit:Unit, bal: float, base_unit: Unit, timestamp: datetime = None, lot_id: str = None):
 		if qty < 0:
 			raise InvalidQtyError(f"Tried to pass in negative Qty ({qty})")
 		
 		self._stock_movement.append(
-			StockMovement(
-				timestamp = datetime.now(),
-				location = location,
-				received = qty if (change_type == ChangeType.RECEIVE) else None,
-				issued = qty if (change_type == ChangeType.ISSUE) else None,
-				unit = unit,
-				bal = bal,
-				base_unit = base_unit
-			)
+			timestamp = datetime.now() if timestamp is None else timestamp,
+			location = location,
+			change_type = change_type,
+			qty = qty,
+			unit = unit,
+			bal = bal,
+			base_unit = base_unit,
+			lot_id = lot_id
 		)
 	
-	def get_snapshot(self):
-		stock_movement = []
-		for movement in self._stock_movement:
-			stock_movement.append({
-				"timestamp": movement.timestamp,
-				"location": movement.location,
-				"received": movement.received,
-				"issued": movement.issued,
-				"unit": movement.unit,
-				"bal": movement.bal,
-				"base_unit": movement.base_unit
-			})
-		
-		return stock_movement
\ No newline at end of file
+	
+	def _get_compactable_row_count(self, cutoff: datetime):
+		_, row_count = self._stock_movement.get_index_range(until = cutoff)
+		
+		#a lone balance row at the head is already as compact as it gets
+		if row_count == 1 and self._stock_movement[0].unit is None:
+			return 0
+		return row_count
+	
+	
+	def write_archive_segment(self, cutoff: datetime, archive_dir: str):
+		#writes the rows compact(cutoff) would roll up to archive_dir, without compacting them... returns the segment to hand
+		#to compact, None if there is nothing to roll up
+		row_count = self._get_compactable_row_count(cutoff)
+		if row_count == 0:
+			return None
+		return self._write_archive_segment(archive_dir = archive_dir, row_count = row_count)
+	
+	
+	def compact(self, cutoff: datetime, archive_dir: str = None, archive_segment: Dict = None):
+		#rolls every row before cutoff into one "Balance as at <date>" row, carrying their last bal forward...
+		#with archive_dir, the raw rows are first written there as a compressed segment (see get_archived_movements),
+		#archive_segment being one write_archive_segment already wrote for the same cutoff
+		#returns how many rows were rolled up
+		row_count = self._get_compactable_row_count(cutoff)
+		if row_count == 0:
+			return 0
+		
+		last_compacted_movement = self._stock_movement[row_count - 1]
+		
+		if archive_segment is None and archive_dir is not None:
+			archive_segment = self._write_archive_segment(archive_dir = archive_dir, row_count = row_count)
+		if archive_segment is not None:
+			self._archive_segments.append(archive_segment)
+		else:
+			self._unarchived_until = last_compacted_movement.timestamp
+		self._compacted_until = last_compacted_movement.timestamp
+		
+		self._stock_movement.replace_head(
+			row_count = row_count,
+			location = _get_balance_location(last_compacted_movement.timestamp),
+			bal = last_compacted_movement.bal,
+			base_unit = last_compacted_movement.base_unit
+		)
+		
+		return row_count
+	
+	
+	def _write_archive_segment(self, archive_dir: str, row_count: int):
+		movements = self._stock_movement[:row_count]
+		since = movements[0].timestamp
+		
+		#named after the sku and the first row it holds, so compacting the same rows again (e.g. on log replay) rewrites the same file
+		path = os.path.join(archive_dir, f"{quote(self.sku, safe='')}.{since.strftime('%Y%m%dT%H%M%S%f')}.movements.z")
+		temp_path = f"{path}.tmp"
+		with open(temp_path, "wb") as file:
+			file.write(zlib.compress(encode_stock_movements(movements)))
+			file.flush()
+			os.fsync(file.fileno())
+		os.replace(temp_path, path)
+		
+		return {
+			"path": path,
+			"row_count": row_count,
+			"since": since,
+			"until": movements[-1].timestamp
+		}
+	
+	
+	def get_archive_segments(self):
+		return [dict(archive_segment) for archive_segment in self._archive_segments]
+	
+	
+	def get_archived_movements(self):
+		#generator of the archived StockMovement rows, oldest first... one segment is read from disk at a time, as it is reached
+		for archive_segment in self._archive_segments:
+			yield from self._read_archive_segment(archive_segment)
+	
+	
+	@staticmethod
+	def _read_archive_segment(archive_segment: Dict):
+		with open(archive_segment["path"], "rb") as file:
+			return decode_stock_movements(zlib.decompress(file.read()))
+	
+	
+	def get_state(self):
+		return {
+			"sku": self.sku,
+			"stock_movement": self._stock_movement.get_state(),
+			"archive_segments": self._archive_segments,
+			"compacted_until": self._compacted_until,
+			"unarchived_until": self._unarchived_until
+		}
+	
+	
+	@classmethod
+	def from_state(cls, state: dict):
+		#skips __init__, the opening balance row is already part of the saved ledger
+		product_stock_movement = cls.__new__(cls)
+		product_stock_movement.sku = state["sku"]
+		product_stock_movement._stock_movement = StockMovementLedger.from_state(state["stock_movement"])
+		product_stock_movement._archive_segments = list(state["archive_segments"])
+		product_stock_movement._compacted_until = state["compacted_until"]
+		product_stock_movement._unarchived_until = state["unarchived_until"]
+		
+		return product_stock_movement
+	
+	
+	def __len__(self):
+		return len(self._stock_movement)
+	
+	
+	def __getitem__(self, index: int | slice):
+		return self._stock_movement[index]
+	
+	
+	def _get_index_range(self, since: datetime = None, until: datetime = None, offset: int = 0, limit: int = None):
+		if offset < 0:
+			raise ValueError(f"offset cannot be negative... you entered '{offset}'")
+		
+		if limit is not None and limit < 0:
+			raise ValueError(f"limit cannot be negative... you entered '{limit}'")
+		
+		start, stop = self._stock_movement.get_index_range(since = since, until = until)
+		start = min(start + offset, stop)
+		
+		if limit is not None:
+			stop = min(start + limit, stop)
+		
+		return start, stop
+	
+	
+	def _movement_to_dict(self, movement: StockMovement):
+		return {
+			"timestamp": movement.timestamp,
+			"location": movement.location,
+			"received": movement.received,
+			"issued": movement.issued,
+			"unit": movement.unit,
+			"bal": movement.bal,
+			"base_unit": movement.base_unit,
+			"lot_id": movement.lot_id
+		}
+	
+	
+	def get_bal_as_at(self, timestamp: datetime):
+		#in base unit... None if the product had no stock record yet at timestamp
+		#before the compacted head, the bal is read from the archive segment holding timestamp... CompactedHistoryError if those
+		#rows were compacted without an archive
+		if self._compacted_until is None or timestamp >= self._compacted_until:
+			return self._stock_movement.get_bal_as_at(timestamp)
+		
+		if self._unarchived_until is not None and timestamp < self._unarchived_until:
+			raise CompactedHistoryError(f"Stock movements of Product with sku ({self.sku}) up to {self._unarchived_until} were compacted without an archive")
+		
+		for archive_segment in reversed(self._archive_segments):
+			if archive_segment["since"] <= timestamp:
+				movements = self._read_archive_segment(archive_segment)
+				index = bisect_right([movement.timestamp for movement in movements], timestamp) - 1
+				return movements[index].bal
+		
+		return None
+	
+	
+	def count(self, since: datetime = None, until: datetime = None):
+		start, stop = self._get_index_range(since = since, until = until)
+		return stop - start
+	
+	
+	def get_snapshot(self, since: datetime = None, until: datetime = None, offset: int = 0, limit: int = None):
+		#since is inclusive, until is exclusive... offset/limit page through whatever rows fall in that time range
+		start, stop = self._get_index_range(since = since, until = until, offset = offset, limit = limit)
+		return [self._movement_to_dict(movement) for movement in self._stock_movement[start:stop]]
+	
+	
+	async def stream_snapshot(self, since: datetime = None, until: datetime = None, offset: int = 0, limit: int = None, batch_size: int = 1000):
+		start, stop = self._get_index_range(since = since, until = until, offset = offset, limit = limit)
+		
+		for batch_start in range(start, stop, batch_size):
+			for movement in self._stock_movement[batch_start:min(batch_start + batch_size, stop)]:
+				yield self._movement_to_dict(movement)
+			
+			#let other tasks run between batches of a long history
+			await asyncio.sleep(0)
@@ -0,0 +1,213 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from value_object.stock_movement import StockMovement
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+
+
+#timestamps are kept as whole microseconds from this (naive) epoch, which round-trips datetimes exactly
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+#the enums are stored by their (stable, small) values, so a row holds one byte instead of a reference... -1 stands for None
+_NO_CODE = -1
+_UNITS_BY_CODE = {unit.value: unit for unit in Unit}
+_RECEIVE_CODE = ChangeType.RECEIVE.value
+_ISSUE_CODE = ChangeType.ISSUE.value
+
+
+
+class StockMovementLedger(object):
+	#append-only, column per field... StockMovement rows are only built when they are read
+	
+	def __init__(self, qty_scale: int = None):
+		#with a qty_scale, bals are kept exactly, as whole 1/qty_scale base units (see ProductInventory)...
+		#qtys are in each row's own unit, which the scale doesn't apply to, so they stay floats
+		self._qty_scale = qty_scale
+		bal_typecode = "d" if qty_scale is None else "q"
+		
+		self._timestamps = array("q")
+		self._location_codes = array("I")
+		self._change_type_codes = array("b")
+		self._qtys = array("d")
+		self._unit_codes = array("b")
+		self._bals = array(bal_typecode)
+		self._base_unit_codes = array("b")
+		#-1 for rows of products without lot tracking, and for lot tracked stock without a lot
+		self._lot_codes = array("i")
+		
+		#interned locations... the same supplier/customer is stored once, no matter how many rows mention it
+		self._locations = []
+		self._location_codes_by_location = {}
+		#interned lot ids, the same way
+		self._lot_ids = []
+		self._lot_codes_by_lot_id = {}
+	
+	
+	def _get_columns(self):
+		return {
+			"timestamps": self._timestamps,
+			"location_codes": self._location_codes,
+			"change_type_codes": self._change_type_codes,
+			"qtys": self._qtys,
+			"unit_codes": self._unit_codes,
+			"bals": self._bals,
+			"base_unit_codes": self._base_unit_codes,
+			"lot_codes": self._lot_codes
+		}
+	
+	
+	def get_state(self):
+		#columns go out as raw bytes, which pickle far faster than array objects do
+		state = {name: column.tobytes() for name, column in self._get_columns().items()}
+		state["locations"] = self._locations
+		state["lot_ids"] = self._lot_ids
+		state["qty_scale"] = self._qty_scale
+		
+		return state
+	
+	
+	@classmethod
+	def from_state(cls, state: dict):
+		ledger = cls(qty_scale = state["qty_scale"])
+		for name, column in ledger._get_columns().items():
+			column.frombytes(state[name])
+		
+		ledger._locations = [sys.intern(location) for location in state["locations"]]
+		ledger._location_codes_by_location = {location: location_code for location_code, location in enumerate(ledger._locations)}
+		ledger._lot_ids = list(state["lot_ids"])
+		ledger._lot_codes_by_lot_id = {lot_id: lot_code for lot_code, lot_id in enumerate(ledger._lot_ids)}
+		
+		return ledger
+	
+	
+	def _get_location_code(self, location: str):
+		location_code = self._location_codes_by_location.get(location)
+		
+		if location_code is None:
+			location_code = len(self._locations)
+			location = sys.intern(location)
+			self._locations.append(location)
+			self._location_codes_by_location[location] = location_code
+		
+		return location_code
+	
+	
+	def _get_lot_code(self, lot_id: str | None):
+		if lot_id is None:
+			return _NO_CODE
+		
+		lot_code = self._lot_codes_by_lot_id.get(lot_id)
+		
+		if lot_code is None:
+			lot_code = self._lot_codes_by_lot_id[lot_id] = len(self._lot_ids)
+			self._lot_ids.append(lot_id)
+		
+		return lot_code
+	
+	
+	def _to_raw_qty(self, qty: float):
+		return qty if self._qty_scale is None else round(qty * self._qty_scale)
+	
+	
+	def _from_raw_qty(self, raw_qty: float | int):
+		return raw_qty if self._qty_scale is None else raw_qty / self._qty_scale
+	
+	
+	def append(self, timestamp: datetime, location: str, change_type: ChangeType | None, qty: float, unit: Unit | None, bal: float, base_unit: Unit, lot_id: str | None = None):
+		timestamp_code = (timestamp - _EPOCH) // _ONE_MICROSECOND
+		
+		#rows must stay time-ordered for the binary searches below...
+		#if the clock steps backwards, the row is stamped with the last timestamp instead
+		if self._timestamps and timestamp_code < self._timestamps[-1]:
+			timestamp_code = self._timestamps[-1]
+		
+		self._timestamps.append(timestamp_code)
+		self._location_codes.append(self._get_location_code(location))
+		self._change_type_codes.append(_NO_CODE if change_type is None else change_type.value)
+		self._qtys.append(qty)
+		self._unit_codes.append(_NO_CODE if unit is None else unit.value)
+		self._bals.append(self._to_raw_qty(bal))
+		self._base_unit_codes.append(base_unit.value)
+		self._lot_codes.append(self._get_lot_code(lot_id))
+	
+	
+	def replace_head(self, row_count: int, location: str, bal: float, base_unit: Unit):
+		#swaps the first row_count rows for a single balance row, stamped with the time of the last row it replaces...
+		#the one exception to append-only, used to compact old history
+		if not 0 < row_count <= len(self):
+			raise IndexError(f"Can't replace the first {row_count} of {len(self)} rows")
+		
+		timestamp_code = self._timestamps[row_count - 1]
+		location_code = self._get_location_code(location)
+		head = {
+			"timestamps": timestamp_code,
+			"location_codes": location_code,
+			"change_type_codes": _NO_CODE,
+			"qtys": 0,
+			"unit_codes": _NO_CODE,
+			"bals": self._to_raw_qty(bal),
+			"base_unit_codes": base_unit.value,
+			"lot_codes": _NO_CODE
+		}
+		
+		for name, column in self._get_columns().items():
+			compacted_column = array(column.typecode, [head[name]])
+			compacted_column.extend(column[row_count:])
+			setattr(self, f"_{name}", compacted_column)
+	
+	
+	def get_index_range(self, since: datetime = None, until: datetime = None):
+		#(start, stop) of the rows with since <= timestamp < until, found by binary search on the timestamps
+		start = 0 if since is None else bisect_left(self._timestamps, (since - _EPOCH) // _ONE_MICROSECOND)
+		stop = len(self) if until is None else bisect_left(self._timestamps, (until - _EPOCH) // _ONE_MICROSECOND)
+		
+		return start, max(start, stop)
+	
+	
+	def get_bal_as_at(self, timestamp: datetime):
+		#bal of the last row at or before timestamp (binary search), None if the ledger starts after it
+		index = bisect_right(self._timestamps, (timestamp - _EPOCH) // _ONE_MICROSECOND) - 1
+		return None if index < 0 else self._from_raw_qty(self._bals[index])
+	
+	
+	def _get_row(self, index: int):
+		change_type_code = self._change_type_codes[index]
+		qty = self._qtys[index]
+		unit_code = self._unit_codes[index]
+		lot_code = self._lot_codes[index]
+		
+		return StockMovement(
+			timestamp = _EPOCH + timedelta(microseconds = self._timestamps[index]),
+			location = self._locations[self._location_codes[index]],
+			received = qty if change_type_code == _RECEIVE_CODE else None,
+			issued = qty if change_type_code == _ISSUE_CODE else None,
+			unit = None if unit_code == _NO_CODE else _UNITS_BY_CODE[unit_code],
+			bal = self._from_raw_qty(self._bals[index]),
+			base_unit = _UNITS_BY_CODE[self._base_unit_codes[index]],
+			lot_id = None if lot_code == _NO_CODE else self._lot_ids[lot_code]
+		)
+	
+	
+	def __len__(self):
+		return len(self._timestamps)
+	
+	
+	def __getitem__(self, index: int | slice):
+		if isinstance(index, slice):
+			return [self._get_row(i) for i in range(*index.indices(len(self)))]
+		
+		if index < 0:
+			index = index + len(self)
+		
+		if not 0 <= index < len(self):
+			raise IndexError("stock movement index out of range")
+		
+		return self._get_row(index)
+	
+	
+	def __iter__(self):
+		for index in range(len(self)):
+			yield self._get_row(index)
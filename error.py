@@ -15,4 +15,39 @@ class UnexistingProduct(Exception):
 
 
 class AlreadyExistingProduct(Exception):
-	pass
\ No newline at end of file
+	pass
+
+
+class AlreadySupportedUnitError(Exception):
+	pass
+
+class CorruptedLogError(Exception):
+	pass
+
+
+class UnexistingStore(Exception):
+	pass
+
+
+class AlreadyExistingStore(Exception):
+	pass
+
+
+class ReceivedEntryAlreadyDone(Exception):
+	pass
+
+
+class UnexistingReceivedNode(Exception):
+	pass
+
+
+class ChangeFeedGapError(Exception):
+	pass
+
+
+class StoreWorkerDiedError(Exception):
+	pass
+
+
+class CompactedHistoryError(Exception):
+	pass
@@ -0,0 +1,222 @@
+import struct
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+from value_object.stock_movement import StockMovement
+from value_object.unit import Unit
+
+
+#compact binary encoding of the value objects/dicts that cross process boundaries or go to storage
+#all integers are little-endian... enums go by their (stable) values, 0 standing for None
+#strings are a u32 byte length + utf-8 bytes, with a length of 0xFFFFFFFF standing for None
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+_NONE_LENGTH = 0xFFFFFFFF
+_NO_CODE = 0
+
+#kind of the qty of a stock movement
+_NEITHER = 0
+_RECEIVED = 1
+_ISSUED = 2
+#set on the qty kind of a movement that carries a lot id (after its location)... movements encoded before lots existed never have it
+#also set on the unit of a received product line that carries lot fields (after its qty and unit)
+_HAS_LOT = 0x80
+
+_U32 = struct.Struct("<I")
+#timestamp, qty kind, qty, unit, bal, base unit
+_STOCK_MOVEMENT = struct.Struct("<qBdBdB")
+#qty, unit
+_QTY_AND_UNIT = struct.Struct("<dB")
+#unit cost of a received lot, NaN standing for None
+_UNIT_COST = struct.Struct("<d")
+
+_RECEIVED_ENTRY_STRING_FIELDS = ("received_entry_id", "created_at", "received_at", "received_from", "received_by", "purpose", "store_id")
+
+
+
+class _Reader(object):
+	def __init__(self, data: bytes):
+		self._data = memoryview(data)
+		self._offset = 0
+	
+	
+	def read_struct(self, struct_format: struct.Struct):
+		values = struct_format.unpack_from(self._data, self._offset)
+		self._offset = self._offset + struct_format.size
+		return values
+	
+	
+	def read_str(self):
+		(length,) = self.read_struct(_U32)
+		if length == _NONE_LENGTH:
+			return None
+		
+		value = str(self._data[self._offset:self._offset + length], "utf-8")
+		self._offset = self._offset + length
+		return value
+	
+	
+	def check_done(self):
+		if self._offset != len(self._data):
+			raise ValueError(f"{len(self._data) - self._offset} unexpected trailing bytes")
+
+
+
+def _pack_str(parts: List[bytes], value: str | None):
+	if value is None:
+		parts.append(_U32.pack(_NONE_LENGTH))
+		return
+	
+	encoded = value.encode("utf-8")
+	parts.append(_U32.pack(len(encoded)))
+	parts.append(encoded)
+
+
+def _unit_code(unit: Unit | None):
+	return _NO_CODE if unit is None else unit.value
+
+
+def _unit_from_code(unit_code: int):
+	return None if unit_code == _NO_CODE else Unit(unit_code)
+
+
+def _pack_stock_movement(parts: List[bytes], stock_movement: StockMovement):
+	if stock_movement.received is not None:
+		qty_kind, qty = _RECEIVED, stock_movement.received
+	elif stock_movement.issued is not None:
+		qty_kind, qty = _ISSUED, stock_movement.issued
+	else:
+		qty_kind, qty = _NEITHER, 0
+	
+	parts.append(_STOCK_MOVEMENT.pack(
+		(stock_movement.timestamp - _EPOCH) // _ONE_MICROSECOND,
+		qty_kind if stock_movement.lot_id is None else qty_kind | _HAS_LOT,
+		qty,
+		_unit_code(stock_movement.unit),
+		stock_movement.bal,
+		_unit_code(stock_movement.base_unit)
+	))
+	_pack_str(parts, stock_movement.location)
+	if stock_movement.lot_id is not None:
+		_pack_str(parts, stock_movement.lot_id)
+
+
+def _read_stock_movement(reader: _Reader):
+	timestamp, qty_kind, qty, unit_code, bal, base_unit_code = reader.read_struct(_STOCK_MOVEMENT)
+	location = reader.read_str()
+	lot_id = reader.read_str() if qty_kind & _HAS_LOT else None
+	qty_kind = qty_kind & ~_HAS_LOT
+	
+	return StockMovement(
+		timestamp = _EPOCH + timedelta(microseconds = timestamp),
+		location = location,
+		received = qty if qty_kind == _RECEIVED else None,
+		issued = qty if qty_kind == _ISSUED else None,
+		unit = _unit_from_code(unit_code),
+		bal = bal,
+		base_unit = _unit_from_code(base_unit_code),
+		lot_id = lot_id
+	)
+
+
+def encode_stock_movement(stock_movement: StockMovement):
+	parts = []
+	_pack_stock_movement(parts, stock_movement)
+	return b"".join(parts)
+
+
+def decode_stock_movement(data: bytes):
+	reader = _Reader(data)
+	stock_movement = _read_stock_movement(reader)
+	reader.check_done()
+	return stock_movement
+
+
+def encode_stock_movements(stock_movements: List[StockMovement]):
+	parts = [_U32.pack(len(stock_movements))]
+	for stock_movement in stock_movements:
+		_pack_stock_movement(parts, stock_movement)
+	
+	return b"".join(parts)
+
+
+def decode_stock_movements(data: bytes):
+	reader = _Reader(data)
+	(count,) = reader.read_struct(_U32)
+	stock_movements = [_read_stock_movement(reader) for _ in range(count)]
+	reader.check_done()
+	return stock_movements
+
+
+def encode_inventory_snapshot(inventory_snapshot: Dict):
+	#same shape as Store.get_inventory_snapshot:  {sku: {"unit": Unit, "qty": float}}
+	parts = [_U32.pack(len(inventory_snapshot))]
+	for sku, inventory in inventory_snapshot.items():
+		_pack_str(parts, sku)
+		parts.append(_QTY_AND_UNIT.pack(inventory["qty"], _unit_code(inventory["unit"])))
+	
+	return b"".join(parts)
+
+
+def decode_inventory_snapshot(data: bytes):
+	reader = _Reader(data)
+	(count,) = reader.read_struct(_U32)
+	inventory_snapshot = {}
+	for _ in range(count):
+		sku = reader.read_str()
+		qty, unit_code = reader.read_struct(_QTY_AND_UNIT)
+		inventory_snapshot[sku] = {"unit": _unit_from_code(unit_code), "qty": qty}
+	
+	reader.check_done()
+	return inventory_snapshot
+
+
+def encode_received_entry(received_entry: Dict):
+	#same shape as what Store.receive takes... only the known fields are encoded, missing ones decode as None
+	#a product line with any of lot_id, expiry_date and unit_cost decodes with all three
+	parts = []
+	for field in _RECEIVED_ENTRY_STRING_FIELDS:
+		_pack_str(parts, received_entry.get(field))
+	
+	received_products = received_entry["received_products"]
+	parts.append(_U32.pack(len(received_products)))
+	for product in received_products:
+		has_lot = "lot_id" in product or "expiry_date" in product or "unit_cost" in product
+		unit_code = _unit_code(product["unit"])
+		_pack_str(parts, product["sku"])
+		parts.append(_QTY_AND_UNIT.pack(float(product["qty"]), unit_code | _HAS_LOT if has_lot else unit_code))
+		
+		if has_lot:
+			expiry_date = product.get("expiry_date")
+			unit_cost = product.get("unit_cost")
+			_pack_str(parts, product.get("lot_id"))
+			_pack_str(parts, None if expiry_date is None else expiry_date.isoformat())
+			parts.append(_UNIT_COST.pack(math.nan if unit_cost is None else float(unit_cost)))
+	
+	return b"".join(parts)
+
+
+def decode_received_entry(data: bytes):
+	reader = _Reader(data)
+	received_entry = {field: reader.read_str() for field in _RECEIVED_ENTRY_STRING_FIELDS}
+	
+	(count,) = reader.read_struct(_U32)
+	received_products = []
+	for _ in range(count):
+		sku = reader.read_str()
+		qty, unit_code = reader.read_struct(_QTY_AND_UNIT)
+		product = {"sku": sku, "qty": qty, "unit": _unit_from_code(unit_code & ~_HAS_LOT)}
+		
+		if unit_code & _HAS_LOT:
+			product["lot_id"] = reader.read_str()
+			expiry_date = reader.read_str()
+			product["expiry_date"] = None if expiry_date is None else date.fromisoformat(expiry_date)
+			(unit_cost,) = reader.read_struct(_UNIT_COST)
+			product["unit_cost"] = None if math.isnan(unit_cost) else unit_cost
+		
+		received_products.append(product)
+	
+	received_entry["received_products"] = received_products
+	reader.check_done()
+	return received_entry
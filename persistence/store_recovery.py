@@ -0,0 +1,63 @@
+import os
+import asyncio
+from typing import Iterable
+from aggregrate.store import Store
+from persistence.write_ahead_log import WriteAheadLog
+from persistence.store_snapshot import save_store_snapshot, load_store_snapshot
+from error import UnexistingStore
+
+
+
+async def recover_store(store_id: str, store_name: str, snapshot_path: str, write_ahead_log: WriteAheadLog):
+	#latest snapshot (if any) + the log events after it... the returned store logs its new events to write_ahead_log
+	if os.path.exists(snapshot_path):
+		store, snapshot_seq = load_store_snapshot(snapshot_path)
+		if store.store_id != store_id:
+			raise ValueError(f"Snapshot at ({snapshot_path}) belongs to Store with id ({store.store_id}), not ({store_id})")
+	else:
+		store, snapshot_seq = Store(store_id = store_id, store_name = store_name), 0
+	
+	for _, event in write_ahead_log.read(after_seq = snapshot_seq):
+		store._replay_event(event)
+	
+	store.set_write_ahead_log(write_ahead_log)
+	return store
+
+
+async def recover_transfers(stores: Iterable[Store]):
+	#run once every store that transfers with one another is recovered, before they take new entries...
+	#a crash between a transfer's two appends leaves it in its source's log but not in its destination's,
+	#so every transfer the sources replayed is applied to its destination, unless that already received it
+	#returns the transfer_ids applied
+	stores_by_id = {store.store_id: store for store in stores}
+	for store in stores_by_id.values():
+		for transfer_event in store._replayed_transfers:
+			if transfer_event["to_store_id"] not in stores_by_id:
+				raise UnexistingStore(f"Transfer ({transfer_event['transfer_id']}) from Store with id ({store.store_id}) is to Store with id ({transfer_event['to_store_id']}), which was not recovered with it")
+	
+	applied_transfer_ids = []
+	for store in stores_by_id.values():
+		for transfer_event in store._take_replayed_transfers():
+			if await stores_by_id[transfer_event["to_store_id"]]._receive_replayed_transfer(transfer_event):
+				applied_transfer_ids.append(transfer_event["transfer_id"])
+	
+	return applied_transfer_ids
+
+
+async def checkpoint_store(store: Store, snapshot_path: str, write_ahead_log: WriteAheadLog):
+	#nothing awaits between reading last_seq and taking the state, so the snapshot matches that seq exactly
+	write_ahead_log.sync()
+	seq = write_ahead_log.last_seq
+	save_store_snapshot(store = store, path = snapshot_path, seq = seq)
+	write_ahead_log.truncate(up_to_seq = seq)
+	
+	return seq
+
+
+async def run_periodic_checkpoints(store: Store, snapshot_path: str, write_ahead_log: WriteAheadLog, interval_seconds: float = 300):
+	#meant to be run as a background task... cancel it to stop
+	last_checkpointed_seq = write_ahead_log.base_seq
+	while True:
+		await asyncio.sleep(interval_seconds)
+		if write_ahead_log.last_seq != last_checkpointed_seq:
+			last_checkpointed_seq = await checkpoint_store(store = store, snapshot_path = snapshot_path, write_ahead_log = write_ahead_log)
@@ -0,0 +1,41 @@
+import gc
+import os
+import pickle
+from aggregrate.store import Store
+from persistence.write_ahead_log import _fsync_directory
+from error import CorruptedLogError
+
+
+#only load snapshots this process (or another trusted one) wrote... they are pickles
+SNAPSHOT_FORMAT_VERSION = 11
+
+
+
+def save_store_snapshot(store: Store, path: str, seq: int):
+	#seq is the last write-ahead log event the snapshot includes... recovery replays the events after it
+	temp_path = f"{path}.tmp"
+	with open(temp_path, "wb") as file:
+		pickle.dump({"version": SNAPSHOT_FORMAT_VERSION, "seq": seq, "store": store.get_state()}, file, protocol = pickle.HIGHEST_PROTOCOL)
+		file.flush()
+		os.fsync(file.fileno())
+	
+	#the previous snapshot is only replaced once the new one is fully on disk
+	os.replace(temp_path, path)
+	_fsync_directory(path)
+
+
+def load_store_snapshot(path: str):
+	#loading allocates millions of long-lived objects... pausing the garbage collector avoids repeated full scans of them
+	gc_was_enabled = gc.isenabled()
+	gc.disable()
+	try:
+		with open(path, "rb") as file:
+			snapshot = pickle.load(file)
+		
+		if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_FORMAT_VERSION:
+			raise CorruptedLogError(f"({path}) is not a store snapshot this version can read")
+		
+		return Store.from_state(snapshot["store"]), snapshot["seq"]
+	finally:
+		if gc_was_enabled:
+			gc.enable()
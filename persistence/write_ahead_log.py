@@ -0,0 +1,221 @@
+import os
+import json
+import struct
+import zlib
+import threading
+from typing import Dict
+from error import CorruptedLogError
+
+
+#file layout:  MAGIC | base_seq (u64) | record | record | ...
+#record layout:  payload length (u32) | crc32 of payload (u32) | payload (json)
+#base_seq is the seq of the last event before this file, so seqs keep counting up after the log is truncated
+MAGIC = b"MNLSWAL2"
+_FILE_HEADER = struct.Struct("<8sQ")
+_RECORD_HEADER = struct.Struct("<II")
+
+
+
+class WriteAheadLog(object):
+	#append-only log of Store events... every append is flushed to the OS straight away, so a killed process loses nothing,
+	#and fsync-ed once every `sync_every` events, or `sync_interval` seconds after the first unsynced one (or on sync())...
+	#so a machine crash loses at most that much, a quiet store included
+	
+	def __init__(self, path: str, sync_every: int = 100, sync_interval: float = 0.1):
+		if sync_every < 1:
+			raise ValueError(f"sync_every must be at least 1... you entered '{sync_every}'")
+		
+		if sync_interval <= 0:
+			raise ValueError(f"sync_interval must be positive... you entered '{sync_interval}'")
+		
+		self.path = path
+		self.sync_every = sync_every
+		self.sync_interval = sync_interval
+		self._unsynced_count = 0
+		#fsyncs the appends a quiet store leaves unsynced... started by the first unsynced append
+		self._sync_timer: threading.Timer | None = None
+		#held by whatever fsyncs or swaps the file, as the timer does it from its own thread
+		self._sync_lock = threading.RLock()
+		
+		if not os.path.exists(path):
+			self._write_new_file(path = path, base_seq = 0, records = [])
+		
+		self.base_seq, self.last_seq, valid_end = self._scan()
+		
+		self._file = open(path, "r+b")
+		#a crash mid-append can leave a torn record at the end... it was never synced, so it is dropped
+		self._file.truncate(valid_end)
+		self._file.seek(valid_end)
+		#where the last record appended by this process starts, until it is undone (see undo_append)
+		self._last_record_start: int | None = None
+	
+	
+	@staticmethod
+	def _write_new_file(path: str, base_seq: int, records: list):
+		temp_path = f"{path}.tmp"
+		with open(temp_path, "wb") as file:
+			file.write(_FILE_HEADER.pack(MAGIC, base_seq))
+			for record in records:
+				file.write(record)
+			
+			file.flush()
+			os.fsync(file.fileno())
+		
+		os.replace(temp_path, path)
+		_fsync_directory(path)
+	
+	
+	def _iter_records(self):
+		#yields (seq, event, raw record bytes, offset of the end of the record)... stops at the first torn/corrupt record
+		with open(self.path, "rb") as file:
+			file_header = file.read(_FILE_HEADER.size)
+			if len(file_header) < _FILE_HEADER.size or file_header[:len(MAGIC)] != MAGIC:
+				raise CorruptedLogError(f"({self.path}) is not a write-ahead log")
+			
+			_, base_seq = _FILE_HEADER.unpack(file_header)
+			yield base_seq, None, None, file.tell()
+			
+			while True:
+				header = file.read(_RECORD_HEADER.size)
+				if len(header) < _RECORD_HEADER.size:
+					return
+				
+				length, checksum = _RECORD_HEADER.unpack(header)
+				payload = file.read(length)
+				if len(payload) < length or zlib.crc32(payload) != checksum:
+					return
+				
+				record = json.loads(payload)
+				yield record["seq"], record["event"], header + payload, file.tell()
+	
+	
+	def _scan(self):
+		records = self._iter_records()
+		base_seq, _, _, valid_end = next(records)
+		last_seq = base_seq
+		
+		for last_seq, _, _, valid_end in records:
+			pass
+		
+		return base_seq, last_seq, valid_end
+	
+	
+	def append(self, event: Dict):
+		seq = self.last_seq + 1
+		payload = json.dumps({"seq": seq, "event": event}, separators=(",", ":")).encode()
+		record_start = self._file.tell()
+		try:
+			self._file.write(_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+			self._file.write(payload)
+			self._file.flush()
+		except BaseException:
+			#a failed append leaves nothing behind... a torn record would hide every record appended after it
+			self._drop_from(record_start)
+			raise
+		
+		self.last_seq = seq
+		self._last_record_start = record_start
+		
+		with self._sync_lock:
+			self._unsynced_count = self._unsynced_count + 1
+			if self._unsynced_count >= self.sync_every:
+				self.sync()
+			elif self._sync_timer is None:
+				self._sync_timer = threading.Timer(self.sync_interval, self._sync_on_timer)
+				self._sync_timer.daemon = True
+				self._sync_timer.start()
+		
+		return seq
+	
+	
+	def undo_append(self, seq: int):
+		#drops the record just appended as seq, e.g. when what it logs could not be completed elsewhere...
+		#only the last record can be dropped, and only once
+		if seq != self.last_seq or self._last_record_start is None:
+			raise ValueError(f"Only the last appended event ({self.last_seq}) can be undone... you entered '{seq}'")
+		
+		self._drop_from(self._last_record_start)
+		self.last_seq = seq - 1
+		self._last_record_start = None
+	
+	
+	def _drop_from(self, offset: int):
+		with self._sync_lock:
+			self._file.seek(offset)
+			self._file.truncate()
+			self.sync()
+	
+	
+	def sync(self):
+		with self._sync_lock:
+			self._file.flush()
+			os.fsync(self._file.fileno())
+			self._unsynced_count = 0
+			self._cancel_sync_timer()
+	
+	
+	def _cancel_sync_timer(self):
+		if self._sync_timer is not None:
+			self._sync_timer.cancel()
+			self._sync_timer = None
+	
+	
+	def _sync_on_timer(self):
+		#appends are already flushed, so only the fsync is left... the python-side buffer isn't touched from this thread
+		with self._sync_lock:
+			self._sync_timer = None
+			if self._file.closed or not self._unsynced_count:
+				return
+			
+			os.fsync(self._file.fileno())
+			self._unsynced_count = 0
+	
+	
+	def read(self, after_seq: int = 0):
+		#yields (seq, event) of every logged event with seq > after_seq
+		self._file.flush()
+		records = self._iter_records()
+		next(records)
+		
+		for seq, event, _, _ in records:
+			if seq > after_seq:
+				yield seq, event
+	
+	
+	def truncate(self, up_to_seq: int):
+		#drops events with seq <= up_to_seq, once a snapshot holds them
+		with self._sync_lock:
+			self.sync()
+			records = self._iter_records()
+			next(records)
+			kept_records = [record for seq, _, record, _ in records if seq > up_to_seq]
+			
+			self._file.close()
+			self._write_new_file(path = self.path, base_seq = max(up_to_seq, self.base_seq), records = kept_records)
+			self.base_seq = max(up_to_seq, self.base_seq)
+			self._file = open(self.path, "r+b")
+			self._file.seek(0, os.SEEK_END)
+			self._last_record_start = None
+	
+	
+	def close(self):
+		with self._sync_lock:
+			if not self._file.closed:
+				self.sync()
+				self._file.close()
+
+
+
+def _fsync_directory(path: str):
+	#makes the rename itself durable... not possible on every platform, so failures are ignored
+	try:
+		directory_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+	except OSError:
+		return
+	
+	try:
+		os.fsync(directory_fd)
+	except OSError:
+		pass
+	finally:
+		os.close(directory_fd)
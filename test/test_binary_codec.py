@@ -0,0 +1,66 @@
+import pytest
+
+from datetime import date, datetime
+from persistence.binary_codec import (
+	encode_stock_movement, decode_stock_movement,
+	encode_stock_movements, decode_stock_movements,
+	encode_inventory_snapshot, decode_inventory_snapshot,
+	encode_received_entry, decode_received_entry
+)
+from value_object.stock_movement import StockMovement
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+
+
+sample_stock_movements = [
+	StockMovement(timestamp=datetime(2024, 1, 1, 8, 0, 0, 1), location="Balance as at 2024-01-01", received=None, issued=None, unit=None, bal=10, base_unit=Unit.KG),
+	StockMovement(timestamp=datetime(2024, 1, 2, 9, 30), location="RD Enterprises", received=2.451, issued=None, unit=Unit.BSKT, bal=12.451, base_unit=Unit.KG),
+	StockMovement(timestamp=datetime(2024, 1, 3), location="Kitchen (Ọ̀yọ́)", received=None, issued=0.5, unit=Unit.KG, bal=11.951, base_unit=Unit.KG),
+]
+
+
+def test_enum_values_are_stable_codes():
+	assert [unit.value for unit in Unit] == list(range(1, 11))
+	assert [change_type.value for change_type in ChangeType] == [1, 2, 3]
+
+
+def test_stock_movement_round_trip():
+	for stock_movement in sample_stock_movements:
+		assert decode_stock_movement(encode_stock_movement(stock_movement)) == stock_movement
+	
+	assert decode_stock_movements(encode_stock_movements(sample_stock_movements)) == sample_stock_movements
+	assert decode_stock_movements(encode_stock_movements([])) == []
+
+
+def test_inventory_snapshot_round_trip():
+	inventory_snapshot = {
+		"test_rice": {"unit": Unit.KG, "qty": 122.5},
+		"test_coconut_milk": {"unit": Unit.TIN, "qty": 72},
+	}
+	
+	assert decode_inventory_snapshot(encode_inventory_snapshot(inventory_snapshot)) == inventory_snapshot
+
+
+def test_received_entry_round_trip():
+	received_entry = {
+		"received_entry_id": "test_receive",
+		"created_at": str(datetime(2024, 1, 1)),
+		"received_at": str(datetime(2024, 1, 1)),
+		"received_from": "RD Enterprises",
+		"received_by": "Prince Adigwe",
+		"purpose": None,
+		"store_id": "test_store",
+		"received_products": [
+			{"sku": "test_rice", "qty": 2.0, "unit": Unit.BSKT},
+			{"sku": "test_coconut_milk", "qty": 3.0, "unit": Unit.CTN},
+			{"sku": "test_rice", "qty": 1.0, "unit": Unit.BAG, "lot_id": "L1", "expiry_date": date(2025, 2, 1), "unit_cost": 20_000.0},
+			{"sku": "test_rice", "qty": 1.0, "unit": Unit.BAG, "lot_id": "L2", "expiry_date": None, "unit_cost": None},
+		]
+	}
+	
+	assert decode_received_entry(encode_received_entry(received_entry)) == received_entry
+
+
+def test_trailing_bytes_are_rejected():
+	with pytest.raises(ValueError):
+		decode_stock_movement(encode_stock_movement(sample_stock_movements[0]) + b"\0")
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+import pytest_asyncio
+
+from aggregrate.store import create_store
+from aggregrate.goods_received import GoodsReceived
+from value_object.unit import Unit
+from error import UnsupportedUnitError, ReceivedEntryAlreadyDone, UnexistingReceivedNode
+
+
+kg_to_bag = 50
+tins_to_ctn = 24
+
+product1_sku = "test_rice"
+product2_sku = "test_coconut_milk"
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku=product1_sku, product_name="Rice (test)", base_unit=Unit.KG)
+	store.add_supported_unit(sku=product1_sku, unit=Unit.BAG, conversion_factor = kg_to_bag)
+
+	await store.create_product_inventory(sku=product2_sku, product_name="Coconut Milk (test)", base_unit=Unit.TIN)
+	store.add_supported_unit(sku=product2_sku, unit=Unit.CTN, conversion_factor = tins_to_ctn)
+
+	return store
+
+
+@pytest.mark.asyncio
+async def test_received_tree_is_flattened_into_store(sample_store):
+	goods_received = GoodsReceived()
+	received_entry = goods_received.create_received_entry(store=sample_store, received_from="RD Enterprises", purpose="Weekly restock")
+	received_node_list = received_entry.get_received_node_list()
+	
+	received_node_list.receive(sku=product1_sku, qty=1, unit=Unit.BAG)
+	drinks = received_node_list.create_received_item_group(group_name="Drinks")
+	coconut_milk = drinks.get_received_node_list().receive(sku=product2_sku, qty=1, unit=Unit.CTN)
+	canned = drinks.get_received_node_list().create_received_item_group(group_name="Canned")
+	canned.get_received_node_list().receive(sku=product2_sku, qty=6, unit=Unit.TIN)
+	wrong_item = received_node_list.receive(sku=product1_sku, qty=100, unit=Unit.BAG)
+	
+	#edits and deletes are cheap, and are not validated until mark_done_receiving
+	drinks.get_received_node_list().update_received_item(coconut_milk.node_id, qty=2)
+	received_node_list.delete(wrong_item.node_id)
+	
+	assert [(item["sku"], item["qty"]) for item in received_entry.to_received_entry_dict()["received_products"]] == [
+		(product1_sku, 1),
+		(product2_sku, 2),
+		(product2_sku, 6),
+	]
+	
+	await received_entry.mark_done_receiving()
+	assert received_entry.is_done
+	assert goods_received.get_open_received_entries() == []
+	
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == 50
+	assert await sample_store.get_stock_level(sku=product2_sku, unit=Unit.TIN) == 54
+	
+	with pytest.raises(ReceivedEntryAlreadyDone):
+		received_node_list.receive(sku=product1_sku, qty=1, unit=Unit.BAG)
+	with pytest.raises(ReceivedEntryAlreadyDone):
+		canned.get_received_node_list().delete(canned.get_received_node_list().get_received_items()[0].node_id)
+	with pytest.raises(ReceivedEntryAlreadyDone):
+		await received_entry.mark_done_receiving()
+
+
+@pytest.mark.asyncio
+async def test_invalid_items_are_found_at_mark_done_receiving(sample_store):
+	received_entry = GoodsReceived().create_received_entry(store=sample_store, received_from="RD Enterprises")
+	received_node_list = received_entry.get_received_node_list()
+	received_node_list.receive(sku=product1_sku, qty=1, unit=Unit.BAG)
+	group = received_node_list.create_received_item_group(group_name="Drinks")
+	wrong_item = group.get_received_node_list().receive(sku=product2_sku, qty=1, unit=Unit.BAG)
+	
+	with pytest.raises(UnsupportedUnitError):
+		await received_entry.mark_done_receiving()
+	
+	#nothing went into the store, and the entry is still open to be fixed
+	assert not received_entry.is_done
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == 0
+	
+	group.get_received_node_list().update_received_item(wrong_item.node_id, unit=Unit.CTN)
+	await received_entry.mark_done_receiving()
+	assert await sample_store.get_stock_level(sku=product2_sku, unit=Unit.TIN) == 24
+
+
+@pytest.mark.asyncio
+async def test_items_cannot_change_while_the_store_receives_them(sample_store):
+	received_entry = GoodsReceived().create_received_entry(store=sample_store, received_from="RD Enterprises")
+	received_node_list = received_entry.get_received_node_list()
+	received_node_list.receive(sku=product1_sku, qty=1, unit=Unit.BAG)
+	
+	#the store is busy with the sku, so mark_done_receiving waits on it with the items already sent
+	async with sample_store._lock_skus([product1_sku]):
+		mark_done_receiving = asyncio.create_task(received_entry.mark_done_receiving())
+		await asyncio.sleep(0.01)
+		assert not mark_done_receiving.done()
+		
+		with pytest.raises(ReceivedEntryAlreadyDone):
+			received_node_list.receive(sku=product1_sku, qty=5, unit=Unit.BAG)
+		with pytest.raises(ReceivedEntryAlreadyDone):
+			await received_entry.mark_done_receiving()
+	
+	await mark_done_receiving
+	assert received_entry.is_done
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == 50
+
+
+def test_only_direct_children_can_be_changed():
+	received_entry = GoodsReceived().create_received_entry(store=None, received_from="RD Enterprises")
+	received_node_list = received_entry.get_received_node_list()
+	group = received_node_list.create_received_item_group(group_name="Drinks")
+	item_in_group = group.get_received_node_list().receive(sku=product2_sku, qty=1, unit=Unit.CTN)
+	
+	with pytest.raises(UnexistingReceivedNode):
+		received_node_list.update_received_item(item_in_group.node_id, qty=3)
+	with pytest.raises(UnexistingReceivedNode):
+		received_node_list.delete(item_in_group.node_id)
+	
+	#groups are not items
+	with pytest.raises(UnexistingReceivedNode):
+		received_node_list.update_received_item(group.node_id, qty=3)
+	
+	received_node_list.delete(group.node_id)
+	assert len(received_node_list) == 0
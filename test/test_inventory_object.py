@@ -4,7 +4,7 @@ import pytest_asyncio
 from entity.product_inventory import create_product_inventory
 from value_object.unit import Unit
 from value_object.qty_change_type import ChangeType
-from error import UnsupportedUnitError, UnsupportedChangeTypeError, InvalidQtyError
+from error import UnsupportedUnitError, UnsupportedChangeTypeError, InvalidQtyError, AlreadySupportedUnitError
 
 
 kg_to_bskt = 3.6
@@ -101,3 +101,43 @@ async def test_qty_limits(sample_product_inventory):
 
 	with pytest.raises(InvalidQtyError):
 		sample_product_inventory.change_qty(qty=-50, unit=Unit.BAG, change_type = ChangeType.ISSUE)
+
+
+@pytest.mark.asyncio
+async def test_adding_same_unit_twice_causes_error(sample_product_inventory):
+	with pytest.raises(AlreadySupportedUnitError):
+		sample_product_inventory.add_supported_unit(unit=Unit.BAG, conversion_factor = kg_to_bag)
+	
+	#base unit is supported from creation
+	with pytest.raises(AlreadySupportedUnitError):
+		sample_product_inventory.add_supported_unit(unit=Unit.KG, conversion_factor = 1)
+	
+	assert sample_product_inventory.supports_unit(Unit.BSKT)
+	assert not sample_product_inventory.supports_unit(Unit.CTN)
+
+
+@pytest.mark.asyncio
+async def test_fixed_point_qty_does_not_drift():
+	product_inventory = await create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, qty=1, qty_scale=1000)
+	product_inventory.add_supported_unit(unit=Unit.BSKT, conversion_factor = 2.451)
+	
+	qtys = [0.1, 0.3, 1.7, 2.2, 0.05]
+	for _ in range(1000):
+		for qty in qtys:
+			product_inventory.change_qty(qty=qty, change_type=ChangeType.RECEIVE, unit=Unit.BSKT)
+		for qty in reversed(qtys):
+			product_inventory.change_qty(qty=qty, change_type=ChangeType.ISSUE, unit=Unit.BSKT)
+	
+	assert product_inventory.get_qty() == 1
+	
+	#qtys finer than the scale are rounded to it
+	assert product_inventory.to_base_unit(qty=0.0004) == 0
+	assert product_inventory.to_base_unit(qty=1, unit=Unit.BSKT) == 2.451
+	assert product_inventory.get_qty_after_change(qty_in_base_unit=0.1, change_type=ChangeType.RECEIVE, current_qty=0.2) == 0.3
+
+
+@pytest.mark.asyncio
+async def test_invalid_qty_scale():
+	for qty_scale in [0, -10, 2.5]:
+		with pytest.raises(ValueError):
+			await create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, qty_scale=qty_scale)
@@ -0,0 +1,125 @@
+import pytest
+
+from datetime import datetime, timedelta
+from entity.product_stock_movement import ProductStockMovement
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+from error import CompactedHistoryError
+
+
+opened_at = datetime(2024, 1, 1)
+movement_count = 50
+
+
+@pytest.fixture
+def sample_product_stock_movement():
+	product_stock_movement = ProductStockMovement(sku="test_rice", opening_bal=0, base_unit=Unit.KG, timestamp=opened_at)
+	
+	#one receipt of 1kg per day, from the day after opening
+	for day in range(1, movement_count + 1):
+		product_stock_movement.record(location="RD Enterprises", qty=1, change_type=ChangeType.RECEIVE, unit=Unit.KG, bal=day, base_unit=Unit.KG, timestamp=opened_at + timedelta(days=day))
+	
+	return product_stock_movement
+
+
+def test_paging_through_snapshot(sample_product_stock_movement):
+	assert sample_product_stock_movement.count() == movement_count + 1
+	
+	first_page = sample_product_stock_movement.get_snapshot(limit=10)
+	assert len(first_page) == 10
+	assert first_page[0]["location"].startswith("Balance as at")
+	
+	last_page = sample_product_stock_movement.get_snapshot(offset=movement_count - 3, limit=10)
+	assert [movement["bal"] for movement in last_page] == [47, 48, 49, 50]
+	
+	assert sample_product_stock_movement.get_snapshot(offset=movement_count + 10) == []
+	
+	with pytest.raises(ValueError):
+		sample_product_stock_movement.get_snapshot(offset=-1)
+
+
+def test_time_range_snapshot(sample_product_stock_movement):
+	since = opened_at + timedelta(days=10)
+	until = opened_at + timedelta(days=20)
+	
+	snapshot = sample_product_stock_movement.get_snapshot(since=since, until=until)
+	assert [movement["bal"] for movement in snapshot] == list(range(10, 20))
+	assert sample_product_stock_movement.count(since=since, until=until) == 10
+	
+	#offset/limit apply within the time range
+	snapshot = sample_product_stock_movement.get_snapshot(since=since, until=until, offset=5, limit=2)
+	assert [movement["bal"] for movement in snapshot] == [15, 16]
+	
+	#between two rows
+	assert sample_product_stock_movement.get_snapshot(since=since + timedelta(hours=1), until=since + timedelta(hours=2)) == []
+	assert sample_product_stock_movement.get_snapshot(since=until, until=since) == []
+
+
+def test_out_of_order_timestamp_is_kept_in_order(sample_product_stock_movement):
+	sample_product_stock_movement.record(location="Kitchen", qty=1, change_type=ChangeType.ISSUE, unit=Unit.KG, bal=49, base_unit=Unit.KG, timestamp=opened_at)
+	assert sample_product_stock_movement[-1].timestamp == sample_product_stock_movement[-2].timestamp
+
+
+@pytest.mark.asyncio
+async def test_streaming_snapshot(sample_product_stock_movement):
+	streamed = [movement async for movement in sample_product_stock_movement.stream_snapshot(offset=1, batch_size=7)]
+	assert streamed == sample_product_stock_movement.get_snapshot(offset=1)
+	
+	streamed = [movement async for movement in sample_product_stock_movement.stream_snapshot(since=opened_at + timedelta(days=45))]
+	assert [movement["bal"] for movement in streamed] == [45, 46, 47, 48, 49, 50]
+
+
+def test_bal_as_at(sample_product_stock_movement):
+	assert sample_product_stock_movement.get_bal_as_at(opened_at - timedelta(seconds=1)) is None
+	assert sample_product_stock_movement.get_bal_as_at(opened_at) == 0
+	assert sample_product_stock_movement.get_bal_as_at(opened_at + timedelta(days=10)) == 10
+	assert sample_product_stock_movement.get_bal_as_at(opened_at + timedelta(days=10, hours=23)) == 10
+	assert sample_product_stock_movement.get_bal_as_at(opened_at + timedelta(days=1000)) == movement_count
+
+
+def test_compaction_without_archive(sample_product_stock_movement):
+	cutoff = opened_at + timedelta(days=30, hours=12)
+	bal_after_cutoff = sample_product_stock_movement.get_snapshot(since=cutoff)
+	
+	assert sample_product_stock_movement.compact(cutoff=cutoff) == 31
+	assert sample_product_stock_movement.count() == movement_count + 1 - 30
+	
+	balance_row = sample_product_stock_movement[0]
+	assert balance_row.location == f"Balance as at {(opened_at + timedelta(days=30)).date()}"
+	assert balance_row.bal == 30
+	assert balance_row.timestamp == opened_at + timedelta(days=30)
+	assert balance_row.received is None and balance_row.unit is None
+	assert sample_product_stock_movement.get_snapshot(since=cutoff) == bal_after_cutoff
+	assert sample_product_stock_movement.get_bal_as_at(opened_at + timedelta(days=40)) == 40
+	
+	#nothing left to roll up before the cutoff
+	assert sample_product_stock_movement.compact(cutoff=cutoff) == 0
+	assert list(sample_product_stock_movement.get_archived_movements()) == []
+	
+	#the rows before the balance row are gone, so their bals can't be told
+	with pytest.raises(CompactedHistoryError):
+		sample_product_stock_movement.get_bal_as_at(opened_at + timedelta(days=5))
+
+
+def test_compaction_with_archive(sample_product_stock_movement, tmp_path):
+	rows_before = sample_product_stock_movement[:]
+	
+	assert sample_product_stock_movement.compact(cutoff=opened_at + timedelta(days=10, hours=1), archive_dir=str(tmp_path)) == 11
+	assert sample_product_stock_movement.compact(cutoff=opened_at + timedelta(days=20, hours=1), archive_dir=str(tmp_path)) == 11
+	
+	archive_segments = sample_product_stock_movement.get_archive_segments()
+	assert [archive_segment["row_count"] for archive_segment in archive_segments] == [11, 11]
+	
+	#the second segment starts with the balance row the first compaction left
+	archived_movements = list(sample_product_stock_movement.get_archived_movements())
+	assert archived_movements[:11] == rows_before[:11]
+	assert archived_movements[11].bal == 10
+	assert archived_movements[12:] == rows_before[11:21]
+	assert sample_product_stock_movement[1:] == rows_before[21:]
+	
+	#bals from before the head are read back from the archive
+	assert sample_product_stock_movement.get_bal_as_at(opened_at - timedelta(seconds=1)) is None
+	assert sample_product_stock_movement.get_bal_as_at(opened_at) == 0
+	assert sample_product_stock_movement.get_bal_as_at(opened_at + timedelta(days=5, hours=1)) == 5
+	assert sample_product_stock_movement.get_bal_as_at(opened_at + timedelta(days=15)) == 15
+	assert sample_product_stock_movement.get_bal_as_at(opened_at + timedelta(days=25)) == 25
@@ -171,3 +171,92 @@ async def test_receiving_works_wthout_specifying_store_id(sample_store):
 	expected_qty_in_bags_product1 = expected_base_unit_qty_product1 / kg_to_bag
 	actual_qty_in_bags_product1 = await sample_store.get_stock_level(sku=product1_sku, unit=Unit.BAG)
 	assert actual_qty_in_bags_product1 == pytest.approx(expected_qty_in_bags_product1)
+
+
+@pytest.mark.asyncio
+async def test_stock_levels_of_many_skus_in_one_unit(sample_store):
+	await sample_store.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG, opening_bal=100)
+	sample_store.add_supported_unit(sku="test_beans", unit=Unit.BAG, conversion_factor = kg_to_bag)
+	
+	await sample_store.receive({
+		"received_entry_id": "test_receive",
+	    "received_from": "RD Enterprises",
+	    "received_products": [
+			{
+				"sku": product1_sku,
+				"qty": 3,
+				"unit": Unit.BAG
+			}
+		]
+	})
+	
+	stock_levels = await sample_store.get_stock_levels(skus=[product1_sku, "test_beans"], unit=Unit.BAG)
+	assert stock_levels[product1_sku] == pytest.approx(3)
+	assert stock_levels["test_beans"] == pytest.approx(2)
+	
+	with pytest.raises(UnsupportedUnitError):
+		await sample_store.get_stock_levels(skus=[product1_sku, product2_sku], unit=Unit.BAG)
+
+
+@pytest.mark.asyncio
+async def test_failed_receive_leaves_store_untouched(sample_store):
+	inventory_snapshot_before = await sample_store.get_inventory_snapshot()
+	
+	with pytest.raises(UnsupportedUnitError):
+		await sample_store.receive({
+			"received_entry_id": "test_receive",
+		    "received_from": "RD Enterprises",
+		    "received_products": [
+				{
+					"sku": product1_sku,
+					"qty": 2,
+					"unit": Unit.BAG
+				},
+				{
+					"sku": product2_sku,
+					"qty": 5,
+					"unit": Unit.CTN
+				},
+				{
+					"sku": product2_sku,
+					"qty": 1,
+					"unit": Unit.BAG #invalid unit for product2, comes after valid lines
+				}
+			]
+		})
+	
+	assert await sample_store.get_inventory_snapshot() == inventory_snapshot_before
+	assert len(await sample_store.get_product_stock_movement_snapshot(sku=product1_sku)) == 1
+	assert len(await sample_store.get_product_stock_movement_snapshot(sku=product2_sku)) == 1
+
+
+@pytest.mark.asyncio
+async def test_many_lines_of_same_sku_are_each_recorded(sample_store):
+	await sample_store.receive({
+		"received_entry_id": "test_receive",
+	    "received_from": "RD Enterprises",
+	    "received_products": [
+			{
+				"sku": product1_sku,
+				"qty": 2,
+				"unit": Unit.BAG
+			},
+			{
+				"sku": product2_sku,
+				"qty": 1,
+				"unit": Unit.CTN
+			},
+			{
+				"sku": product1_sku,
+				"qty": 4,
+				"unit": Unit.KG
+			}
+		]
+	})
+	
+	stock_movement_snapshot = await sample_store.get_product_stock_movement_snapshot(sku=product1_sku)
+	assert [movement["received"] for movement in stock_movement_snapshot[1:]] == [2, 4]
+	assert [movement["unit"] for movement in stock_movement_snapshot[1:]] == [Unit.BAG, Unit.KG]
+	assert stock_movement_snapshot[1]["bal"] == pytest.approx(2 * kg_to_bag)
+	assert stock_movement_snapshot[2]["bal"] == pytest.approx(2 * kg_to_bag + 4)
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == stock_movement_snapshot[2]["bal"]
@@ -0,0 +1,68 @@
+import pytest
+
+from datetime import datetime
+from entity.stock_movement_ledger import StockMovementLedger
+from value_object.stock_movement import StockMovement
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+
+
+@pytest.fixture
+def sample_ledger():
+	ledger = StockMovementLedger()
+	ledger.append(timestamp=datetime(2024, 1, 1, 8, 0, 0, 1), location="Balance as at 2024-01-01", change_type=None, qty=0, unit=None, bal=10, base_unit=Unit.KG)
+	ledger.append(timestamp=datetime(2024, 1, 2, 9, 30), location="RD Enterprises", change_type=ChangeType.RECEIVE, qty=2, unit=Unit.BAG, bal=110, base_unit=Unit.KG)
+	ledger.append(timestamp=datetime(2024, 1, 3, 12, 15, 0, 999999), location="Kitchen", change_type=ChangeType.ISSUE, qty=4.5, unit=Unit.KG, bal=105.5, base_unit=Unit.KG)
+	ledger.append(timestamp=datetime(2024, 1, 4), location="RD Enterprises", change_type=ChangeType.ADJUST, qty=100, unit=Unit.KG, bal=100, base_unit=Unit.KG)
+
+	return ledger
+
+
+def test_rows_are_rebuilt_as_stock_movements(sample_ledger):
+	assert len(sample_ledger) == 4
+	assert sample_ledger[0] == StockMovement(timestamp=datetime(2024, 1, 1, 8, 0, 0, 1), location="Balance as at 2024-01-01", received=None, issued=None, unit=None, bal=10, base_unit=Unit.KG)
+	assert sample_ledger[1] == StockMovement(timestamp=datetime(2024, 1, 2, 9, 30), location="RD Enterprises", received=2, issued=None, unit=Unit.BAG, bal=110, base_unit=Unit.KG)
+	assert sample_ledger[2] == StockMovement(timestamp=datetime(2024, 1, 3, 12, 15, 0, 999999), location="Kitchen", received=None, issued=4.5, unit=Unit.KG, bal=105.5, base_unit=Unit.KG)
+	
+	#adjustments are neither received nor issued
+	assert sample_ledger[3].received is None
+	assert sample_ledger[3].issued is None
+	assert sample_ledger[3].bal == 100
+
+
+def test_indexing_slicing_and_iteration(sample_ledger):
+	assert sample_ledger[-1] == sample_ledger[3]
+	assert sample_ledger[1:3] == [sample_ledger[1], sample_ledger[2]]
+	assert list(sample_ledger) == sample_ledger[:]
+	
+	with pytest.raises(IndexError):
+		sample_ledger[4]
+	
+	with pytest.raises(IndexError):
+		sample_ledger[-5]
+
+
+def test_locations_are_interned(sample_ledger):
+	assert sample_ledger[1].location is sample_ledger[3].location
+	assert len(sample_ledger._locations) == 3
+
+
+def test_scaled_ledger_keeps_qtys_exactly():
+	ledger = StockMovementLedger(qty_scale=1000)
+	ledger.append(timestamp=datetime(2024, 1, 1), location="Balance as at 2024-01-01", change_type=None, qty=0, unit=None, bal=0.3, base_unit=Unit.KG)
+	ledger.append(timestamp=datetime(2024, 1, 2), location="RD Enterprises", change_type=ChangeType.RECEIVE, qty=0.1, unit=Unit.KG, bal=0.4, base_unit=Unit.KG)
+	
+	assert ledger._bals.typecode == "q"
+	assert list(ledger._bals) == [300, 400]
+	assert ledger[1].received == 0.1
+	assert ledger[1].bal == 0.4
+	assert ledger.get_bal_as_at(datetime(2024, 1, 1, 12)) == 0.3
+	
+	#qtys are in the row's own unit, which the scale doesn't apply to
+	ledger.append(timestamp=datetime(2024, 1, 3), location="RD Enterprises", change_type=ChangeType.RECEIVE, qty=0.0001, unit=Unit.BAG, bal=0.405, base_unit=Unit.KG)
+	assert ledger[2].received == 0.0001
+	assert ledger[2].bal == 0.405
+	
+	restored_ledger = StockMovementLedger.from_state(ledger.get_state())
+	assert list(restored_ledger) == list(ledger)
+	assert list(restored_ledger._bals) == [300, 400, 405]
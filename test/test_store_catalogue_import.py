@@ -0,0 +1,95 @@
+import io
+import gc
+import pytest
+
+from aggregrate.store import create_store
+from aggregrate.catalogue_import import read_catalogue_csv, read_catalogue_jsonl
+from persistence.write_ahead_log import WriteAheadLog
+from persistence.store_recovery import recover_store
+from value_object.unit import Unit
+from error import AlreadyExistingProduct, UnsupportedUnitError, InvalidQtyError, AlreadySupportedUnitError
+
+
+CATALOGUE_CSV = """sku,product_name,base_unit,opening_bal,units
+test_rice,Rice (test),KG,100,BAG:50;BSKT:2.451
+test_yam,Yam (test),tuber,12,
+test_beans,Beans (test),LITRE,5,
+test_rice,Rice again (test),KG,1,
+test_garri,Garri (test),KG,-3,
+test_oil,Oil (test),BTL,24,CTN:12;CTN:6
+test_milk,Milk (test),TIN,48,CTN:24
+"""
+
+CATALOGUE_JSONL = """{"sku": "test_rice", "product_name": "Rice (test)", "base_unit": "KG", "opening_bal": 100, "units": {"BAG": 50}}
+not json
+
+{"sku": "test_yam", "product_name": "Yam (test)", "base_unit": 8, "opening_bal": 12, "units": [["BSKT", 4]], "qty_scale": 1000}
+{"product_name": "No sku (test)", "base_unit": "KG"}
+[1, 2]
+42
+"""
+
+
+@pytest.mark.asyncio
+async def test_csv_rows_are_imported_and_bad_rows_reported():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	result = await store.import_product_inventories(read_catalogue_csv(io.StringIO(CATALOGUE_CSV)), batch_size=2)
+	
+	assert result["imported_count"] == 3
+	assert [(failure["index"], failure["sku"], type(failure["error"])) for failure in result["failures"]] == [
+		(2, "test_beans", UnsupportedUnitError),
+		(3, "test_rice", AlreadyExistingProduct),
+		(4, "test_garri", InvalidQtyError),
+		(5, "test_oil", AlreadySupportedUnitError)
+	]
+	
+	assert list((await store.get_inventory_snapshot()).keys()) == ["test_rice", "test_yam", "test_milk"]
+	assert await store.get_stock_level(sku="test_rice", unit=Unit.BAG) == 2
+	assert await store.get_stock_level(sku="test_yam", unit=Unit.TUBER) == 12
+	assert await store.get_stock_level(sku="test_milk", unit=Unit.CTN) == 2
+	
+	#each product's ledger opens with its opening balance
+	stock_movements = await store.get_product_stock_movement_snapshot(sku="test_rice")
+	assert len(stock_movements) == 1
+	assert stock_movements[0]["bal"] == 100
+
+
+@pytest.mark.asyncio
+async def test_jsonl_rows_are_imported_and_bad_lines_reported():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku="test_garri", product_name="Garri (test)", base_unit=Unit.KG)
+	result = await store.import_product_inventories(read_catalogue_jsonl(io.StringIO(CATALOGUE_JSONL)))
+	
+	assert result["imported_count"] == 2
+	assert [(failure["index"], failure["sku"]) for failure in result["failures"]] == [(1, None), (3, None), (4, None), (5, None)]
+	assert await store.get_stock_level(sku="test_yam", unit=Unit.BSKT) == 3
+	assert store._get_product_inventory_by_sku("test_yam").qty_scale == 1000
+
+
+@pytest.mark.asyncio
+async def test_import_is_recovered_from_write_ahead_log(tmp_path):
+	snapshot_path = str(tmp_path / "store.snapshot")
+	write_ahead_log = WriteAheadLog(path=str(tmp_path / "store.wal"))
+	store = await recover_store(store_id="test_store", store_name="Store (test)", snapshot_path=snapshot_path, write_ahead_log=write_ahead_log)
+	await store.import_product_inventories(read_catalogue_csv(io.StringIO(CATALOGUE_CSV)))
+	write_ahead_log.close()
+	
+	recovered_store = await recover_store(store_id="test_store", store_name="Store (test)", snapshot_path=snapshot_path, write_ahead_log=WriteAheadLog(path=str(tmp_path / "store.wal")))
+	assert await recovered_store.get_inventory_snapshot() == await store.get_inventory_snapshot()
+	assert await recovered_store.get_stock_level(sku="test_rice", unit=Unit.BSKT) == pytest.approx(100 / 2.451)
+
+
+@pytest.mark.asyncio
+async def test_garbage_collector_is_only_paused_while_a_batch_goes_in():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	gc_states = []
+	
+	def rows():
+		for i in range(4):
+			gc_states.append(gc.isenabled())
+			yield {"sku": f"test_product_{i}", "product_name": f"Product {i} (test)", "base_unit": "KG", "opening_bal": i}
+	
+	result = await store.import_product_inventories(rows(), batch_size=2)
+	assert result["imported_count"] == 4
+	assert gc_states == [True] * 4
+	assert gc.isenabled()
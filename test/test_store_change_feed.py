@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+import pytest_asyncio
+
+from uuid import uuid4
+from aggregrate.store import create_store
+from aggregrate.change_feed import ChangeFeed
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+from error import ChangeFeedGapError
+
+
+def receipt(qty: float, sku: str = "test_rice", unit: Unit = Unit.KG):
+	return {
+		"received_entry_id": str(uuid4()),
+		"received_from": "RD Enterprises",
+		"received_products": [{"sku": sku, "qty": qty, "unit": unit}]
+	}
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, opening_bal=10)
+	store.add_supported_unit(sku="test_rice", unit=Unit.BAG, conversion_factor=50)
+	
+	return store
+
+
+async def take(subscription, count: int):
+	events = []
+	async for event in subscription:
+		events.append(event)
+		if len(events) == count:
+			break
+	
+	return events
+
+
+@pytest.mark.asyncio
+async def test_every_line_is_published_with_its_balance(sample_store):
+	async with sample_store.subscribe_changes(after_seq=0) as subscription:
+		await sample_store.receive({"received_entry_id": str(uuid4()), "received_from": "RD Enterprises", "received_products": [
+			{"sku": "test_rice", "qty": 2, "unit": Unit.BAG},
+			{"sku": "test_rice", "qty": 5, "unit": Unit.KG}
+		]})
+		await sample_store.apply_movements([{"change_type": ChangeType.ISSUE, "sku": "test_rice", "qty": 15, "unit": Unit.KG, "location": "Kitchen"}])
+		
+		events = await take(subscription, 4)
+	
+	assert [event["seq"] for event in events] == [1, 2, 3, 4]
+	assert [(event["type"], event["qty"], event["unit"], event["bal"]) for event in events] == [
+		("create_product_inventory", 10, Unit.KG, 10),
+		("receive", 2, Unit.BAG, 110),
+		("receive", 5, Unit.KG, 115),
+		("issue", 15, Unit.KG, 100)
+	]
+	assert events[1]["location"] == "RD Enterprises"
+	assert sample_store.get_change_seq() == 4
+
+
+@pytest.mark.asyncio
+async def test_subscriber_resumes_after_last_seen_seq(sample_store):
+	for qty in [1, 2, 3]:
+		await sample_store.receive(receipt(qty))
+	
+	async with sample_store.subscribe_changes(after_seq=2) as subscription:
+		events = await take(subscription, 2)
+	assert [(event["seq"], event["qty"]) for event in events] == [(3, 2), (4, 3)]
+	
+	#None only follows the changes from now on
+	async with sample_store.subscribe_changes() as subscription:
+		await sample_store.receive(receipt(4))
+		events = await take(subscription, 1)
+	assert [(event["seq"], event["qty"]) for event in events] == [(5, 4)]
+	
+	with pytest.raises(ChangeFeedGapError):
+		sample_store.subscribe_changes(after_seq=6)
+
+
+@pytest.mark.asyncio
+async def test_evicted_events_cause_a_gap():
+	change_feed = ChangeFeed(capacity=3)
+	for i in range(5):
+		change_feed.publish({"i": i})
+	
+	with pytest.raises(ChangeFeedGapError):
+		change_feed.subscribe(after_seq=1)
+	
+	subscription = change_feed.subscribe(after_seq=2)
+	assert [event["i"] for event in await take(subscription, 3)] == [2, 3, 4]
+	subscription.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_holds_back_producers(sample_store):
+	sample_store._change_feed.capacity = 2
+	subscription = sample_store.subscribe_changes()
+	
+	await sample_store.receive(receipt(1))
+	await sample_store.receive(receipt(1))
+	
+	#the subscriber is 2 events behind, so the next receive waits for it
+	third_receive = asyncio.create_task(sample_store.receive(receipt(1)))
+	await asyncio.sleep(0.01)
+	assert not third_receive.done()
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 12
+	
+	await take(subscription, 1)
+	await asyncio.wait_for(third_receive, timeout=1)
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 13
+	
+	#nothing is held back once the subscriber is closed, and events it no longer needs are dropped
+	subscription.close()
+	for _ in range(5):
+		await sample_store.receive(receipt(1))
+	assert len(sample_store._change_feed._events) == 2
+
+
+@pytest.mark.asyncio
+async def test_stalled_subscriber_is_evicted(sample_store):
+	sample_store._change_feed.capacity = 2
+	sample_store._change_feed.stall_timeout = 0.05
+	stalled_subscription = sample_store.subscribe_changes()
+	subscription = sample_store.subscribe_changes()
+	
+	await sample_store.receive(receipt(1))
+	await sample_store.receive(receipt(1))
+	assert len(await take(subscription, 2)) == 2
+	
+	#the stalled subscriber holds the next receive up for stall_timeout only
+	await asyncio.wait_for(sample_store.receive(receipt(1)), timeout=1)
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 13
+	assert stalled_subscription.is_evicted
+	assert [event["bal"] for event in await take(subscription, 1)] == [13]
+	
+	with pytest.raises(ChangeFeedGapError):
+		await take(stalled_subscription, 1)
+	subscription.close()
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+import pytest_asyncio
+
+from uuid import uuid4
+from aggregrate.store import create_store
+from value_object.unit import Unit
+
+
+product1_sku = "test_rice"
+product2_sku = "test_beans"
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku=product1_sku, product_name="Rice (test)", base_unit=Unit.KG)
+	await store.create_product_inventory(sku=product2_sku, product_name="Beans (test)", base_unit=Unit.KG)
+
+	return store
+
+
+def receipt(*skus: str):
+	return {
+		"received_entry_id": str(uuid4()),
+	    "received_from": "RD Enterprises",
+	    "received_products": [{"sku": sku, "qty": 1, "unit": Unit.KG} for sku in skus]
+	}
+
+
+@pytest.mark.asyncio
+async def test_receive_waits_for_lock_of_its_sku_only(sample_store):
+	async with sample_store._lock_skus([product1_sku]):
+		blocked_receive = asyncio.create_task(sample_store.receive(receipt(product1_sku, product1_sku)))
+		await asyncio.wait_for(sample_store.receive(receipt(product2_sku)), timeout=1)
+		await asyncio.sleep(0.01)
+		
+		#the receipt for the other sku went through, the one touching the locked sku is still waiting... with nothing applied
+		assert not blocked_receive.done()
+		assert await sample_store.get_stock_level(sku=product2_sku, unit=Unit.KG) == 1
+		assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == 0
+	
+	await asyncio.wait_for(blocked_receive, timeout=1)
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == 2
+	assert await sample_store.get_stock_level(sku=product2_sku, unit=Unit.KG) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_receipts_record_their_own_balances(sample_store):
+	await asyncio.gather(*[
+		sample_store.receive(receipt(product1_sku, product2_sku) if i % 2 else receipt(product2_sku, product1_sku))
+		for i in range(50)
+	])
+	
+	for sku in [product1_sku, product2_sku]:
+		stock_movement_snapshot = await sample_store.get_product_stock_movement_snapshot(sku=sku)
+		assert [movement["bal"] for movement in stock_movement_snapshot] == list(range(51))
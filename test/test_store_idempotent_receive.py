@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+import pytest_asyncio
+
+from aggregrate.store import create_store
+from aggregrate.received_entry_index import ReceivedEntryIndex
+from persistence.write_ahead_log import WriteAheadLog
+from persistence.store_recovery import recover_store, checkpoint_store
+from value_object.unit import Unit
+from error import UnsupportedUnitError
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, opening_bal=10)
+	
+	return store
+
+
+def receipt(received_entry_id: str, qty: float = 5, unit: Unit = Unit.KG):
+	return {"received_entry_id": received_entry_id, "received_from": "RD Enterprises", "received_products": [{"sku": "test_rice", "qty": qty, "unit": unit}]}
+
+
+@pytest.mark.asyncio
+async def test_retried_receipt_returns_its_original_result(sample_store):
+	result = await sample_store.receive(receipt("GRN-1"))
+	assert result["is_replay"] is False
+	assert result["bals"] == {"test_rice": 15}
+	
+	await sample_store.receive(receipt("GRN-2"))
+	replayed_result = await sample_store.receive(receipt("GRN-1"))
+	assert replayed_result == {**result, "is_replay": True}
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 20
+	assert await sample_store.count_product_stock_movements(sku="test_rice") == 3
+	
+	#entries without an id are always applied
+	await sample_store.receive({"received_from": "RD Enterprises", "received_products": [{"sku": "test_rice", "qty": 1, "unit": Unit.KG}]})
+	await sample_store.receive({"received_from": "RD Enterprises", "received_products": [{"sku": "test_rice", "qty": 1, "unit": Unit.KG}]})
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 22
+
+
+@pytest.mark.asyncio
+async def test_concurrent_retries_are_applied_once(sample_store):
+	results = await asyncio.gather(*[sample_store.receive(receipt("GRN-1")) for _ in range(5)])
+	
+	assert [result["is_replay"] for result in results] == [False, True, True, True, True]
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 15
+
+
+@pytest.mark.asyncio
+async def test_receipt_for_another_store_is_rejected_even_if_its_id_was_applied(sample_store):
+	await sample_store.receive(receipt("GRN-1"))
+	
+	with pytest.raises(ValueError):
+		await sample_store.receive({**receipt("GRN-1"), "store_id": "another_store"})
+
+
+@pytest.mark.asyncio
+async def test_rejected_receipt_can_be_retried(sample_store):
+	with pytest.raises(UnsupportedUnitError):
+		await sample_store.receive(receipt("GRN-1", unit=Unit.BAG))
+	
+	assert (await sample_store.receive(receipt("GRN-1")))["is_replay"] is False
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 15
+
+
+def test_evicted_entries_are_still_known(tmp_path):
+	received_entry_index = ReceivedEntryIndex(capacity=2)
+	received_entry_index.add("GRN-1", {"bals": {}})
+	received_entry_index.add("GRN-2", {"bals": {}})
+	#seeing an entry again keeps it from being evicted next
+	received_entry_index.get("GRN-1")
+	received_entry_index.add("GRN-3", {"bals": {}})
+	
+	assert received_entry_index.get("GRN-2") == {}
+	assert received_entry_index.get("GRN-1") == {"bals": {}}
+	assert received_entry_index.get("GRN-4") is None
+	assert len(received_entry_index) == 3
+	
+	#once the older ids file is open, evicted ids go to it and are still known after it is reopened
+	received_entry_index.open_older_ids_file(str(tmp_path / "store.wal.received_ids"))
+	received_entry_index.add("GRN-4", {"bals": {}})
+	received_entry_index.close()
+	
+	received_entry_index = ReceivedEntryIndex(capacity=2)
+	received_entry_index.open_older_ids_file(str(tmp_path / "store.wal.received_ids"))
+	assert received_entry_index.get("GRN-2") == {}
+	assert received_entry_index.get("GRN-3") == {}
+	assert received_entry_index.get("GRN-4") is None
+	assert len(received_entry_index) == 2
+	received_entry_index.close()
+
+
+@pytest.mark.asyncio
+async def test_received_entries_are_recovered(tmp_path):
+	async def open_store():
+		write_ahead_log = WriteAheadLog(path=str(tmp_path / "store.wal"))
+		store = await recover_store(store_id="test_store", store_name="Store (test)", snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=write_ahead_log)
+		return store, write_ahead_log
+	
+	store, write_ahead_log = await open_store()
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG)
+	first_result = await store.receive(receipt("GRN-1"))
+	await checkpoint_store(store=store, snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=write_ahead_log)
+	second_result = await store.receive(receipt("GRN-2"))
+	write_ahead_log.close()
+	
+	recovered_store, _ = await open_store()
+	assert await recovered_store.receive(receipt("GRN-1")) == {**first_result, "is_replay": True}
+	assert await recovered_store.receive(receipt("GRN-2")) == {**second_result, "is_replay": True}
+	assert await recovered_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 10
@@ -2,7 +2,7 @@ import pytest
 import pytest_asyncio
 from aggregrate.store import create_store
 from value_object.unit import Unit
-from error import AlreadyExistingProduct
+from error import AlreadyExistingProduct, UnexistingProduct
 
 
 @pytest.mark.asyncio
@@ -13,4 +13,59 @@ async def test_multiple_entrance_of_same_sku_causes_error():
 	with pytest.raises(AlreadyExistingProduct):
 		await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG)
 		await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG)
-	
\ No newline at end of file
+
+
+@pytest.mark.asyncio
+async def test_unexisting_sku_causes_error():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG)
+
+	with pytest.raises(UnexistingProduct):
+		await store.get_stock_level(sku="test_beans", unit=Unit.KG)
+	
+	with pytest.raises(UnexistingProduct):
+		await store.get_product_stock_movement_snapshot(sku="test_beans")
+
+
+@pytest.mark.asyncio
+async def test_inventory_snapshot_keeps_order_of_product_creation():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	skus = ["test_yam", "test_rice", "test_beans", "test_garri"]
+	for sku in skus:
+		await store.create_product_inventory(sku=sku, product_name=sku, base_unit=Unit.KG)
+	
+	inventory_snapshot = await store.get_inventory_snapshot()
+	assert list(inventory_snapshot.keys()) == skus
+
+
+@pytest.mark.asyncio
+async def test_inventory_snapshot_view_and_changes_since_last_poll():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	for sku in ["test_yam", "test_rice", "test_beans"]:
+		await store.create_product_inventory(sku=sku, product_name=sku, base_unit=Unit.KG)
+	
+	inventory_snapshot_view = await store.get_inventory_snapshot_view()
+	with pytest.raises(TypeError):
+		inventory_snapshot_view["test_yam"] = {"unit": Unit.KG, "qty": 1}
+	with pytest.raises(TypeError):
+		inventory_snapshot_view["test_yam"]["qty"] = 1
+	
+	last_poll = await store.get_inventory_changes_since(0)
+	assert list(last_poll["changes"].keys()) == ["test_beans", "test_rice", "test_yam"]
+	
+	await store.receive({
+		"received_entry_id": "test_receive",
+	    "received_from": "RD Enterprises",
+	    "received_products": [
+			{"sku": "test_rice", "qty": 5, "unit": Unit.KG},
+			{"sku": "test_rice", "qty": 5, "unit": Unit.KG},
+		]
+	})
+	
+	this_poll = await store.get_inventory_changes_since(last_poll["version"])
+	assert this_poll["version"] > last_poll["version"]
+	assert {sku: dict(inventory) for sku, inventory in this_poll["changes"].items()} == {"test_rice": {"unit": Unit.KG, "qty": 10}}
+	
+	#the view is live
+	assert inventory_snapshot_view["test_rice"]["qty"] == 10
+	assert (await store.get_inventory_changes_since(this_poll["version"]))["changes"] == {}
@@ -0,0 +1,129 @@
+import pytest
+import pytest_asyncio
+
+from aggregrate.store import create_store
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+from error import UnsupportedUnitError, InvalidQtyError, UnexistingProduct
+
+
+kg_to_bag = 50
+tins_to_ctn = 24
+
+product1_sku = "test_rice"
+product2_sku = "test_coconut_milk"
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku=product1_sku, product_name="Rice (test)", base_unit=Unit.KG, opening_bal=100)
+	store.add_supported_unit(sku=product1_sku, unit=Unit.BAG, conversion_factor = kg_to_bag)
+
+	await store.create_product_inventory(sku=product2_sku, product_name="Coconut Milk (test)", base_unit=Unit.TIN, opening_bal=48)
+	store.add_supported_unit(sku=product2_sku, unit=Unit.CTN, conversion_factor = tins_to_ctn)
+
+	return store
+
+
+@pytest.mark.asyncio
+async def test_store_issuing(sample_store):
+	await sample_store.issue({
+		"issued_entry_id": "test_issue",
+		"issued_to": "Kitchen",
+		"store_id": sample_store.store_id,
+		"issued_products": [
+			{"sku": product1_sku, "qty": 1, "unit": Unit.BAG},
+			{"sku": product2_sku, "qty": 1, "unit": Unit.CTN},
+			{"sku": product1_sku, "qty": 20, "unit": Unit.KG},
+		]
+	})
+	
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == pytest.approx(30)
+	assert await sample_store.get_stock_level(sku=product2_sku, unit=Unit.TIN) == pytest.approx(24)
+	
+	stock_movement_snapshot = await sample_store.get_product_stock_movement_snapshot(sku=product1_sku)
+	assert [movement["issued"] for movement in stock_movement_snapshot[1:]] == [1, 20]
+	assert [movement["bal"] for movement in stock_movement_snapshot[1:]] == [50, 30]
+	assert stock_movement_snapshot[-1]["location"] == "Kitchen"
+
+
+@pytest.mark.asyncio
+async def test_issuing_more_than_available_leaves_store_untouched(sample_store):
+	with pytest.raises(InvalidQtyError):
+		await sample_store.issue({
+			"issued_entry_id": "test_issue",
+			"issued_to": "Kitchen",
+			"issued_products": [
+				{"sku": product2_sku, "qty": 1, "unit": Unit.CTN},
+				{"sku": product1_sku, "qty": 1, "unit": Unit.BAG},
+				{"sku": product1_sku, "qty": 2, "unit": Unit.BAG},
+			]
+		})
+	
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == 100
+	assert await sample_store.get_stock_level(sku=product2_sku, unit=Unit.TIN) == 48
+	assert await sample_store.count_product_stock_movements(sku=product2_sku) == 1
+
+
+@pytest.mark.asyncio
+async def test_issuing_everything_in_several_lines(sample_store):
+	#summed first, 0.99 + 2.41 rounds to just over 3.4... line by line, it leaves exactly 0
+	await sample_store.create_product_inventory(sku="test_salt", product_name="Salt (test)", base_unit=Unit.KG, opening_bal=3.4)
+	await sample_store.issue({
+		"issued_to": "Kitchen",
+		"issued_products": [
+			{"sku": "test_salt", "qty": 0.99, "unit": Unit.KG},
+			{"sku": "test_salt", "qty": 2.41, "unit": Unit.KG},
+		]
+	})
+	
+	assert await sample_store.get_stock_level(sku="test_salt", unit=Unit.KG) == 0
+	assert [movement["bal"] for movement in await sample_store.get_product_stock_movement_snapshot(sku="test_salt")] == [3.4, 3.4 - 0.99, 0]
+
+
+@pytest.mark.asyncio
+async def test_store_adjusting(sample_store):
+	await sample_store.adjust({
+		"adjusted_entry_id": "test_adjust",
+		"reason": "Stock count",
+		"adjusted_products": [
+			{"sku": product1_sku, "qty": 3, "unit": Unit.BAG},
+			{"sku": product2_sku, "qty": 10, "unit": Unit.TIN},
+		]
+	})
+	
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == pytest.approx(150)
+	assert await sample_store.get_stock_level(sku=product2_sku, unit=Unit.TIN) == pytest.approx(10)
+	
+	latest_stock_movement = (await sample_store.get_product_stock_movement_snapshot(sku=product1_sku))[-1]
+	assert latest_stock_movement["location"] == "Stock count"
+	assert latest_stock_movement["received"] is None
+	assert latest_stock_movement["issued"] is None
+	assert latest_stock_movement["bal"] == pytest.approx(150)
+
+
+@pytest.mark.asyncio
+async def test_bulk_movements_report_failures_per_line(sample_store):
+	result = await sample_store.apply_movements([
+		{"change_type": ChangeType.ISSUE, "sku": product1_sku, "qty": 1, "unit": Unit.BAG, "location": "Kitchen"},
+		{"change_type": ChangeType.ISSUE, "sku": product1_sku, "qty": 2, "unit": Unit.BAG, "location": "Kitchen"}, #only 50kg left
+		{"change_type": ChangeType.RECEIVE, "sku": product1_sku, "qty": 1, "unit": Unit.BAG, "location": "RD Enterprises"},
+		{"change_type": ChangeType.ISSUE, "sku": product1_sku, "qty": 2, "unit": Unit.BAG, "location": "Kitchen"}, #now there is enough
+		{"change_type": ChangeType.ISSUE, "sku": product2_sku, "qty": 1, "unit": Unit.BAG, "location": "Bar"},
+		{"change_type": ChangeType.ISSUE, "sku": "test_beans", "qty": 1, "unit": Unit.BAG, "location": "Bar"},
+		{"change_type": ChangeType.ADJUST, "sku": product2_sku, "qty": 1, "unit": Unit.CTN, "location": "Stock count"},
+		{"change_type": "fifty", "sku": product2_sku, "qty": 1, "unit": Unit.CTN, "location": "Stock count"},
+	])
+	
+	assert result["applied_count"] == 4
+	assert [failure["index"] for failure in result["failures"]] == [1, 4, 5, 7]
+	assert isinstance(result["failures"][0]["error"], InvalidQtyError)
+	assert isinstance(result["failures"][1]["error"], UnsupportedUnitError)
+	assert isinstance(result["failures"][2]["error"], UnexistingProduct)
+	
+	assert await sample_store.get_stock_level(sku=product1_sku, unit=Unit.KG) == pytest.approx(0)
+	assert await sample_store.get_stock_level(sku=product2_sku, unit=Unit.TIN) == pytest.approx(24)
+	
+	stock_movement_snapshot = await sample_store.get_product_stock_movement_snapshot(sku=product1_sku)
+	assert [movement["bal"] for movement in stock_movement_snapshot] == [100, 50, 100, 0]
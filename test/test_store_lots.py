@@ -0,0 +1,141 @@
+import pytest
+import pytest_asyncio
+
+from datetime import date, datetime
+
+from aggregrate.store import create_store
+from entity.product_lots import ProductLots
+from persistence.write_ahead_log import WriteAheadLog
+from persistence.store_recovery import recover_store, checkpoint_store
+from persistence.binary_codec import encode_stock_movement, decode_stock_movement
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+
+
+kg_to_bag = 50
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, opening_bal=5)
+	store.add_supported_unit(sku="test_rice", unit=Unit.BAG, conversion_factor=kg_to_bag)
+	store.enable_lot_tracking(sku="test_rice")
+	
+	return store
+
+
+def receipt(*lines):
+	return {"received_from": "RD Enterprises", "received_products": [{"sku": "test_rice", "unit": Unit.BAG, **line} for line in lines]}
+
+
+def issue(qty: float, unit: Unit = Unit.KG):
+	return {"issued_to": "Kitchen", "issued_products": [{"sku": "test_rice", "qty": qty, "unit": unit}]}
+
+
+def test_lots_are_allocated_first_expiring_first():
+	product_lots = ProductLots()
+	product_lots.receive(qty=10, lot_id="B", expiry_date=date(2025, 3, 1))
+	product_lots.receive(qty=10)
+	product_lots.receive(qty=10, lot_id="A", expiry_date=date(2025, 1, 1))
+	product_lots.receive(qty=5, lot_id="B", expiry_date=date(2025, 3, 1))
+	
+	assert [lot["lot_id"] for lot in product_lots.get_lots()] == ["A", "B", None]
+	assert product_lots.allocate(12) == [("A", 10), ("B", 2)]
+	assert product_lots.allocate(20) == [("B", 13), (None, 7)]
+	assert product_lots.get_lots() == [{"lot_id": None, "expiry_date": None, "unit_cost": None, "qty": 3}]
+	
+	#a lot is one expiry and cost layer
+	with pytest.raises(ValueError):
+		product_lots.receive(qty=1, lot_id=None, expiry_date=date(2025, 1, 1))
+
+
+@pytest.mark.asyncio
+async def test_issues_are_split_across_lots_in_the_ledger(sample_store):
+	await sample_store.receive(receipt(
+		{"qty": 1, "lot_id": "L2", "expiry_date": date(2025, 6, 1), "unit_cost": 25_000},
+		{"qty": 2, "lot_id": "L1", "expiry_date": date(2025, 2, 1), "unit_cost": 20_000}
+	))
+	
+	assert await sample_store.get_lots(sku="test_rice") == [
+		{"lot_id": "L1", "expiry_date": date(2025, 2, 1), "unit_cost": 400, "qty": 100, "value": 40_000},
+		{"lot_id": "L2", "expiry_date": date(2025, 6, 1), "unit_cost": 500, "qty": 50, "value": 25_000},
+		{"lot_id": None, "expiry_date": None, "unit_cost": None, "qty": 5, "value": None}
+	]
+	
+	await sample_store.issue(issue(3, unit=Unit.BAG))
+	stock_movements = await sample_store.get_product_stock_movement_snapshot(sku="test_rice")
+	assert [(movement["issued"], movement["bal"], movement["lot_id"]) for movement in stock_movements[-2:]] == [(2, 55, "L1"), (1, 5, "L2")]
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 5
+	
+	#bulk movements draw from the lots too
+	await sample_store.apply_movements([{"change_type": ChangeType.ISSUE, "sku": "test_rice", "qty": 5, "unit": Unit.KG, "location": "Kitchen"}])
+	assert await sample_store.get_lots(sku="test_rice") == []
+	
+	#adjusting up goes into the lot named, adjusting down writes off the lots first expiring first
+	await sample_store.adjust({"reason": "Stock count", "adjusted_products": [{"sku": "test_rice", "qty": 60, "unit": Unit.KG, "lot_id": "L3", "expiry_date": date(2025, 9, 1)}]})
+	await sample_store.adjust({"reason": "Expired", "adjusted_products": [{"sku": "test_rice", "qty": 10, "unit": Unit.KG}]})
+	assert [(lot["lot_id"], lot["qty"]) for lot in await sample_store.get_lots(sku="test_rice")] == [("L3", 10)]
+
+
+@pytest.mark.asyncio
+async def test_bad_lots_leave_the_store_untouched(sample_store):
+	await sample_store.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG)
+	
+	with pytest.raises(ValueError):
+		await sample_store.receive({"received_from": "RD Enterprises", "received_products": [{"sku": "test_beans", "qty": 1, "unit": Unit.KG, "lot_id": "L1"}]})
+	
+	with pytest.raises(ValueError):
+		await sample_store.receive(receipt({"qty": 1, "lot_id": "L1", "expiry_date": date(2025, 2, 1)}, {"qty": 1, "lot_id": "L1", "expiry_date": date(2025, 3, 1)}))
+	
+	with pytest.raises(ValueError):
+		await sample_store.receive(receipt({"qty": 1, "lot_id": "L1", "expiry_date": datetime(2025, 2, 1)}))
+	
+	#stock without a lot has no expiry or cost, so receiving without a lot can never clash with it
+	with pytest.raises(ValueError):
+		await sample_store.receive(receipt({"qty": 10, "expiry_date": date(2026, 12, 1)}))
+	
+	with pytest.raises(ValueError):
+		await sample_store.receive(receipt({"qty": 10, "unit_cost": 20_000}))
+	
+	with pytest.raises(ValueError):
+		sample_store.enable_lot_tracking(sku="test_rice")
+	
+	with pytest.raises(ValueError):
+		await sample_store.get_lots(sku="test_beans")
+	
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 5
+	assert [lot["qty"] for lot in await sample_store.get_lots(sku="test_rice")] == [5]
+	
+	await sample_store.receive(receipt({"qty": 1}))
+	assert await sample_store.get_lots(sku="test_rice") == [{"lot_id": None, "expiry_date": None, "unit_cost": None, "qty": 55, "value": None}]
+
+
+@pytest.mark.asyncio
+async def test_lots_are_recovered(tmp_path):
+	async def open_store():
+		write_ahead_log = WriteAheadLog(path=str(tmp_path / "store.wal"))
+		store = await recover_store(store_id="test_store", store_name="Store (test)", snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=write_ahead_log)
+		return store, write_ahead_log
+	
+	store, write_ahead_log = await open_store()
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, qty_scale=1000)
+	store.enable_lot_tracking(sku="test_rice")
+	await store.receive({"received_from": "RD Enterprises", "received_products": [{"sku": "test_rice", "qty": 0.3, "unit": Unit.KG, "lot_id": "L1", "expiry_date": date(2025, 2, 1), "unit_cost": 900}]})
+	await checkpoint_store(store=store, snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=write_ahead_log)
+	await store.receive({"received_from": "RD Enterprises", "received_products": [{"sku": "test_rice", "qty": 0.2, "unit": Unit.KG, "lot_id": "L0", "expiry_date": date(2025, 1, 1)}]})
+	lots_before_restart = await store.get_lots(sku="test_rice")
+	write_ahead_log.close()
+	
+	recovered_store, _ = await open_store()
+	assert await recovered_store.get_lots(sku="test_rice") == lots_before_restart
+	
+	await recovered_store.issue({"issued_to": "Kitchen", "issued_products": [{"sku": "test_rice", "qty": 0.4, "unit": Unit.KG}]})
+	assert [(lot["lot_id"], lot["qty"]) for lot in await recovered_store.get_lots(sku="test_rice")] == [("L1", 0.1)]
+	
+	movements = (await recovered_store.get_product_stock_movement_snapshot(sku="test_rice"))[-2:]
+	assert [(movement["issued"], movement["lot_id"]) for movement in movements] == [(0.2, "L0"), (pytest.approx(0.2), "L1")]
+	
+	#archived rows keep their lot
+	last_movement = recovered_store._get_product_stock_movement_by_sku("test_rice")[-1]
+	assert decode_stock_movement(encode_stock_movement(last_movement)) == last_movement
@@ -0,0 +1,103 @@
+import pytest
+import pytest_asyncio
+
+from uuid import uuid4
+from aggregrate.store import Store, create_store
+from aggregrate.store_metrics import Histogram
+from value_object.unit import Unit
+from error import InvalidQtyError
+
+
+def receipt(line_count: int):
+	return {
+		"received_entry_id": str(uuid4()),
+		"received_from": "RD Enterprises",
+		"received_products": [{"sku": "test_rice", "qty": 1, "unit": Unit.KG}] * line_count
+	}
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG)
+	
+	return store
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_measured_until_enabled(sample_store):
+	await sample_store.receive(receipt(1))
+	assert sample_store.get_metrics() is None
+	
+	#the class methods run as they are, with no wrappers on the instance
+	assert "receive" not in vars(sample_store)
+	assert "_commit_lines" not in vars(sample_store)
+
+
+@pytest.mark.asyncio
+async def test_operations_phases_and_lines_are_measured(sample_store):
+	sample_store.enable_metrics()
+	await sample_store.receive(receipt(3))
+	await sample_store.receive(receipt(30))
+	await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG)
+	with pytest.raises(InvalidQtyError):
+		await sample_store.issue({"issued_entry_id": "test_issue", "issued_to": "Kitchen", "issued_products": [{"sku": "test_rice", "qty": 100, "unit": Unit.KG}]})
+	
+	metrics = sample_store.get_metrics()
+	receive_metrics = metrics["operations"]["receive"]
+	assert receive_metrics["count"] == 2
+	assert receive_metrics["error_count"] == 0
+	assert receive_metrics["latency"]["count"] == 2
+	assert receive_metrics["lines"]["count"] == 2
+	assert receive_metrics["lines"]["sum"] == 33
+	assert receive_metrics["lines"]["max"] == 30
+	
+	assert metrics["operations"]["get_stock_level"]["lines"] is None
+	assert metrics["operations"]["issue"]["error_count"] == 1
+	
+	#the failed issue was stopped while validating, before it was committed
+	assert metrics["phases"]["_validate_lines"]["count"] == 3
+	assert metrics["phases"]["_commit_lines"]["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_hooks_and_disabling(sample_store):
+	calls = []
+	sample_store.enable_metrics().add_hook(lambda name, seconds, line_count: calls.append((name, line_count)))
+	await sample_store.receive(receipt(2))
+	assert calls == [("_validate_lines", None), ("_log_event", None), ("_commit_lines", None), ("receive", 2)]
+	
+	sample_store.disable_metrics()
+	await sample_store.receive(receipt(2))
+	assert len(calls) == 4
+	assert sample_store.get_metrics() is None
+	assert "receive" not in vars(sample_store)
+
+
+@pytest.mark.asyncio
+async def test_failing_hook_does_not_fail_the_store(sample_store):
+	calls = []
+	def failing_hook(name, seconds, line_count):
+		raise RuntimeError("hook failed")
+	
+	metrics = sample_store.enable_metrics()
+	metrics.add_hook(failing_hook)
+	metrics.add_hook(lambda name, seconds, line_count: calls.append(name))
+	
+	#the hook fails between logging and committing, and after the call went through
+	result = await sample_store.receive(receipt(1))
+	assert result["bals"] == {"test_rice": 1}
+	assert calls == ["_validate_lines", "_log_event", "_commit_lines", "receive"]
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 1
+
+
+def test_histogram_quantiles():
+	histogram = Histogram([1, 10, 100])
+	for value in [0.5, 2, 3, 4, 50, 500]:
+		histogram.observe(value)
+	
+	assert histogram.get_snapshot()["buckets"] == [(1, 1), (10, 3), (100, 1), (None, 1)]
+	assert histogram.get_quantile(0.5) == 10
+	assert histogram.get_quantile(0.8) == 100
+	assert histogram.get_quantile(1) == 500
+	assert Histogram([1]).get_quantile(0.5) is None
@@ -0,0 +1,248 @@
+import os
+import sys
+import asyncio
+import subprocess
+import pytest
+
+from datetime import datetime
+from uuid import uuid4
+
+from aggregrate.store import Store
+from persistence.write_ahead_log import WriteAheadLog
+from persistence.store_recovery import recover_store, checkpoint_store
+from value_object.unit import Unit
+from value_object.qty_change_type import ChangeType
+from error import UnsupportedUnitError
+
+
+kg_to_bag = 50
+product_sku = "test_rice"
+
+
+def receipt(qty: float, unit: Unit = Unit.BAG):
+	return {
+		"received_entry_id": str(uuid4()),
+	    "received_from": "RD Enterprises",
+	    "received_products": [
+			{
+				"sku": product_sku,
+				"qty": qty,
+				"unit": unit
+			}
+		]
+	}
+
+
+KILLED_STORE_SCRIPT = """
+import os, sys, asyncio
+from aggregrate.store import Store
+from persistence.write_ahead_log import WriteAheadLog
+from value_object.unit import Unit
+
+async def main():
+	store = Store(store_id="test_store", store_name="Store (test)")
+	store.set_write_ahead_log(WriteAheadLog(path=sys.argv[1]))
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG)
+	for _ in range(20):
+		await store.receive({"received_from": "RD Enterprises", "received_products": [{"sku": "test_rice", "qty": 1, "unit": Unit.KG}]})
+	os._exit(0)
+
+asyncio.run(main())
+"""
+
+
+async def open_store(tmp_path):
+	write_ahead_log = WriteAheadLog(path=str(tmp_path / "store.wal"), sync_every=2)
+	store = await recover_store(store_id="test_store", store_name="Store (test)", snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=write_ahead_log)
+	return store, write_ahead_log
+
+
+async def store_contents(store: Store):
+	return await store.get_inventory_snapshot(), await store.get_product_stock_movement_snapshot(sku=product_sku)
+
+
+@pytest.mark.asyncio
+async def test_store_is_recovered_from_write_ahead_log(tmp_path):
+	store, write_ahead_log = await open_store(tmp_path)
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG, opening_bal=10)
+	store.add_supported_unit(sku=product_sku, unit=Unit.BAG, conversion_factor=kg_to_bag)
+	await store.receive(receipt(2))
+	await store.receive(receipt(3))
+	
+	#invalid entries are never logged
+	with pytest.raises(UnsupportedUnitError):
+		await store.receive(receipt(3, unit=Unit.CTN))
+	
+	contents_before_restart = await store_contents(store)
+	write_ahead_log.close()
+	
+	recovered_store, write_ahead_log = await open_store(tmp_path)
+	assert write_ahead_log.last_seq == 4
+	assert await store_contents(recovered_store) == contents_before_restart
+	assert await recovered_store.get_stock_level(sku=product_sku, unit=Unit.BAG) == pytest.approx(10 / kg_to_bag + 5)
+
+
+@pytest.mark.asyncio
+async def test_store_is_recovered_from_snapshot_and_log_tail(tmp_path):
+	store, write_ahead_log = await open_store(tmp_path)
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG)
+	store.add_supported_unit(sku=product_sku, unit=Unit.BAG, conversion_factor=kg_to_bag)
+	await store.receive(receipt(2))
+	
+	assert await checkpoint_store(store=store, snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=write_ahead_log) == 3
+	assert list(write_ahead_log.read()) == []
+	
+	await store.receive(receipt(1))
+	contents_before_restart = await store_contents(store)
+	write_ahead_log.close()
+	
+	recovered_store, write_ahead_log = await open_store(tmp_path)
+	assert [seq for seq, _ in write_ahead_log.read()] == [4]
+	assert await store_contents(recovered_store) == contents_before_restart
+	
+	#new events keep counting from where the log stopped
+	await recovered_store.receive(receipt(1))
+	assert write_ahead_log.last_seq == 5
+
+
+@pytest.mark.asyncio
+async def test_torn_record_at_end_of_log_is_dropped(tmp_path):
+	store, write_ahead_log = await open_store(tmp_path)
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG)
+	await store.receive(receipt(2, unit=Unit.KG))
+	write_ahead_log.close()
+	
+	#simulate a crash half-way through writing the last record
+	with open(tmp_path / "store.wal", "r+b") as file:
+		file.truncate(file.seek(0, 2) - 5)
+	
+	recovered_store, write_ahead_log = await open_store(tmp_path)
+	assert write_ahead_log.last_seq == 1
+	assert await recovered_store.get_stock_level(sku=product_sku, unit=Unit.KG) == 0
+	
+	await recovered_store.receive(receipt(4, unit=Unit.KG))
+	write_ahead_log.close()
+	
+	recovered_store, _ = await open_store(tmp_path)
+	assert await recovered_store.get_stock_level(sku=product_sku, unit=Unit.KG) == 4
+
+
+@pytest.mark.asyncio
+async def test_killed_process_loses_no_events(tmp_path):
+	#a store logging with the default WriteAheadLog, killed without closing it
+	subprocess.run([sys.executable, "-c", KILLED_STORE_SCRIPT, str(tmp_path / "store.wal")], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+	
+	recovered_store = await recover_store(store_id="test_store", store_name="Store (test)", snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=WriteAheadLog(path=str(tmp_path / "store.wal")))
+	assert await recovered_store.get_stock_level(sku=product_sku, unit=Unit.KG) == 20
+
+
+@pytest.mark.asyncio
+async def test_quiet_log_is_synced_after_sync_interval(tmp_path):
+	write_ahead_log = WriteAheadLog(path=str(tmp_path / "store.wal"), sync_every=100, sync_interval=0.01)
+	write_ahead_log.append({"type": "test"})
+	assert write_ahead_log._unsynced_count == 1
+	
+	await asyncio.sleep(0.1)
+	assert write_ahead_log._unsynced_count == 0
+	write_ahead_log.close()
+
+
+@pytest.mark.asyncio
+async def test_issues_adjustments_and_bulk_movements_are_recovered(tmp_path):
+	store, write_ahead_log = await open_store(tmp_path)
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG, opening_bal=100)
+	store.add_supported_unit(sku=product_sku, unit=Unit.BAG, conversion_factor=kg_to_bag)
+	await store.issue({"issued_to": "Kitchen", "issued_products": [{"sku": product_sku, "qty": 1, "unit": Unit.BAG}]})
+	await store.adjust({"reason": "Stock count", "adjusted_products": [{"sku": product_sku, "qty": 40, "unit": Unit.KG}]})
+	await store.apply_movements([
+		{"change_type": ChangeType.ISSUE, "sku": product_sku, "qty": 1, "unit": Unit.BAG, "location": "Kitchen"},
+		{"change_type": ChangeType.RECEIVE, "sku": product_sku, "qty": 2, "unit": Unit.BAG, "location": "RD Enterprises"},
+	])
+	
+	contents_before_restart = await store_contents(store)
+	write_ahead_log.close()
+	
+	recovered_store, _ = await open_store(tmp_path)
+	assert await store_contents(recovered_store) == contents_before_restart
+	assert await recovered_store.get_stock_level(sku=product_sku, unit=Unit.KG) == 140
+
+
+@pytest.mark.asyncio
+async def test_compaction_is_recovered(tmp_path):
+	archive_dir = tmp_path / "archive"
+	archive_dir.mkdir()
+	
+	store, write_ahead_log = await open_store(tmp_path)
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG, opening_bal=10)
+	after_opening = datetime.now()
+	await store.receive(receipt(2, unit=Unit.KG))
+	await store.receive(receipt(3, unit=Unit.KG))
+	
+	assert await store.compact_stock_movements(cutoff=datetime.now(), archive_dir=str(archive_dir)) == 3
+	#as-at queries reach back into the archive
+	assert await store.get_stock_level_as_at(sku=product_sku, timestamp=after_opening) == 10
+	assert await store.get_inventory_snapshot_as_at(after_opening) == {product_sku: {"unit": Unit.KG, "qty": 10}}
+	await store.receive(receipt(1, unit=Unit.KG))
+	
+	contents_before_restart = await store_contents(store)
+	archived_before_restart = [movement async for movement in store.get_archived_product_stock_movements(sku=product_sku)]
+	assert len(archived_before_restart) == 3
+	write_ahead_log.close()
+	
+	recovered_store, _ = await open_store(tmp_path)
+	assert await store_contents(recovered_store) == contents_before_restart
+	assert [movement async for movement in recovered_store.get_archived_product_stock_movements(sku=product_sku)] == archived_before_restart
+	assert await recovered_store.get_stock_level_as_at(sku=product_sku, timestamp=after_opening) == 10
+
+
+@pytest.mark.asyncio
+async def test_failed_compaction_is_not_logged(tmp_path):
+	store, write_ahead_log = await open_store(tmp_path)
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG, opening_bal=10)
+	await store.receive(receipt(2, unit=Unit.KG))
+	contents_before_compaction = await store_contents(store)
+	
+	#archive_dir sits under a file, so it can't be created
+	(tmp_path / "not_a_dir").write_text("")
+	with pytest.raises(OSError):
+		await store.compact_stock_movements(cutoff=datetime.now(), archive_dir=str(tmp_path / "not_a_dir" / "archive"))
+	assert await store_contents(store) == contents_before_compaction
+	write_ahead_log.close()
+	
+	recovered_store, _ = await open_store(tmp_path)
+	assert await store_contents(recovered_store) == contents_before_compaction
+	
+	#a missing archive_dir is created
+	assert await recovered_store.compact_stock_movements(cutoff=datetime.now(), archive_dir=str(tmp_path / "archive")) == 2
+	assert len([movement async for movement in recovered_store.get_archived_product_stock_movements(sku=product_sku)]) == 2
+
+
+@pytest.mark.asyncio
+async def test_reorder_levels_are_recovered(tmp_path):
+	store, write_ahead_log = await open_store(tmp_path)
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG, opening_bal=10)
+	store.set_reorder_level(sku=product_sku, reorder_level=20)
+	await checkpoint_store(store=store, snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=write_ahead_log)
+	await store.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG)
+	store.set_reorder_level(sku="test_beans", reorder_level=1)
+	write_ahead_log.close()
+	
+	recovered_store, _ = await open_store(tmp_path)
+	assert list((await recovered_store.get_skus_below_reorder_level()).keys()) == [product_sku, "test_beans"]
+
+
+@pytest.mark.asyncio
+async def test_qty_scale_is_recovered(tmp_path):
+	store, write_ahead_log = await open_store(tmp_path)
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=Unit.KG, opening_bal=0.1, qty_scale=1000)
+	await checkpoint_store(store=store, snapshot_path=str(tmp_path / "store.snapshot"), write_ahead_log=write_ahead_log)
+	await store.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG, qty_scale=100)
+	await store.receive({"received_entry_id": str(uuid4()), "received_from": "RD Enterprises", "received_products": [
+		{"sku": product_sku, "qty": 0.2, "unit": Unit.KG},
+		{"sku": "test_beans", "qty": 0.256, "unit": Unit.KG}
+	]})
+	write_ahead_log.close()
+	
+	recovered_store, _ = await open_store(tmp_path)
+	assert await recovered_store.get_stock_levels(skus=[product_sku, "test_beans"], unit=Unit.KG) == {product_sku: 0.3, "test_beans": 0.26}
+	assert recovered_store._get_product_inventory_by_sku("test_beans").qty_scale == 100
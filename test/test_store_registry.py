@@ -0,0 +1,58 @@
+import pytest
+import pytest_asyncio
+
+from aggregrate.store import create_store
+from aggregrate.store_registry import StoreRegistry
+from value_object.unit import Unit
+from error import UnexistingStore, AlreadyExistingStore
+
+
+kg_to_bag = 50
+
+
+@pytest_asyncio.fixture
+async def sample_registry():
+	registry = StoreRegistry()
+	for store_number, rice_in_kg in enumerate([100, 25, 0]):
+		store = await registry.create_store(store_id=f"test_store_{store_number}", store_name=f"Store {store_number} (test)")
+		await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, opening_bal=rice_in_kg)
+		store.add_supported_unit(sku="test_rice", unit=Unit.BAG, conversion_factor=kg_to_bag)
+	
+	#only the first store stocks beans, and it has no bag conversion for them
+	await registry.get_store("test_store_0").create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG, opening_bal=5)
+
+	return registry
+
+
+@pytest.mark.asyncio
+async def test_stores_are_looked_up_by_id(sample_registry):
+	assert len(sample_registry) == 3
+	assert "test_store_1" in sample_registry
+	assert sample_registry.get_store("test_store_1").store_name == "Store 1 (test)"
+	
+	with pytest.raises(UnexistingStore):
+		sample_registry.get_store("random")
+	
+	with pytest.raises(AlreadyExistingStore):
+		sample_registry.add_store(await create_store(store_id="test_store_1", store_name="Store 1 (test)"))
+	
+	sample_registry.remove_store("test_store_1")
+	assert "test_store_1" not in sample_registry
+	
+	#stores created without an id each get their own
+	for _ in range(2):
+		sample_registry.add_store(await create_store(store_name="Store (test)"))
+	assert len(sample_registry) == 4
+
+
+@pytest.mark.asyncio
+async def test_total_stock_levels_across_stores(sample_registry):
+	assert await sample_registry.get_total_stock_levels(unit=Unit.KG) == {"test_rice": 125, "test_beans": 5}
+	assert await sample_registry.get_total_stock_levels(unit=Unit.BAG) == {"test_rice": pytest.approx(2.5)}
+	assert await sample_registry.get_total_stock_levels(unit=Unit.KG, skus=["test_beans", "test_yam"]) == {"test_beans": 5}
+
+
+@pytest.mark.asyncio
+async def test_stores_below_threshold(sample_registry):
+	assert await sample_registry.get_stores_below_threshold(sku="test_rice", threshold=1, unit=Unit.BAG) == {"test_store_1": 0.5, "test_store_2": 0}
+	assert await sample_registry.get_stores_below_threshold(sku="test_beans", threshold=10, unit=Unit.KG) == {"test_store_0": 5}
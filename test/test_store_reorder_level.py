@@ -0,0 +1,87 @@
+import pytest
+import pytest_asyncio
+
+from aggregrate.store import create_store
+from value_object.unit import Unit
+from error import InvalidQtyError, UnsupportedUnitError
+
+
+kg_to_bag = 50
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	for sku, opening_bal in [("test_rice", 100), ("test_beans", 10), ("test_yam", 0)]:
+		await store.create_product_inventory(sku=sku, product_name=sku, base_unit=Unit.KG, opening_bal=opening_bal)
+	store.add_supported_unit(sku="test_rice", unit=Unit.BAG, conversion_factor=kg_to_bag)
+
+	return store
+
+
+def issue(sku: str, qty: float):
+	return {"issued_to": "Kitchen", "issued_products": [{"sku": sku, "qty": qty, "unit": Unit.KG}]}
+
+
+def receipt(sku: str, qty: float):
+	return {"received_from": "RD Enterprises", "received_products": [{"sku": sku, "qty": qty, "unit": Unit.KG}]}
+
+
+@pytest.mark.asyncio
+async def test_skus_below_reorder_level(sample_store):
+	crossings = []
+	sample_store.add_reorder_level_listener(lambda sku, is_below: crossings.append((sku, is_below)))
+	
+	assert await sample_store.get_skus_below_reorder_level() == {}
+	
+	sample_store.set_reorder_level(sku="test_rice", reorder_level=1, unit=Unit.BAG)
+	sample_store.set_reorder_level(sku="test_beans", reorder_level=20)
+	assert crossings == [("test_beans", True)]
+	assert await sample_store.get_skus_below_reorder_level() == {"test_beans": {"unit": Unit.KG, "qty": 10, "reorder_level": 20}}
+	
+	await sample_store.issue(issue("test_rice", 40))
+	assert crossings == [("test_beans", True)]
+	
+	#only crossings are reported, not every change while below
+	await sample_store.issue(issue("test_rice", 20))
+	await sample_store.issue(issue("test_rice", 20))
+	await sample_store.receive(receipt("test_beans", 15))
+	assert crossings == [("test_beans", True), ("test_rice", True), ("test_beans", False)]
+	assert list((await sample_store.get_skus_below_reorder_level()).keys()) == ["test_rice"]
+	
+	#being exactly at the reorder level is not below it
+	await sample_store.receive(receipt("test_rice", 30))
+	assert await sample_store.get_skus_below_reorder_level() == {}
+	
+	sample_store.set_reorder_level(sku="test_yam", reorder_level=5)
+	sample_store.set_reorder_level(sku="test_yam", reorder_level=None)
+	assert await sample_store.get_skus_below_reorder_level() == {}
+	assert crossings[-2:] == [("test_yam", True), ("test_yam", False)]
+
+
+@pytest.mark.asyncio
+async def test_invalid_reorder_levels(sample_store):
+	with pytest.raises(InvalidQtyError):
+		sample_store.set_reorder_level(sku="test_rice", reorder_level=-1)
+	
+	with pytest.raises(UnsupportedUnitError):
+		sample_store.set_reorder_level(sku="test_beans", reorder_level=1, unit=Unit.BAG)
+
+
+@pytest.mark.asyncio
+async def test_listeners_hear_of_crossings_once_the_change_is_done(sample_store):
+	sample_store.set_reorder_level(sku="test_rice", reorder_level=50)
+	sample_store.set_reorder_level(sku="test_beans", reorder_level=5)
+	
+	def failing_listener(sku, is_below):
+		raise RuntimeError("listener failed")
+	
+	#every sku of the entry is already changed when the first crossing is heard of
+	stock_levels_heard = []
+	sample_store.add_reorder_level_listener(failing_listener)
+	sample_store.add_reorder_level_listener(lambda sku, is_below: stock_levels_heard.append((sku, sample_store._inventory_snapshot["test_beans"]["qty"])))
+	
+	await sample_store.issue({"issued_to": "Kitchen", "issued_products": [{"sku": "test_rice", "qty": 60, "unit": Unit.KG}, {"sku": "test_beans", "qty": 6, "unit": Unit.KG}]})
+	assert stock_levels_heard == [("test_rice", 4), ("test_beans", 4)]
+	assert await sample_store.get_stock_level(sku="test_rice", unit=Unit.KG) == 40
+	assert (await sample_store.get_product_stock_movement_snapshot(sku="test_beans"))[-1]["bal"] == 4
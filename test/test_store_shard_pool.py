@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+
+from uuid import uuid4
+from aggregrate.store_shard_pool import StoreShardPool
+from value_object.unit import Unit
+from error import UnsupportedUnitError, UnexistingStore, StoreWorkerDiedError
+
+
+kg_to_bag = 50
+
+
+def receipt(store_id: str, qty: float, unit: Unit = Unit.BAG):
+	return {
+		"received_entry_id": str(uuid4()),
+		"store_id": store_id,
+	    "received_from": "RD Enterprises",
+	    "received_products": [{"sku": "test_rice", "qty": qty, "unit": unit}]
+	}
+
+
+@pytest.mark.asyncio
+async def test_stores_run_in_worker_processes():
+	async with StoreShardPool(worker_count=2) as pool:
+		store_ids = [f"test_store_{i}" for i in range(2, 6)]
+		for store_id in store_ids:
+			await pool.create_store(store_id=store_id, store_name=f"{store_id} (test)")
+			await pool.create_product_inventory(store_id=store_id, sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG)
+			await pool.add_supported_unit(store_id=store_id, sku="test_rice", unit=Unit.BAG, conversion_factor=kg_to_bag)
+		
+		assert {pool.get_worker_index(store_id) for store_id in store_ids} == {0, 1}
+		
+		for i, store_id in enumerate(store_ids):
+			for _ in range(i + 1):
+				await pool.receive(receipt(store_id, qty=1))
+		
+		for i, store_id in enumerate(store_ids):
+			assert await pool.get_stock_level(store_id=store_id, sku="test_rice", unit=Unit.KG) == (i + 1) * kg_to_bag
+		
+		#errors raised in the worker are raised to the caller
+		with pytest.raises(UnsupportedUnitError):
+			await pool.receive(receipt(store_ids[0], qty=1, unit=Unit.CTN))
+		
+		with pytest.raises(UnexistingStore):
+			await pool.get_inventory_snapshot(store_id="random")
+		
+		with pytest.raises(UnexistingStore):
+			await pool.receive(receipt(None, qty=1))
+
+
+@pytest.mark.asyncio
+async def test_calls_to_a_dead_worker_fail():
+	async with StoreShardPool(worker_count=2) as pool:
+		#one store in each worker
+		store_ids_by_worker = {pool.get_worker_index(f"test_store_{i}"): f"test_store_{i}" for i in range(2, 6)}
+		dead_store_id, live_store_id = store_ids_by_worker[0], store_ids_by_worker[1]
+		for store_id in [dead_store_id, live_store_id]:
+			await pool.create_store(store_id=store_id, store_name=f"{store_id} (test)")
+		
+		pool._workers[pool.get_worker_index(dead_store_id)].kill()
+		
+		with pytest.raises(StoreWorkerDiedError):
+			await asyncio.wait_for(pool.get_inventory_snapshot(store_id=dead_store_id), timeout=5)
+		
+		#stores in the other workers carry on
+		assert await pool.get_inventory_snapshot(store_id=live_store_id) == {}
@@ -0,0 +1,82 @@
+import pytest
+import pytest_asyncio
+
+import entity.inventory_columns
+from aggregrate.store import create_store
+from persistence.store_snapshot import save_store_snapshot, load_store_snapshot
+from value_object.unit import Unit
+from error import UnexistingProduct, UnsupportedUnitError
+
+
+@pytest.fixture(params=["numpy", "no numpy"])
+def vectorized(request, monkeypatch):
+	#the same results are expected with and without numpy
+	if request.param == "numpy":
+		pytest.importorskip("numpy")
+	else:
+		monkeypatch.setattr(entity.inventory_columns, "numpy", None)
+
+
+@pytest_asyncio.fixture
+async def sample_store():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, opening_bal=100)
+	await store.create_product_inventory(sku="test_yam", product_name="Yam (test)", base_unit=Unit.TUBER, opening_bal=12)
+	store.add_supported_unit(sku="test_rice", unit=Unit.BAG, conversion_factor=50)
+	store.add_supported_unit(sku="test_yam", unit=Unit.BSKT, conversion_factor=4)
+	
+	return store
+
+
+@pytest.mark.asyncio
+async def test_pairs_are_converted_in_order(vectorized, sample_store):
+	await sample_store.issue({"issued_entry_id": "test_issue", "issued_to": "Kitchen", "issued_products": [{"sku": "test_rice", "qty": 25, "unit": Unit.KG}]})
+	
+	stock_levels = await sample_store.get_stock_levels_batch(
+		sku_units=[("test_yam", Unit.BSKT), ("test_rice", Unit.BAG), ("test_rice", Unit.KG)],
+		unit_costs=[2000, 30000, 600]
+	)
+	assert stock_levels == {
+		"skus": ["test_yam", "test_rice", "test_rice"],
+		"units": [Unit.BSKT, Unit.BAG, Unit.KG],
+		"qtys": [3, 1.5, 75],
+		"values": [6000, 45000, 45000],
+		"total_value": 96000
+	}
+
+
+@pytest.mark.asyncio
+async def test_whole_catalogue_in_base_units(vectorized, sample_store):
+	stock_levels = await sample_store.get_stock_levels_batch()
+	assert stock_levels["skus"] == ["test_rice", "test_yam"]
+	assert stock_levels["units"] == [Unit.KG, Unit.TUBER]
+	assert stock_levels["qtys"] == [100, 12]
+	assert stock_levels["values"] is None
+	
+	stock_levels = await sample_store.get_stock_levels_batch(unit_costs=[600, 500])
+	assert stock_levels["total_value"] == 66000
+	
+	with pytest.raises(ValueError):
+		await sample_store.get_stock_levels_batch(unit_costs=[600])
+
+
+@pytest.mark.asyncio
+async def test_unknown_sku_or_unsupported_unit_fails_whole_batch(vectorized, sample_store):
+	with pytest.raises(UnexistingProduct):
+		await sample_store.get_stock_levels_batch(sku_units=[("test_rice", Unit.KG), ("test_beans", Unit.KG)])
+	
+	with pytest.raises(UnsupportedUnitError):
+		await sample_store.get_stock_levels_batch(sku_units=[("test_rice", Unit.KG), ("test_yam", Unit.BAG)])
+	
+	with pytest.raises(UnsupportedUnitError):
+		await sample_store.get_stock_levels_batch(sku_units=[("test_rice", "KG")])
+
+
+@pytest.mark.asyncio
+async def test_packed_columns_are_rebuilt_from_snapshot(vectorized, sample_store, tmp_path):
+	snapshot_path = str(tmp_path / "store.snapshot")
+	save_store_snapshot(sample_store, snapshot_path, seq=0)
+	store, _ = load_store_snapshot(snapshot_path)
+	
+	stock_levels = await store.get_stock_levels_batch(sku_units=[("test_rice", Unit.BAG), ("test_yam", Unit.BSKT)])
+	assert stock_levels["qtys"] == [2, 3]
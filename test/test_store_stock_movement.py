@@ -1,6 +1,7 @@
 import pytest
 import pytest_asyncio
 
+from uuid import uuid4
 from datetime import datetime
 from aggregrate.store import create_store
 from value_object.unit import Unit
@@ -69,3 +70,63 @@ async def test_received_in_same_unit_BUT_bal_in_base_unit(sample_store):
 	assert latest_stock_movement["issued"] is None
 	assert latest_stock_movement["bal"] == expected_base_unit_qty
 	assert latest_stock_movement["base_unit"] == base_unit
+
+
+@pytest.mark.asyncio
+async def test_stock_movement_snapshot_pages_and_streams(sample_store):
+	for qty_to_receive in range(1, 6):
+		await sample_store.receive({
+			"received_entry_id": str(uuid4()),
+		    "received_from": "RD Enterprises",
+		    "received_products": [
+				{
+					"sku": product_sku,
+					"qty": qty_to_receive,
+					"unit": Unit.KG
+				}
+			]
+		})
+	
+	assert await sample_store.count_product_stock_movements(sku=product_sku) == 6
+	
+	last_page = await sample_store.get_product_stock_movement_snapshot(sku=product_sku, offset=4, limit=10)
+	assert [movement["received"] for movement in last_page] == [4, 5]
+	
+	streamed = [movement async for movement in sample_store.stream_product_stock_movement_snapshot(sku=product_sku)]
+	assert streamed == await sample_store.get_product_stock_movement_snapshot(sku=product_sku)
+
+
+@pytest.mark.asyncio
+async def test_stock_levels_as_at_a_past_time(sample_store):
+	before_creation = datetime(2000, 1, 1)
+	after_opening = datetime.now()
+	
+	await sample_store.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=base_unit, opening_bal=5)
+	await sample_store.receive({
+		"received_entry_id": str(uuid4()),
+	    "received_from": "RD Enterprises",
+	    "received_products": [{"sku": product_sku, "qty": 1, "unit": Unit.BAG}]
+	})
+	
+	assert await sample_store.get_stock_level_as_at(sku=product_sku, timestamp=before_creation) == 0
+	assert await sample_store.get_stock_level_as_at(sku=product_sku, timestamp=after_opening) == opening_bal
+	assert await sample_store.get_stock_level_as_at(sku=product_sku, timestamp=after_opening, unit=Unit.BAG) == pytest.approx(opening_bal / kg_to_bag)
+	assert await sample_store.get_stock_level_as_at(sku=product_sku, timestamp=datetime.now()) == opening_bal + kg_to_bag
+	
+	assert await sample_store.get_inventory_snapshot_as_at(after_opening) == {product_sku: {"unit": base_unit, "qty": opening_bal}}
+	assert await sample_store.get_inventory_snapshot_as_at(datetime.now()) == await sample_store.get_inventory_snapshot()
+	assert await sample_store.get_inventory_snapshot_as_at(before_creation) == {}
+
+
+@pytest.mark.asyncio
+async def test_scaled_product_records_qtys_in_their_own_unit():
+	store = await create_store(store_id="test_store", store_name="Store (test)")
+	await store.create_product_inventory(sku=product_sku, product_name="Rice (test)", base_unit=base_unit, qty_scale=1000)
+	store.add_supported_unit(sku=product_sku, unit=Unit.BAG, conversion_factor = kg_to_bag)
+	
+	#0.0001 BAG is 0.005 KG, which the scale holds exactly
+	await store.receive({"received_from": "RD Enterprises", "received_products": [{"sku": product_sku, "qty": 0.0001, "unit": Unit.BAG}]})
+	
+	received_stock_movement = (await store.get_product_stock_movement_snapshot(sku=product_sku))[-1]
+	assert (received_stock_movement["received"], received_stock_movement["unit"]) == (0.0001, Unit.BAG)
+	assert received_stock_movement["bal"] == 0.005
@@ -0,0 +1,194 @@
+import asyncio
+import pytest
+import pytest_asyncio
+
+from aggregrate.store import create_store
+from persistence.write_ahead_log import WriteAheadLog
+from persistence.store_recovery import recover_store, recover_transfers
+from value_object.unit import Unit
+from error import UnsupportedUnitError, InvalidQtyError, UnexistingProduct
+
+
+kg_to_bag = 50
+kg_to_bskt_in_main_store = 2.5
+kg_to_bskt_in_branch = 3
+
+
+@pytest_asyncio.fixture
+async def sample_stores():
+	main_store = await create_store(store_id="test_main_store", store_name="Main Store (test)")
+	await main_store.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.KG, opening_bal=500)
+	main_store.add_supported_unit(sku="test_rice", unit=Unit.BAG, conversion_factor=kg_to_bag)
+	main_store.add_supported_unit(sku="test_rice", unit=Unit.BSKT, conversion_factor=kg_to_bskt_in_main_store)
+	await main_store.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG, opening_bal=20)
+	
+	branch = await create_store(store_id="test_branch", store_name="Branch (test)")
+	await branch.create_product_inventory(sku="test_rice", product_name="Rice (test)", base_unit=Unit.BSKT)
+	branch.add_supported_unit(sku="test_rice", unit=Unit.BAG, conversion_factor=kg_to_bag / kg_to_bskt_in_branch)
+	branch.add_supported_unit(sku="test_rice", unit=Unit.KG, conversion_factor=1 / kg_to_bskt_in_branch)
+	await branch.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG)
+
+	return main_store, branch
+
+
+async def stock_levels(store):
+	return await store.get_inventory_snapshot()
+
+
+@pytest.mark.asyncio
+async def test_transfer_between_stores(sample_stores):
+	main_store, branch = sample_stores
+	await main_store.transfer(to_store=branch, transfer_entry={
+		"transferred_products": [
+			{"sku": "test_rice", "qty": 2, "unit": Unit.BAG},
+			{"sku": "test_beans", "qty": 5, "unit": Unit.KG},
+		]
+	})
+	
+	assert await main_store.get_stock_level(sku="test_rice", unit=Unit.KG) == pytest.approx(400)
+	assert await branch.get_stock_level(sku="test_rice", unit=Unit.KG) == pytest.approx(100)
+	assert await branch.get_stock_level(sku="test_rice", unit=Unit.BSKT) == pytest.approx(100 / kg_to_bskt_in_branch)
+	assert await main_store.get_stock_level(sku="test_beans", unit=Unit.KG) == 15
+	assert await branch.get_stock_level(sku="test_beans", unit=Unit.KG) == 5
+	
+	issued = (await main_store.get_product_stock_movement_snapshot(sku="test_rice"))[-1]
+	received = (await branch.get_product_stock_movement_snapshot(sku="test_rice"))[-1]
+	assert issued["location"] == "Transfer to Branch (test)"
+	assert received["location"] == "Transfer from Main Store (test)"
+	assert issued["timestamp"] == received["timestamp"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("transferred_product, error", [
+	({"sku": "test_rice", "qty": 11, "unit": Unit.BAG}, InvalidQtyError), #not enough in the main store
+	({"sku": "test_rice", "qty": 1, "unit": Unit.CTN}, UnsupportedUnitError), #supported by neither
+	({"sku": "test_beans", "qty": 1, "unit": Unit.BAG}, UnsupportedUnitError), #supported by neither
+	({"sku": "test_yam", "qty": 1, "unit": Unit.KG}, UnexistingProduct),
+])
+async def test_failed_transfer_leaves_both_stores_untouched(sample_stores, transferred_product, error):
+	main_store, branch = sample_stores
+	stock_levels_before = (await stock_levels(main_store), await stock_levels(branch))
+	
+	with pytest.raises(error):
+		await main_store.transfer(to_store=branch, transfer_entry={
+			"transferred_products": [{"sku": "test_beans", "qty": 1, "unit": Unit.KG}, transferred_product]
+		})
+	
+	assert (await stock_levels(main_store), await stock_levels(branch)) == stock_levels_before
+
+
+@pytest.mark.asyncio
+async def test_unit_must_be_supported_in_both_stores(sample_stores):
+	main_store, branch = sample_stores
+	main_store.add_supported_unit(sku="test_beans", unit=Unit.BAG, conversion_factor=kg_to_bag)
+	branch.add_supported_unit(sku="test_beans", unit=Unit.PKT, conversion_factor=0.5)
+	
+	with pytest.raises(UnsupportedUnitError):
+		await main_store.transfer(to_store=branch, transfer_entry={"transferred_products": [{"sku": "test_beans", "qty": 0.1, "unit": Unit.BAG}]})
+	
+	with pytest.raises(UnsupportedUnitError):
+		await main_store.transfer(to_store=branch, transfer_entry={"transferred_products": [{"sku": "test_beans", "qty": 1, "unit": Unit.PKT}]})
+	
+	#each side converts with its own factor
+	await main_store.transfer(to_store=branch, transfer_entry={"transferred_products": [{"sku": "test_rice", "qty": 3, "unit": Unit.BSKT}]})
+	assert await main_store.get_stock_level(sku="test_rice", unit=Unit.KG) == pytest.approx(500 - 3 * kg_to_bskt_in_main_store)
+	assert await branch.get_stock_level(sku="test_rice", unit=Unit.BSKT) == pytest.approx(3)
+
+
+@pytest.mark.asyncio
+async def test_opposite_transfers_at_the_same_time(sample_stores):
+	main_store, branch = sample_stores
+	await main_store.transfer(to_store=branch, transfer_entry={"transferred_products": [{"sku": "test_beans", "qty": 10, "unit": Unit.KG}]})
+	
+	await asyncio.wait_for(asyncio.gather(*[
+		main_store.transfer(to_store=branch, transfer_entry={"transferred_products": [{"sku": "test_beans", "qty": 1, "unit": Unit.KG}]}) if i % 2 else
+		branch.transfer(to_store=main_store, transfer_entry={"transferred_products": [{"sku": "test_beans", "qty": 1, "unit": Unit.KG}]})
+		for i in range(20)
+	]), timeout=1)
+	
+	assert await main_store.get_stock_level(sku="test_beans", unit=Unit.KG) == 10
+	assert await branch.get_stock_level(sku="test_beans", unit=Unit.KG) == 10
+	
+	with pytest.raises(ValueError):
+		await main_store.transfer(to_store=main_store, transfer_entry={"transferred_products": []})
+
+
+@pytest.mark.asyncio
+async def test_retried_transfer_is_not_applied_again(sample_stores):
+	main_store, branch = sample_stores
+	transfer_entry = {"transfer_id": "TRF-1", "transferred_products": [{"sku": "test_beans", "qty": 5, "unit": Unit.KG}]}
+	
+	assert await main_store.transfer(to_store=branch, transfer_entry=transfer_entry) == {"transfer_id": "TRF-1", "is_replay": False}
+	assert await main_store.transfer(to_store=branch, transfer_entry=transfer_entry) == {"transfer_id": "TRF-1", "is_replay": True}
+	assert await main_store.get_stock_level(sku="test_beans", unit=Unit.KG) == 15
+	assert await branch.get_stock_level(sku="test_beans", unit=Unit.KG) == 5
+	
+	result = await main_store.transfer(to_store=branch, transfer_entry={"transferred_products": [{"sku": "test_beans", "qty": 1, "unit": Unit.KG}]})
+	assert result["transfer_id"] is not None and result["is_replay"] is False
+
+
+async def open_stores(tmp_path):
+	stores = []
+	for store_id, store_name in [("test_main_store", "Main Store (test)"), ("test_branch", "Branch (test)")]:
+		write_ahead_log = WriteAheadLog(path=str(tmp_path / f"{store_id}.wal"))
+		stores.append(await recover_store(store_id=store_id, store_name=store_name, snapshot_path=str(tmp_path / f"{store_id}.snapshot"), write_ahead_log=write_ahead_log))
+	
+	return stores
+
+
+async def beans_in_stores(stores):
+	return [await store.get_stock_level(sku="test_beans", unit=Unit.KG) for store in stores]
+
+
+@pytest.mark.asyncio
+async def test_transfer_whose_receipt_fails_to_be_logged_is_not_logged_at_all(tmp_path):
+	main_store, branch = await open_stores(tmp_path)
+	await main_store.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG, opening_bal=10)
+	await branch.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG)
+	
+	def failing_append(event):
+		raise OSError("No space left on device")
+	
+	branch._write_ahead_log.append = failing_append
+	with pytest.raises(OSError):
+		await main_store.transfer(to_store=branch, transfer_entry={"transfer_id": "TRF-1", "transferred_products": [{"sku": "test_beans", "qty": 4, "unit": Unit.KG}]})
+	
+	assert await beans_in_stores([main_store, branch]) == [10, 0]
+	
+	main_store._write_ahead_log.close()
+	branch._write_ahead_log.close()
+	stores = await open_stores(tmp_path)
+	assert await recover_transfers(stores) == []
+	assert await beans_in_stores(stores) == [10, 0]
+
+
+@pytest.mark.asyncio
+async def test_transfer_cut_short_by_a_crash_is_completed_on_recovery(tmp_path):
+	main_store, branch = await open_stores(tmp_path)
+	await main_store.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG, opening_bal=10)
+	await branch.create_product_inventory(sku="test_beans", product_name="Beans (test)", base_unit=Unit.KG)
+	await main_store.transfer(to_store=branch, transfer_entry={"transfer_id": "TRF-1", "transferred_products": [{"sku": "test_beans", "qty": 1, "unit": Unit.KG}]})
+	
+	#the process dies once the main store logged the transfer, before the branch logged its receipt
+	def crashing_append(event):
+		raise SystemExit()
+	
+	branch._write_ahead_log.append = crashing_append
+	main_store._write_ahead_log.undo_append = lambda seq: None
+	with pytest.raises(SystemExit):
+		await main_store.transfer(to_store=branch, transfer_entry={"transfer_id": "TRF-2", "transferred_products": [{"sku": "test_beans", "qty": 4, "unit": Unit.KG}]})
+	
+	main_store._write_ahead_log.close()
+	branch._write_ahead_log.close()
+	stores = await open_stores(tmp_path)
+	assert await beans_in_stores(stores) == [5, 1]
+	assert await recover_transfers(stores) == ["TRF-2"]
+	assert await beans_in_stores(stores) == [5, 5]
+	
+	#the branch logged the receipt it was given, so the next recovery has nothing left to apply
+	for store in stores:
+		store._write_ahead_log.close()
+	stores = await open_stores(tmp_path)
+	assert await recover_transfers(stores) == []
+	assert await beans_in_stores(stores) == [5, 5]
+	assert await stores[0].transfer(to_store=stores[1], transfer_entry={"transfer_id": "TRF-2", "transferred_products": [{"sku": "test_beans", "qty": 4, "unit": Unit.KG}]}) == {"transfer_id": "TRF-2", "is_replay": True}
@@ -1,8 +1,8 @@
-from uuid import uuid4
 from enum import Enum
 
 
+#values are the wire/storage codes of the change types... they are persisted, so never renumber them
 class ChangeType(Enum):
-	RECEIVE = uuid4()
-	ISSUE = uuid4()
-	ADJUST = uuid4()
+	RECEIVE = 1
+	ISSUE = 2
+	ADJUST = 3
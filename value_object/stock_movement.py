@@ -12,3 +12,4 @@ class StockMovement:
 	unit: Unit | None #unit used in receiving/issuing. Nullable in case of opening bal where there is neither received/issued qty
 	bal: float
 	base_unit: Unit
+	lot_id: str | None = None #lot the qty went into/came out of, for lot tracked products
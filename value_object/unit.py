@@ -1,22 +1,22 @@
-from uuid import uuid4
 from enum import Enum
 from dataclasses import dataclass
 
 
+#values are the wire/storage codes of the units... they are persisted, so never renumber them, only add new ones
 class Unit(Enum):
-	BSKT = uuid4()
-	BAG = uuid4()
-	KG = uuid4()
-	CTN = uuid4()
-	PCS = uuid4()
-	BTL = uuid4()
-	PKT = uuid4()
-	TUBER = uuid4()
-	BUNCH = uuid4()
-	TIN = uuid4()
+	BSKT = 1
+	BAG = 2
+	KG = 3
+	CTN = 4
+	PCS = 5
+	BTL = 6
+	PKT = 7
+	TUBER = 8
+	BUNCH = 9
+	TIN = 10
 
 
 @dataclass(frozen=True)
 class UnitConversion:
 	unit: Unit
-	conversion_factor: float
\ No newline at end of file
+	conversion_factor: float